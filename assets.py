@@ -0,0 +1,345 @@
+# assets.py
+
+# Texture atlas cache for the game's images.
+# The source PNGs in images/ are large, and decoding and scaling them takes
+# most of the start-up time, so only the images a game configuration uses are
+# decoded. Each is scaled to the size the game draws it at and packed into one
+# atlas surface, which is saved with an index to CACHE_DIR. Later runs decode
+# that single file and hand out subsurfaces, decoding only the source images
+# it does not hold yet and adding them to it. The cache key covers the target
+# sizes and the size and mtime of every source file, so editing or adding an
+# image rebuilds the atlas.
+
+import hashlib
+import json
+import os
+import threading
+
+import pygame
+from settings import *
+from models import CARD_CHARACTERS
+from views import render_text
+
+ATLAS_WIDTH = 1024
+ATLAS_FORMAT_VERSION = 1
+# Card numbers prefetched from the main menu: the configuration screen's default
+PREFETCH_CARD_NUMBERS = (1, 2, 3)
+
+
+def target_size(name):
+    """
+    Return the size an image is drawn at, from its file name.
+    """
+    if name == 'card_cover':
+        min_dimension = min(CARD_WIDTH, CARD_HEIGHT)
+        return (min_dimension, min_dimension)
+    if name in CARD_CHARACTERS or name.startswith('token'):
+        return (BOARD_ICON_SIZE, BOARD_ICON_SIZE)
+    # Card faces and cave tiles
+    return (CARD_WIDTH, CARD_HEIGHT)
+
+
+def atlas_sources(image_dir='images'):
+    """
+    Return {name: path} for every PNG in image_dir, keyed by file name without
+    the extension.
+    """
+    sources = {}
+    for filename in sorted(os.listdir(image_dir)):
+        name, ext = os.path.splitext(filename)
+        if ext.lower() == '.png':
+            sources[name] = os.path.join(image_dir, filename)
+    return sources
+
+
+def atlas_key(sources):
+    """
+    Return a hash of everything the atlas depends on.
+    """
+    parts = [ATLAS_FORMAT_VERSION, ATLAS_WIDTH]
+    for name, path in sorted(sources.items()):
+        stat = os.stat(path)
+        parts.append([name, list(target_size(name)), stat.st_size, stat.st_mtime_ns])
+    return hashlib.sha1(json.dumps(parts).encode()).hexdigest()
+
+
+class TextureAtlas:
+    """
+    One surface holding every pre-scaled image, and the rect of each image in it.
+    """
+    def __init__(self, surface, entries):
+        self.surface = surface
+        self.entries = entries
+        self._images = {}
+
+    def __contains__(self, name):
+        return name in self.entries
+
+    def get(self, name):
+        """
+        Return the image called name as a subsurface of the atlas, or None.
+        """
+        image = self._images.get(name)
+        if image is None and name in self.entries:
+            image = self._images[name] = self.surface.subsurface(self.entries[name])
+        return image
+
+
+def pack(sizes):
+    """
+    Place rectangles of the given sizes in rows ("shelves") ATLAS_WIDTH wide.
+    :param sizes: {name: (width, height)}
+    :return: ({name: (x, y, width, height)}, total height)
+    """
+    entries = {}
+    x = y = shelf_height = 0
+    # Tallest first keeps the shelves tight
+    for name, (width, height) in sorted(sizes.items(), key=lambda item: (-item[1][1], item[0])):
+        if x + width > ATLAS_WIDTH:
+            x = 0
+            y += shelf_height
+            shelf_height = 0
+        entries[name] = (x, y, width, height)
+        x += width
+        shelf_height = max(shelf_height, height)
+    return entries, y + shelf_height
+
+
+def build_atlas(sources, convert=True, base=None):
+    """
+    Decode, scale and pack source images.
+    :param convert: convert the surfaces for the display; pass False when
+        running off the main thread, and convert the result later
+    :param base: TextureAtlas whose images are packed in as well, or None
+    :return: TextureAtlas
+    """
+    images = {name: base.get(name) for name in base.entries} if base is not None else {}
+    for name, path in sources.items():
+        try:
+            image = pygame.image.load(path)
+            if convert:
+                image = image.convert_alpha()
+        except pygame.error as e:
+            print(f"Unable to load image {path}: {e}")
+            continue
+        images[name] = pygame.transform.scale(image, target_size(name))
+    entries, height = pack({name: image.get_size() for name, image in images.items()})
+    surface = pygame.Surface((ATLAS_WIDTH, max(height, 1)), pygame.SRCALPHA)
+    surface.blits([(images[name], entries[name][:2]) for name in entries], doreturn=False)
+    return TextureAtlas(surface.convert_alpha() if convert else surface, entries)
+
+
+def save_atlas(atlas, key, cache_dir):
+    os.makedirs(cache_dir, exist_ok=True)
+    image_path = os.path.join(cache_dir, 'atlas.png')
+    index_path = os.path.join(cache_dir, 'atlas.json')
+    # Write to temporary files first so an interrupted save never leaves a
+    # half-written atlas behind a valid index
+    pygame.image.save(atlas.surface, image_path + '.tmp.png')
+    os.replace(image_path + '.tmp.png', image_path)
+    with open(index_path + '.tmp', 'w') as f:
+        json.dump({'key': key, 'entries': atlas.entries}, f)
+    os.replace(index_path + '.tmp', index_path)
+
+
+def read_atlas(key, cache_dir, convert=True):
+    """
+    Return the cached atlas if it was built for key, otherwise None.
+    """
+    try:
+        with open(os.path.join(cache_dir, 'atlas.json')) as f:
+            index = json.load(f)
+        if index.get('key') != key:
+            return None
+        surface = pygame.image.load(os.path.join(cache_dir, 'atlas.png'))
+        if convert:
+            surface = surface.convert_alpha()
+    except (OSError, ValueError, pygame.error):
+        return None
+    entries = {name: tuple(rect) for name, rect in index['entries'].items()}
+    return TextureAtlas(surface, entries)
+
+
+def load_atlas(image_dir='images', cache_dir=CACHE_DIR, convert=True, sources=None, names=None, base=None):
+    """
+    Return an atlas for image_dir holding at least the images called names
+    (all of them if None), from the cache if it is up to date. Images the
+    cache lacks are decoded and added to it.
+    With convert=True the display mode must be set, since images are
+    converted for it.
+    :param base: atlas to add to if the cache cannot be read, or None
+    """
+    if sources is None:
+        sources = atlas_sources(image_dir)
+    if names is None:
+        names = sources
+    key = atlas_key(sources)
+    atlas = read_atlas(key, cache_dir, convert) or base
+    missing = {name: sources[name] for name in names if name in sources and (atlas is None or name not in atlas)}
+    if missing:
+        atlas = build_atlas(missing, convert, atlas)
+        try:
+            save_atlas(atlas, key, cache_dir)
+        except (OSError, pygame.error) as e:
+            print(f"Unable to cache the texture atlas: {e}")
+    return atlas
+
+
+def card_image_names(card_numbers, available):
+    """
+    Return {card image key: atlas name} for the faces a deck with these
+    numbers uses, skipping any that have no image.
+    """
+    names = {}
+    for character in CARD_CHARACTERS:
+        for number in card_numbers:
+            if character == 'pirate' and number > 2:
+                continue
+            name = f"{character.replace(' ', '_')}_{number}"
+            if name in available:
+                names[name] = name
+    return names
+
+
+def needed_names(card_numbers, available):
+    """
+    Return the names of the images a game with these card numbers draws.
+    """
+    names = set(card_image_names(card_numbers, available).values())
+    names.update(name for name in [character.replace(' ', '_') for character in CARD_CHARACTERS] + ['card_cover']
+                 if name in available)
+    return names
+
+
+def resolve_images(get, card_numbers, available):
+    """
+    Look up the images a game with these card numbers needs.
+    :param get: function returning the image for an atlas name
+    :param available: names that have an image
+    :return: (card_images, card_back_image or None, board_char_images)
+    """
+    card_images = {key: get(name) for key, name in card_image_names(card_numbers, available).items()}
+    board_char_images = {character: get(character.replace(' ', '_')) for character in CARD_CHARACTERS
+                         if character.replace(' ', '_') in available}
+    card_back_image = get('card_cover') if 'card_cover' in available else None
+    return card_images, card_back_image, board_char_images
+
+
+class AssetManager:
+    """
+    Loads images on a worker thread so they are ready by the time a game
+    starts: from the main menu those of the default configuration, then any
+    others a game asks images() for. Until they arrive images() returns
+    placeholder surfaces of the right sizes; poll() reports when real images
+    have arrived.
+    """
+    def __init__(self, image_dir='images', cache_dir=CACHE_DIR):
+        self.image_dir = image_dir
+        self.cache_dir = cache_dir
+        self.sources = {}
+        self.atlas = None
+        # The atlas before conversion for the display, which the next load adds to
+        self._base = None
+        self._thread = None
+        self._loading = set()
+        self._loaded = None
+        self._error = None
+        # Names asked for that are neither loaded nor loading, and names that failed
+        self._wanted = set()
+        self._failed = set()
+        self._placeholders = {}
+
+    def start(self, card_numbers=PREFETCH_CARD_NUMBERS):
+        """
+        Start decoding the images a game with these card numbers needs in
+        the background. Images already loaded or loading are not decoded again.
+        """
+        if not self.sources:
+            # Listing the directory is cheap and tells which images exist before decoding
+            self.sources = atlas_sources(self.image_dir)
+        loaded = self._base.entries if self._base is not None else {}
+        self._wanted |= needed_names(card_numbers, self.sources) - self._loading - self._failed - set(loaded)
+        self._start_next()
+
+    def _start_next(self):
+        if self._thread is not None or not self._wanted:
+            return
+        self._loading, self._wanted = self._wanted, set()
+        self._thread = threading.Thread(target=self._load, args=(self._loading, self._base),
+                                        name='asset-loader', daemon=True)
+        self._thread.start()
+
+    def _load(self, names, base):
+        try:
+            self._loaded = load_atlas(self.image_dir, self.cache_dir, convert=False, sources=self.sources,
+                                      names=names, base=base)
+        except Exception as e:  # Reported on the main thread by poll()
+            self._error = e
+
+    @property
+    def ready(self):
+        """
+        True when no image asked for is still loading, even if some failed.
+        """
+        return self._thread is None and not self._wanted
+
+    def poll(self):
+        """
+        Finish loading on the main thread if the worker is done.
+        :return: True if real images became available in this call
+        """
+        if self._thread is None or self._thread.is_alive():
+            return False
+        self._thread = None
+        loaded, error, self._loaded, self._error = self._loaded, self._error, None, None
+        arrived = False
+        if error is not None:
+            # Decoding again here would stall the frame; the placeholders stay
+            print(f"Background image loading failed: {error}")
+            self._failed |= self._loading
+        else:
+            self._failed |= self._loading - set(loaded.entries)
+            # Surfaces can only be converted for the display on the main thread
+            self._base = loaded
+            self.atlas = TextureAtlas(loaded.surface.convert_alpha(), loaded.entries)
+            arrived = True
+        self._loading = set()
+        self._start_next()
+        return arrived
+
+    def wait(self, card_numbers=PREFETCH_CARD_NUMBERS):
+        """
+        Block until the images for these card numbers are loaded.
+        """
+        self.start(card_numbers)
+        while not self.ready:
+            self._thread.join()
+            self.poll()
+
+    def placeholder(self, name):
+        image = self._placeholders.get(name)
+        if image is None:
+            size = target_size(name)
+            image = pygame.Surface(size, pygame.SRCALPHA)
+            pygame.draw.rect(image, DARK_GRAY, image.get_rect(), border_radius=6)
+            label = render_text(name[0].upper(), 24)
+            image.blit(label, label.get_rect(center=image.get_rect().center))
+            self._placeholders[name] = image
+        return image
+
+    def get(self, name):
+        """
+        Return the image called name, or its placeholder if it is not loaded.
+        """
+        image = self.atlas.get(name) if self.atlas is not None else None
+        return image if image is not None else self.placeholder(name)
+
+    def images(self, card_numbers):
+        """
+        Return (card_images, card_back_image, board_char_images) for a game with
+        these card numbers, only for the images that exist. Placeholders are
+        returned for those still loading, until ready is True.
+        """
+        self.start(card_numbers)
+        self.poll()
+        return resolve_images(self.get, card_numbers, self.sources)
@@ -0,0 +1,125 @@
+# audio.py
+
+# Sound effects for the game.
+# Opening the audio device and decoding the MP3s in sounds/ used to happen
+# before the first menu was shown, and a sound that failed to decode crashed
+# the game the first time it was played. AudioManager opens the mixer and
+# decodes the sounds on a worker thread instead, and caches the decoded PCM
+# in CACHE_DIR so later runs skip the MP3 decoder. Each sound plays on its
+# own reserved channel, so playing it never waits for a free channel. When
+# there is no audio device, or a sound is missing, play() does nothing.
+
+import hashlib
+import json
+import os
+import threading
+
+import pygame
+from settings import *
+
+SOUND_FILES = {
+    'card_flip': 'flipcard.mp3',
+    'player_move': 'moving.mp3',
+    'game_start': 'start.mp3',
+    'game_end': 'end.mp3',
+    'button_click': 'click.mp3',
+}
+SOUND_CACHE_VERSION = 1
+
+
+def sound_key(path, mixer_format):
+    """
+    Return a hash of everything the decoded samples of path depend on.
+    :param mixer_format: (frequency, size, channels) from pygame.mixer.get_init()
+    """
+    stat = os.stat(path)
+    parts = [SOUND_CACHE_VERSION, list(mixer_format), stat.st_size, stat.st_mtime_ns]
+    return hashlib.sha1(json.dumps(parts).encode()).hexdigest()
+
+
+class AudioManager:
+    """
+    Plays the game's sound effects by name. Sounds that are not loaded yet,
+    or could not be loaded, are skipped silently.
+    """
+    def __init__(self, sound_dir='sounds', cache_dir=CACHE_DIR):
+        self.sound_dir = sound_dir
+        self.cache_dir = os.path.join(cache_dir, 'sounds')
+        self.available = False
+        self._sounds = {}
+        self._channels = {}
+        self._thread = None
+
+    def start(self):
+        """
+        Open the mixer and decode the sounds in the background. Calling it
+        again does nothing.
+        """
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._load, name='audio-loader', daemon=True)
+        self._thread.start()
+
+    def wait(self):
+        """
+        Block until every sound is loaded.
+        """
+        self.start()
+        self._thread.join()
+
+    def _load(self):
+        try:
+            if not pygame.mixer.get_init():
+                pygame.mixer.init()
+            pygame.mixer.set_reserved(len(SOUND_FILES))
+        except pygame.error as e:
+            print(f"Audio is unavailable: {e}")
+            return
+        self._channels = {name: pygame.mixer.Channel(i) for i, name in enumerate(SOUND_FILES)}
+        self.available = True
+        mixer_format = pygame.mixer.get_init()
+        for name, filename in SOUND_FILES.items():
+            sound = self._load_sound(name, os.path.join(self.sound_dir, filename), mixer_format)
+            if sound is not None:
+                self._sounds[name] = sound
+
+    def _load_sound(self, name, path, mixer_format):
+        try:
+            key = sound_key(path, mixer_format)
+        except OSError as e:
+            print(f"Unable to load sound: {e}")
+            return None
+        cache_path = os.path.join(self.cache_dir, f"{name}-{key}.pcm")
+        try:
+            with open(cache_path, 'rb') as f:
+                return pygame.mixer.Sound(buffer=f.read())
+        except (OSError, pygame.error):
+            pass
+        try:
+            sound = pygame.mixer.Sound(path)
+        except pygame.error as e:
+            print(f"Unable to load sound: {e}")
+            return None
+        try:
+            self._save_samples(name, cache_path, sound.get_raw())
+        except OSError as e:
+            print(f"Unable to cache sound {name}: {e}")
+        return sound
+
+    def _save_samples(self, name, cache_path, samples):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with open(cache_path + '.tmp', 'wb') as f:
+            f.write(samples)
+        os.replace(cache_path + '.tmp', cache_path)
+        # Drop samples cached for an older version of the file or mixer format
+        for filename in os.listdir(self.cache_dir):
+            if filename.startswith(name + '-') and os.path.join(self.cache_dir, filename) != cache_path:
+                os.remove(os.path.join(self.cache_dir, filename))
+
+    def play(self, name):
+        """
+        Play the sound called name on its reserved channel.
+        """
+        sound = self._sounds.get(name)
+        if sound is not None:
+            self._channels[name].play(sound)
@@ -0,0 +1,168 @@
+# autosave.py
+
+# Autosaves written by a background thread.
+# At the end of every turn GameScene hands a snapshot of the save file (its
+# checkpoints and 4 bytes per move, see savefile.GameRecord.snapshot) to
+# AutosaveService.submit, which returns at once. The writer thread writes the
+# newest snapshot to a new numbered file in AUTOSAVE_DIR with
+# savefile.write_atomic and deletes all but the last AUTOSAVE_COUNT autosaves,
+# keeping the save catalog in step. Snapshots that arrive while the writer is
+# busy replace each other, so a burst of turns costs one write.
+# Saves the player asks for go through the same thread (AutosaveService.save)
+# so that writing, fsyncing and cataloguing them never holds up a frame; they
+# are queued rather than replaced and written before any waiting autosave.
+
+import os
+import re
+import threading
+from collections import deque
+from concurrent.futures import Future
+
+from settings import *
+from savefile import SAVE_EXTENSION, write_atomic, write_save
+
+AUTOSAVE_PATTERN = re.compile(r'autosave-(\d+)' + re.escape(SAVE_EXTENSION) + '$')
+
+
+def autosave_files(directory):
+    """
+    Return the paths of the autosaves in directory, oldest first.
+    """
+    try:
+        filenames = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    numbered = []
+    for filename in filenames:
+        match = AUTOSAVE_PATTERN.match(filename)
+        if match:
+            numbered.append((int(match.group(1)), os.path.join(directory, filename)))
+    return [path for _, path in sorted(numbered)]
+
+
+class AutosaveService:
+    """
+    Writes autosaves on a worker thread, keeping the last `keep` of them,
+    and the saves the player asks for.
+    """
+    def __init__(self, directory=AUTOSAVE_DIR, keep=AUTOSAVE_COUNT, catalog=None):
+        self.directory = directory
+        self.keep = keep
+        self.catalog = catalog
+        self.written = 0
+        self._pending = None
+        # (future, path, data, append, entry, render_thumbnail) per manual save
+        self._saves = deque()
+        self._closed = False
+        self._busy = False
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def submit(self, snapshot, entry=None, render_thumbnail=None):
+        """
+        Queue a snapshot to be written, replacing any that is still waiting.
+        :param snapshot: the bytes of a save file
+        :param entry: catalog metadata for the save, see catalog.catalog_entry
+        :param render_thumbnail: function returning the board thumbnail
+            Surface for the catalog, called on the writer thread
+        """
+        with self._condition:
+            if self._closed:
+                return
+            self._pending = (snapshot, entry, render_thumbnail)
+            self._start()
+
+    def save(self, path, data, append=False, entry=None, render_thumbnail=None):
+        """
+        Queue a save the player asked for. These are written in order and
+        never replaced.
+        :param path: file to save to
+        :param data, append: from savefile.GameRecord.prepare_save
+        :param entry: catalog metadata for the save, see catalog.catalog_entry
+        :param render_thumbnail: function returning the board thumbnail
+            Surface for the catalog, called on the writer thread
+        :return: Future that is done once the save is written, holding the
+            exception if it could not be
+        """
+        future = Future()
+        with self._condition:
+            if self._closed:
+                future.set_exception(OSError(f"Cannot save to {path} after closing."))
+                return future
+            self._saves.append((future, path, data, append, entry, render_thumbnail))
+            self._start()
+        return future
+
+    def _start(self):
+        # Called with the condition held
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='autosave', daemon=True)
+            self._thread.start()
+        self._condition.notify()
+
+    def flush(self):
+        """
+        Block until every submitted snapshot has been written.
+        """
+        with self._condition:
+            while self._pending is not None or self._saves or self._busy:
+                self._condition.wait()
+
+    def close(self):
+        """
+        Write the queued saves and the last snapshot and stop the writer
+        thread.
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._pending is None and not self._saves and not self._closed:
+                    self._condition.wait()
+                if self._saves:
+                    job, pending = self._save, self._saves.popleft()
+                elif self._pending is not None:
+                    job, pending, self._pending = self._write, self._pending, None
+                else:
+                    return
+                self._busy = True
+            try:
+                job(*pending)
+            except Exception as e:
+                # Rendering the thumbnail or cataloguing can fail too; the
+                # thread must outlive any one job or later saves never finish
+                print(f"Autosave failed: {e!r}")
+            finally:
+                with self._condition:
+                    self._busy = False
+                    self._condition.notify_all()
+
+    def _save(self, future, path, data, append, entry, render_thumbnail):
+        # Like an executor, hand any failure to whoever waits on the future
+        try:
+            write_save(path, data, append)
+            if self.catalog is not None and entry is not None:
+                self.catalog.add(path, entry, render_thumbnail() if render_thumbnail else None)
+        except Exception as e:
+            future.set_exception(e)
+        else:
+            future.set_result(None)
+
+    def _write(self, snapshot, entry, render_thumbnail):
+        os.makedirs(self.directory, exist_ok=True)
+        existing = autosave_files(self.directory)
+        number = int(AUTOSAVE_PATTERN.match(os.path.basename(existing[-1])).group(1)) + 1 if existing else 1
+        path = os.path.join(self.directory, f"autosave-{number:06d}{SAVE_EXTENSION}")
+        write_atomic(path, snapshot)
+        self.written += 1
+        if self.catalog is not None and entry is not None:
+            self.catalog.add(path, entry, render_thumbnail() if render_thumbnail else None)
+        for old_path in existing[:max(0, len(existing) + 1 - self.keep)]:
+            os.remove(old_path)
+            if self.catalog is not None:
+                self.catalog.remove(old_path)
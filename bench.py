@@ -0,0 +1,323 @@
+# bench.py
+
+# Benchmarks for the rules, layout and rendering hot paths.
+# Runs without a window or sound card (SDL dummy drivers). Each benchmark is
+# timed over many samples at several board and deck sizes and reported as
+# p50/p95/p99 per operation, plus memory figures per step measured in
+# separate passes so that they do not skew the timings: the peak memory a
+# step allocates (under tracemalloc), the memory blocks it allocates that are
+# still allocated when it returns with the garbage collector off ("allocs":
+# what it keeps plus the cyclic garbage it leaves for the collector), and
+# the blocks still allocated after a collection ("kept"). Blocks a step
+# allocates and frees again by reference counting cannot be counted without
+# a debug build of Python. (A step is a batch of operations for the fastest
+# benchmarks.)
+#
+#   python bench.py                                  run everything
+#   python bench.py --filter frame --quick           a subset, fewer samples
+#   python bench.py --save-baseline bench_baseline.json
+#   python bench.py --baseline bench_baseline.json   flag regressions, exit 1 if any
+
+import os
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import argparse
+import gc
+import json
+import random
+import sys
+import time
+import tracemalloc
+
+import pygame
+from settings import *
+from models import Board, Player, BOARD_CHARACTERS, CARD_CHARACTERS, create_deck
+from views import BoardView, CardLayout, DirtyRenderer, draw_board, draw_cards, draw_players
+
+# (name, num_sections, card_numbers, cards per character)
+SCALES = [
+    ('default', 8, [1, 2, 3], 4),
+    ('medium', 64, list(range(1, 9)), 16),
+    ('large', 512, list(range(1, 17)), 64),
+    ('huge', 8192, list(range(1, 17)), 768),
+]
+DEFAULT_TOLERANCE = 0.25
+
+
+def make_images(card_numbers):
+    """
+    Plain surfaces of the right sizes in place of the image files.
+    """
+    card_images = {}
+    for character in CARD_CHARACTERS:
+        for number in card_numbers:
+            image = pygame.Surface((CARD_WIDTH, CARD_HEIGHT), pygame.SRCALPHA)
+            image.fill((40 * (number % 6), 90, 160, 255))
+            card_images[f"{character}_{number}"] = image
+    board_char_images = {}
+    for character in BOARD_CHARACTERS:
+        image = pygame.Surface((BOARD_ICON_SIZE, BOARD_ICON_SIZE), pygame.SRCALPHA)
+        image.fill((200, 120, 40, 255))
+        board_char_images[character] = image
+    card_back_image = pygame.Surface((CARD_WIDTH, CARD_WIDTH), pygame.SRCALPHA)
+    card_back_image.fill((80, 80, 80, 255))
+    return card_images, card_back_image, board_char_images
+
+
+class Fixture:
+    """
+    A board, deck and players at one scale, shared by the benchmarks.
+    """
+    def __init__(self, screen, num_sections, card_numbers, num_cards_per_character):
+        self.screen = screen
+        self.card_numbers = card_numbers
+        self.num_cards_per_character = num_cards_per_character
+        self.card_images, self.card_back_image, board_char_images = make_images(card_numbers)
+        center = (SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2)
+        self.board = Board(center, BOARD_RADIUS, num_sections, board_char_images)
+        self.board.precompute_steps(card_numbers)
+        self.deck = create_deck(self.card_images, card_numbers, num_cards_per_character, seed=1)
+        self.players = [Player(name, character, color) for name, character, color in PLAYERS]
+        self.rng = random.Random(2)
+
+
+# Each benchmark takes a Fixture and returns (step, operations per step).
+# Steps that are too fast to time one at a time run a batch of operations.
+
+def bench_create_deck(f):
+    return lambda: create_deck(f.card_images, f.card_numbers, f.num_cards_per_character, seed=3), 1
+
+
+def bench_create_sections(f):
+    return f.board.create_sections, 1
+
+
+def bench_player_move(f):
+    board = f.board
+    player = f.players[0]
+    steps = [f.rng.choice(f.card_numbers) for _ in range(1000)]
+
+    def step():
+        for n in steps:
+            player.move(n, board)
+            player.move_backward(n, board)
+    return step, 2 * len(steps)
+
+
+def bench_pick(f):
+    layout = CardLayout()
+    layout.update(f.screen, f.board, len(f.deck), f.card_back_image.get_size())
+    rects = [layout.rect(index) for index in layout.visible_indices()]
+    # Half the clicks land on a visible card, half anywhere on the screen
+    points = []
+    for i in range(1000):
+        if i % 2:
+            rect = f.rng.choice(rects)
+            points.append((f.rng.randrange(rect.left, rect.right), f.rng.randrange(rect.top, rect.bottom)))
+        else:
+            points.append((f.rng.randrange(SCREEN_WIDTH), f.rng.randrange(SCREEN_HEIGHT)))
+    deck = f.deck
+
+    def step():
+        for pos in points:
+            layout.pick(pos, deck)
+    return step, len(points)
+
+
+def bench_full_frame(f):
+    layout = CardLayout()
+    screen = f.screen
+
+    def step():
+        screen.fill(BLACK)
+        draw_board(screen, f.board)
+        draw_players(screen, f.players, f.board)
+        draw_cards(screen, f.deck, f.card_back_image, f.board, layout)
+    return step, 1
+
+
+def bench_board_view(f):
+    view = BoardView(f.board, f.screen.get_rect())
+    # Whole board, then zoomed in on and panned along the right of the ring
+    views = [(1.0, (0.0, 0.0))]
+    for zoom in (4.0, 32.0, view.max_zoom):
+        view.reset()
+        view.zoom_at((SCREEN_WIDTH // 2 + BOARD_RADIUS, SCREEN_HEIGHT // 2), zoom)
+        views += [(view.zoom, (view.pan[0], view.pan[1] + dy)) for dy in (0, 200, 400)]
+    screen = f.screen
+
+    def step():
+        for view.zoom, view.pan in views:
+            screen.fill(BLACK)
+            draw_board(screen, f.board, view)
+    return step, len(views)
+
+
+def bench_dirty_frame(f):
+    renderer = DirtyRenderer(f.screen, f.board, f.card_back_image)
+    deck = f.deck
+    renderer.render(deck, f.players, f.players[0], present=False)
+    indices = [f.rng.randrange(len(deck)) for _ in range(1000)]
+    state = {'i': 0}
+
+    def step():
+        # One card turned over per frame, as in play
+        index = indices[state['i'] % len(indices)]
+        state['i'] += 1
+        deck.flip(index)
+        renderer.render(deck, f.players, f.players[0], present=False)
+    return step, 1
+
+
+BENCHMARKS = {
+    'create_deck': bench_create_deck,
+    'create_sections': bench_create_sections,
+    'player_move': bench_player_move,
+    'pick': bench_pick,
+    'full_frame': bench_full_frame,
+    'board_view': bench_board_view,
+    'dirty_frame': bench_dirty_frame,
+}
+
+
+def percentile(sorted_values, q):
+    return sorted_values[min(len(sorted_values) - 1, int(q / 100 * len(sorted_values)))]
+
+
+def measure(step, ops, samples, time_limit):
+    """
+    Time step() until `samples` samples or `time_limit` seconds.
+    :return: dict of per-operation times in microseconds, and the peak KiB,
+        allocated blocks and kept blocks of one step
+    """
+    step()  # Warm up caches
+    times = []
+    deadline = time.perf_counter() + time_limit
+    while len(times) < samples and (len(times) < 5 or time.perf_counter() < deadline):
+        start = time.perf_counter_ns()
+        step()
+        times.append((time.perf_counter_ns() - start) / ops / 1000)
+    times.sort()
+
+    tracemalloc.start()
+    peaks = []
+    for _ in range(min(20, len(times))):
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        step()
+        peaks.append(tracemalloc.get_traced_memory()[1] - current)
+    tracemalloc.stop()
+
+    allocs = []
+    kept = []
+    gc.collect()
+    gc.disable()
+    try:
+        for _ in range(min(20, len(times))):
+            before = sys.getallocatedblocks()
+            step()
+            allocs.append(sys.getallocatedblocks() - before)
+            gc.collect()
+            kept.append(sys.getallocatedblocks() - before)
+    finally:
+        gc.enable()
+    peaks.sort()
+    allocs.sort()
+    kept.sort()
+    return {
+        'samples': len(times),
+        'p50_us': percentile(times, 50),
+        'p95_us': percentile(times, 95),
+        'p99_us': percentile(times, 99),
+        'peak_kib': percentile(peaks, 50) / 1024,
+        'allocs': percentile(allocs, 50),
+        'kept': percentile(kept, 50),
+    }
+
+
+def run(names, scales, samples, time_limit):
+    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    results = {}
+    for scale_name, num_sections, card_numbers, num_cards_per_character in scales:
+        for name in names:
+            # A fresh fixture per benchmark, so one cannot warm up another
+            fixture = Fixture(screen, num_sections, card_numbers, num_cards_per_character)
+            step, ops = BENCHMARKS[name](fixture)
+            result = measure(step, ops, samples, time_limit)
+            result['cards'] = len(fixture.deck)
+            result['squares'] = fixture.board.total_subsections
+            key = f"{name}/{scale_name}"
+            results[key] = result
+            print(format_row(key, result), flush=True)
+    return results
+
+
+def format_row(key, result, note=''):
+    return (f"{key:<26} {result['squares']:>6} {result['cards']:>7} {result['p50_us']:>11.2f} "
+            f"{result['p95_us']:>11.2f} {result['p99_us']:>11.2f} {result['peak_kib']:>10.1f} {result['allocs']:>8} {result['kept']:>6}  {note}")
+
+
+def compare(results, baseline, tolerance):
+    """
+    Return the keys whose median got slower than the baseline by more than
+    `tolerance` (a fraction).
+    """
+    regressions = []
+    print()
+    print(f"{'benchmark':<26} {'p50 now':>11} {'baseline':>11} {'change':>8}")
+    for key, result in results.items():
+        base = baseline.get(key)
+        if base is None:
+            continue
+        change = result['p50_us'] / base['p50_us'] - 1 if base['p50_us'] else 0.0
+        flag = ''
+        if change > tolerance:
+            flag = 'REGRESSION'
+            regressions.append(key)
+        elif change < -tolerance:
+            flag = 'faster'
+        print(f"{key:<26} {result['p50_us']:>11.2f} {base['p50_us']:>11.2f} {change:>+8.0%}  {flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Fiery Dragon hot paths.")
+    parser.add_argument('--filter', default='', help="only run benchmarks whose name contains this")
+    parser.add_argument('--scales', default=','.join(name for name, *_ in SCALES),
+                        help="comma-separated scales to run")
+    parser.add_argument('--quick', action='store_true', help="fewer samples, for a fast check")
+    parser.add_argument('--baseline', help="baseline JSON to compare against")
+    parser.add_argument('--save-baseline', help="write the results to this JSON file")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help="allowed slowdown of the median before it is flagged (0.25 = 25%%)")
+    args = parser.parse_args(argv)
+
+    names = [name for name in BENCHMARKS if args.filter in name]
+    wanted = args.scales.split(',')
+    scales = [scale for scale in SCALES if scale[0] in wanted]
+    samples, time_limit = (30, 0.3) if args.quick else (300, 2.0)
+
+    pygame.display.init()
+    pygame.font.init()
+    print(f"{'benchmark':<26} {'squares':>6} {'cards':>7} {'p50 us':>11} {'p95 us':>11} {'p99 us':>11} {'peak KiB':>10} {'allocs':>8} {'kept':>6}")
+    results = run(names, scales, samples, time_limit)
+    pygame.quit()
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"Baseline saved to {args.save_baseline}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} benchmark(s) regressed: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,266 @@
+# bots.py
+
+# Computer players.
+# Every flip shows a card to the whole table, so each Bot listens to the
+# GameEngine (engine.listeners) and writes what it saw into a CardMemory: one
+# character code per deck position (-1 for unknown), the flip it was last seen
+# at, and an index from each face to the positions holding it. Deck positions
+# never move during a game, so a flip updates a few array slots and choosing a
+# card only looks at the bot's own character's entries, not the whole deck.
+#
+# Recall modes:
+#   perfect   remembers every card it has seen
+#   decaying  recalls a card with probability 0.5 ** (age / half_life), age
+#             in flips since it was last seen, and forgets it if that fails
+#   random    remembers nothing and flips any face-down card
+#
+#   python bots.py --games 200 --players perfect,decaying,random,random
+#   python bots.py --sections 512 --numbers 1,2,3,4,5,6,7,8 --cards 64
+
+import argparse
+import random
+import sys
+import time
+from array import array
+
+from settings import *
+from models import Board, Player, CARD_CHARACTERS, create_deck
+from engine import GameEngine
+from simulator import parse_card_numbers
+
+RECALL_MODES = ('perfect', 'decaying', 'random')
+# 'search' is search.SearchBot
+PLAYER_TYPES = ('human',) + RECALL_MODES + ('search',)
+PIRATE = CARD_CHARACTERS.index('pirate')
+
+
+class CardMemory:
+    """
+    What one bot knows about the positions of the cards in a deck.
+    """
+    def __init__(self, deck_size):
+        self.codes = array('b', [-1]) * deck_size
+        self.numbers = array('i', [0]) * deck_size
+        self.seen_at = array('i', [0]) * deck_size
+        self.clock = 0
+        # code -> number -> set of deck positions
+        self.by_face = {}
+        # Unknown positions, with each one's slot in the list for O(1) removal
+        self.unknown = list(range(deck_size))
+        self._slots = array('i', range(deck_size))
+
+    def observe(self, index, code, number):
+        """
+        Remember that the card at index shows (code, number).
+        """
+        self.clock += 1
+        self.seen_at[index] = self.clock
+        if self.codes[index] == -1:
+            self.codes[index] = code
+            self.numbers[index] = number
+            self.by_face.setdefault(code, {}).setdefault(number, set()).add(index)
+            self._remove_unknown(index)
+
+    def forget(self, index):
+        code = self.codes[index]
+        if code == -1:
+            return
+        faces = self.by_face[code]
+        faces[self.numbers[index]].discard(index)
+        self.codes[index] = -1
+        self._slots[index] = len(self.unknown)
+        self.unknown.append(index)
+
+    def age(self, index):
+        return self.clock - self.seen_at[index]
+
+    def _remove_unknown(self, index):
+        # Swap the last unknown position into this one's slot
+        unknown = self.unknown
+        slot = self._slots[index]
+        last = unknown.pop()
+        if last != index:
+            unknown[slot] = last
+            self._slots[last] = slot
+
+
+class Bot:
+    """
+    A computer player.
+    :param mode: one of RECALL_MODES
+    :param deck_size: number of cards in the deck
+    :param seed: seed for the bot's random choices
+    :param half_life: flips after which a decaying bot recalls a card half the time
+    """
+    def __init__(self, mode, deck_size, seed=None, half_life=BOT_HALF_LIFE):
+        if mode not in RECALL_MODES:
+            raise ValueError(f"Unknown recall mode {mode!r}")
+        self.mode = mode
+        self.half_life = half_life
+        self.memory = CardMemory(deck_size) if mode != 'random' else None
+        self.rng = random.Random(seed)
+
+    def observe(self, engine, event):
+        """
+        Engine listener: remember the card that was flipped.
+        """
+        if self.memory is not None:
+            deck = engine.deck
+            index = event.card_index
+            self.memory.observe(index, deck.characters[index], deck.numbers[index])
+
+    def recalls(self, index):
+        if self.mode == 'perfect':
+            return True
+        if self.rng.random() < 0.5 ** (self.memory.age(index) / self.half_life):
+            return True
+        self.memory.forget(index)
+        return False
+
+    def choose(self, engine):
+        """
+        Return the index of the card to flip for the current player, or None
+        if every card is face up.
+        """
+        deck = engine.deck
+        if deck.all_flipped():
+            return None
+        if self.memory is None:
+            return self._random_face_down(deck)
+        memory = self.memory
+        # A remembered card of our own character, highest number first
+        faces = memory.by_face.get(CARD_CHARACTERS.index(engine.current_player.character), {})
+        for number in sorted(faces, reverse=True):
+            for index in list(faces[number]):
+                if not deck.is_flipped(index) and self.recalls(index):
+                    return index
+        # Otherwise a card we know nothing about
+        index = self._random_unknown(deck)
+        if index is not None:
+            return index
+        # Otherwise a harmless mismatch, and a pirate only as a last resort
+        for code in sorted(memory.by_face, key=lambda code: code == PIRATE):
+            for indices in memory.by_face[code].values():
+                for index in indices:
+                    if not deck.is_flipped(index):
+                        return index
+        return self._random_face_down(deck)
+
+    def _random_unknown(self, deck):
+        unknown = self.memory.unknown
+        # Unknown cards are face down unless one was forgotten while face up
+        for _ in range(8):
+            if not unknown:
+                return None
+            index = unknown[self.rng.randrange(len(unknown))]
+            if not deck.is_flipped(index):
+                return index
+        face_down = [index for index in unknown if not deck.is_flipped(index)]
+        return self.rng.choice(face_down) if face_down else None
+
+    def _random_face_down(self, deck):
+        # Few cards are face up at a time, so a random guess rarely misses
+        n = len(deck)
+        for _ in range(8):
+            index = self.rng.randrange(n)
+            if not deck.is_flipped(index):
+                return index
+        return self.rng.choice(deck.face_down_indices())
+
+
+def attach_bots(engine, player_types, seed=None, search_factory=None):
+    """
+    Create a Bot for each computer player and let it watch the game.
+    :param player_types: one of PLAYER_TYPES per player
+    :param search_factory: function(engine, seed) returning the bot for a
+        'search' player, search.make_search_bot by default
+    :return: list with a Bot, or None for a human, per player
+    """
+    rng = random.Random(seed)
+    bots = []
+    for kind in player_types:
+        if kind == 'human':
+            bots.append(None)
+            continue
+        if kind == 'search':
+            if search_factory is None:
+                from search import make_search_bot as search_factory
+            bot = search_factory(engine, rng.getrandbits(32))
+        else:
+            bot = Bot(kind, len(engine.deck), rng.getrandbits(32))
+        engine.listeners.append(bot.observe)
+        bots.append(bot)
+    return bots
+
+
+def percentile(sorted_values, q):
+    return sorted_values[min(len(sorted_values) - 1, int(q / 100 * len(sorted_values)))]
+
+
+def soak(games, player_types, num_sections, card_numbers, num_cards_per_character, seed=0, max_turns=10000,
+         search_factory=None):
+    """
+    Play all-bot games without a window.
+    :param player_types: a bot recall mode per seat of settings.PLAYERS
+    :return: (wins per seat, unfinished games, decision times in microseconds)
+    """
+    if len(player_types) != len(PLAYERS):
+        raise ValueError(f"Expected {len(PLAYERS)} player types, got {len(player_types)}.")
+    board = Board((SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2), BOARD_RADIUS, num_sections, {})
+    board.precompute_steps(card_numbers)
+    rng = random.Random(seed)
+    wins = [0] * len(player_types)
+    unfinished = 0
+    times = []
+    for _ in range(games):
+        deck = create_deck({}, card_numbers, num_cards_per_character, rng.getrandbits(32))
+        players = [Player(f"{kind}{seat}", character, color) for seat, (kind, (_, character, color))
+                   in enumerate(zip(player_types, PLAYERS))]
+        engine = GameEngine(board, deck, players)
+        bots = attach_bots(engine, player_types, rng.getrandbits(32), search_factory)
+        while not engine.is_terminal() and engine.turn < max_turns:
+            start = time.perf_counter_ns()
+            index = bots[engine.current_player_index].choose(engine)
+            times.append((time.perf_counter_ns() - start) / 1000)
+            engine.apply(index)
+        if engine.winner is None:
+            unfinished += 1
+        else:
+            wins[engine.current_player_index] += 1
+    times.sort()
+    return wins, unfinished, times
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play Fiery Dragon games between computer players.")
+    parser.add_argument('--sections', type=int, default=8, help='number of board sections')
+    parser.add_argument('--numbers', type=parse_card_numbers, default=[1, 2, 3],
+                        help='comma-separated numbers on the cards')
+    parser.add_argument('--cards', type=int, default=4, help='number of cards per character')
+    parser.add_argument('--games', type=int, default=100, help='number of games to play')
+    parser.add_argument('--players', default='perfect,decaying,random,random',
+                        help=f"comma-separated computer player type per seat ({', '.join(PLAYER_TYPES[1:])})")
+    parser.add_argument('--seed', type=int, default=0, help='random seed')
+    parser.add_argument('--max-turns', type=int, default=10000, help='turn limit per game')
+    args = parser.parse_args(argv)
+
+    player_types = args.players.split(',')
+    if len(player_types) != len(PLAYERS):
+        parser.error(f"--players needs one type for each of the {len(PLAYERS)} seats")
+    start = time.perf_counter()
+    wins, unfinished, times = soak(args.games, player_types, args.sections, args.numbers, args.cards,
+                                   args.seed, args.max_turns)
+    elapsed = time.perf_counter() - start
+    print(f"{args.games} games, {len(times)} flips in {elapsed:.2f} s")
+    for seat, (kind, count) in enumerate(zip(player_types, wins)):
+        print(f"  seat {seat} {kind:<9} {count:>6} wins ({count / args.games:.0%})")
+    if unfinished:
+        print(f"  {unfinished} games hit the turn limit")
+    if times:
+        print(f"Decision time: p50 {percentile(times, 50):.1f} us, p99 {percentile(times, 99):.1f} us, "
+              f"max {times[-1]:.1f} us")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
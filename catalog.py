@@ -0,0 +1,146 @@
+# catalog.py
+
+# Index of the saved games for the load and save menus.
+# SAVE_DIR/index.json holds one entry per save file: when it was written, the
+# configuration, the turn, the player positions and the path of a small
+# pre-rendered board thumbnail in SAVE_DIR/thumbnails. The menus list, sort
+# and preview saves from this index alone, without opening any save file.
+# Entries are added when a game is saved or autosaved, by the main thread or
+# the autosave writer thread, so every change holds the catalog's lock.
+
+import json
+import os
+import threading
+import time
+
+import pygame
+from settings import *
+from savefile import SAVE_EXTENSION, write_atomic
+
+INDEX_VERSION = 1
+
+# Menu label: (key function, reverse)
+SORT_ORDERS = {
+    'Newest': (lambda entry: entry['time'], True),
+    'Oldest': (lambda entry: entry['time'], False),
+    'Most turns': (lambda entry: entry['turn'], True),
+}
+
+
+def catalog_entry(engine, card_numbers, num_cards_per_character, kind='manual'):
+    """
+    Return the catalog metadata for a game.
+    :param engine: GameEngine object
+    :param kind: 'manual' or 'autosave'
+    """
+    return {
+        'time': time.time(),
+        'kind': kind,
+        'num_sections': engine.board.num_sections,
+        'card_numbers': list(card_numbers),
+        'num_cards_per_character': num_cards_per_character,
+        'turn': engine.turn,
+        'current_player': engine.current_player.name,
+        'winner': engine.winner.name if engine.winner is not None else None,
+        'players': [[p.name, p.position, p.laps_completed] for p in engine.players],
+    }
+
+
+class SaveCatalog:
+    def __init__(self, directory=SAVE_DIR):
+        self.directory = directory
+        self.index_path = os.path.join(directory, 'index.json')
+        self.thumbnail_dir = os.path.join(directory, 'thumbnails')
+        self._entries = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._entries is None:
+            try:
+                with open(self.index_path) as f:
+                    index = json.load(f)
+                self._entries = index['saves'] if index.get('version') == INDEX_VERSION else {}
+            except (OSError, ValueError, KeyError, AttributeError):
+                self._entries = {}
+        return self._entries
+
+    def _write(self):
+        os.makedirs(self.directory, exist_ok=True)
+        data = json.dumps({'version': INDEX_VERSION, 'saves': self._entries}, separators=(',', ':'))
+        write_atomic(self.index_path, data.encode())
+
+    def new_save_path(self):
+        """
+        Return a path for a new save file, named after the current time.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        stem = time.strftime('save-%Y%m%d-%H%M%S')
+        path = os.path.join(self.directory, stem + SAVE_EXTENSION)
+        number = 1
+        while os.path.exists(path):
+            number += 1
+            path = os.path.join(self.directory, f"{stem}-{number}{SAVE_EXTENSION}")
+        return path
+
+    def add(self, path, entry, thumbnail=None):
+        """
+        Record a save file in the catalog.
+        :param entry: metadata from catalog_entry()
+        :param thumbnail: Surface from views.render_board_thumbnail, or None
+        """
+        entry = dict(entry, thumbnail=None)
+        if thumbnail is not None:
+            os.makedirs(self.thumbnail_dir, exist_ok=True)
+            thumbnail_path = os.path.join(self.thumbnail_dir, os.path.basename(path) + '.png')
+            # pygame picks the image format from the extension, so keep .png last
+            tmp_path = thumbnail_path[:-len('.png')] + '.tmp.png'
+            try:
+                pygame.image.save(thumbnail, tmp_path)
+                os.replace(tmp_path, thumbnail_path)
+                entry['thumbnail'] = thumbnail_path
+            except (OSError, pygame.error) as e:
+                print(f"Unable to save thumbnail for {path}: {e}")
+        with self._lock:
+            self._load()[path] = entry
+            self._write()
+
+    def remove(self, path):
+        with self._lock:
+            entry = self._load().pop(path, None)
+            if entry is None:
+                return
+            self._write()
+        if entry.get('thumbnail'):
+            try:
+                os.remove(entry['thumbnail'])
+            except OSError:
+                pass
+
+    def entries(self, order='Newest'):
+        """
+        Return [(path, entry)] for the saves that still exist, sorted by one
+        of SORT_ORDERS.
+        """
+        with self._lock:
+            entries = self._load()
+            missing = [path for path in entries if not os.path.exists(path)]
+            for path in missing:
+                del entries[path]
+            if missing:
+                self._write()
+            items = list(entries.items())
+        key, reverse = SORT_ORDERS[order]
+        items.sort(key=lambda item: key(item[1]), reverse=reverse)
+        return items
+
+    @staticmethod
+    def load_thumbnail(entry):
+        """
+        Return the entry's thumbnail Surface, or None.
+        """
+        if not entry.get('thumbnail'):
+            return None
+        try:
+            return pygame.image.load(entry['thumbnail']).convert()
+        except (OSError, pygame.error):
+            return None
@@ -1,136 +1,266 @@
 # controllers.py
 
 import pygame
+from concurrent.futures import ThreadPoolExecutor
 from settings import *
-from utils import save_game
+from utils import update_images
 from views import *
-from utils import save_game_menu  # Import save_game_menu from the correct module
+from utils import SaveMenuScene  # Import SaveMenuScene from the correct module
 from models import Player
+from engine import GameEngine
+from scenes import Scene
+from savefile import GameRecord, save_game
+from catalog import catalog_entry
+from bots import attach_bots
 
-def player_turn(player, deck, board, screen, players, clock, card_back_image, 
-                card_numbers, num_cards_per_character, sounds):
-    """
-    Process a player's turn.
-    :param player: Player object
-    :param deck: list of Card objects
-    :param board: Board object
-    :param screen: Pygame screen object
-    :param players: list of Player objects
-    :param clock: Pygame clock object
-    :param card_back_image: Pygame image object
-    :param card_numbers: list of integers
-    :param num_cards_per_character: integer
-    :param sounds: dictionary of Pygame sound objects
-    :return: True if the player has won the game, False otherwise
-    
-    The player_turn function processes a player's turn in the game. 
-    It takes the player, deck, board, screen, players, clock, card_back_image, 
-    card_numbers, num_cards_per_character, and sounds as arguments. 
-    The function returns True if the player has won the game, and False otherwise.
-    """
-
-    turn_active = True
-    save_button = pygame.Rect(screen.get_width() - 150, 20, 130, 40)
-    small_font = pygame.font.Font(None, 36)
-    while turn_active:
-        card = None
-        clicked = False
-        while not clicked:
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    pygame.quit()
-                    exit()
-                elif event.type == pygame.MOUSEBUTTONDOWN:
-                    pos = pygame.mouse.get_pos()
-                    if save_button.collidepoint(pos):
-                        sounds['button_click'].play()  # Play click sound
-                        filename = save_game_menu(screen, sounds)
-                        game_state = {
-                            'board': board,
-                            'deck': deck,
-                            'players': players,
-                            'current_player_index': players.index(player),
-                            'card_numbers': card_numbers,
-                            'num_sections': board.num_sections,
-                            'num_cards_per_character': num_cards_per_character
-                        }
-
-                        save_game(game_state, filename)
-                        display_message(screen, f"Game saved to {filename}.")
-                    else:
-                        for c in deck:
-                            if c.rect.collidepoint(pos) and not c.is_flipped:
-                                card = c
-                                clicked = True
-                                break
-            # Update the display
-            screen.fill(BLACK)
-            draw_board(screen, board)
-            draw_players(screen, players, board)
-            draw_cards(screen, deck, card_back_image, board)
-            draw_player_info(screen, player)
-
-            # Draw Save Game button
-            pygame.draw.rect(screen, GRAY, save_button)
-            save_text = small_font.render('Save Game', True, WHITE)
-            screen.blit(save_text, save_button.move(10, 5))
-
-            pygame.display.flip()
-            # clock: pygame.time.Clock object that controls the frame rate of the game
-            # tick: method of the clock object that limits the frame rate to the specified value (FPS)
-            # FPS: frames per second
-            # The clock.tick(FPS) method will pause the game until the time for the next frame has elapsed.
-            clock.tick(FPS)
-
-        # Process the flipped card
-        if card:
-            card.flip()
-            sounds['card_flip'].play()  # Play card flip sound
-            if card.character == 'pirate':
-                player.move_backward(card.number, board)
-                sounds['player_move'].play()  # Play player move sound
-                message = f"{player.name} moves backward {card.number} steps."
-                turn_active = False
-            elif card.character == player.character:
-                player.move(card.number, board)
-                message = f"{player.name} moves forward {card.number} steps."
-                card.is_flipped = True
-                player.flipped_cards.append(card)
-                if all(c.is_flipped for c in deck):
-                    turn_active = False
+# Computer players choose their cards here, so a searching bot does not hold
+# up drawing and input for its whole time budget
+bot_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='bot')
+
+class GameScene(Scene):
+    ZOOM_STEP = 1.25
+    SCROLL_ROWS = 3
+    PAN_KEYS = {pygame.K_LEFT: (100, 0), pygame.K_RIGHT: (-100, 0), pygame.K_UP: (0, 100), pygame.K_DOWN: (0, -100)}
+
+    def __init__(self, app, board, deck, players, current_player_index, card_back_image,
+                 card_numbers, num_cards_per_character, record=None, turn=0, seed=None,
+                 player_types=None):
+        """
+        The in-game scene: players take turns clicking face-down cards.
+        :param app: App object
+        :param board: Board object
+        :param deck: Deck object
+        :param players: list of Player objects
+        :param current_player_index: index of the player whose turn it is
+        :param card_back_image: Pygame image object
+        :param card_numbers: list of integers
+        :param num_cards_per_character: integer
+        :param record: GameRecord the game was loaded from, or None for a new game
+        :param turn: number of turns completed so far
+        :param seed: seed the deck of a new game was shuffled with
+        :param player_types: 'human' or a bots.RECALL_MODES entry per player,
+            all human by default
+
+        The rules live in GameEngine; this scene only turns clicks into
+        engine actions and shows the results.
+        """
+        super().__init__(app)
+        self.board = board
+        self.deck = deck
+        self.players = players
+        self.card_back_image = card_back_image
+        self.card_numbers = card_numbers
+        self.num_cards_per_character = num_cards_per_character
+        self.engine = GameEngine(board, deck, players, current_player_index, turn)
+        # Every flip is journaled so saving again only appends the new moves
+        self.record = record or GameRecord.start(self.engine, card_numbers, num_cards_per_character, seed,
+                                                 player_types)
+        # Computer players watch every flip; a loaded game's bots start with no memory
+        self.bots = attach_bots(self.engine, player_types or ['human'] * len(players), seed)
+        self.bot_pending = False
+        # Future of the card a computer player is choosing, or None
+        self.bot_future = None
+        # (filename, future) per save still being written by app.autosave
+        self.saves_pending = []
+        self.save_button = pygame.Rect(app.screen.get_width() - 150, 20, 130, 40)
+        # Only the parts of the screen that change are repainted each frame
+        self.renderer = DirtyRenderer(app.screen, board, card_back_image, [self.draw_save_button])
+        # The game may start with placeholder images while they are still loading
+        self.images_pending = app.assets is not None and not app.assets.ready
+
+    def draw_save_button(self, surface):
+        pygame.draw.rect(surface, GRAY, self.save_button)
+        save_text = render_text('Save Game', 36)
+        surface.blit(save_text, self.save_button.move(10, 5))
+
+    def enter(self):
+        # Something else (e.g. the save dialog) may have drawn over the screen
+        self.renderer.invalidate()
+        self.schedule_bot()
+
+    def invalidate_rect(self, rect):
+        self.renderer.mark_dirty(rect)
+
+    def update(self, dt):
+        if self.images_pending:
+            # Images can arrive in more than one batch, the last when ready
+            arrived = self.app.assets.poll()
+            self.images_pending = not self.app.assets.ready
+            if arrived or not self.images_pending:
+                self.reload_images()
+        if self.bot_future is not None and self.bot_future.done():
+            future, self.bot_future = self.bot_future, None
+            card_index = future.result()
+            if card_index is not None and not self.engine.is_terminal():
+                self.flip_card(card_index)
+        if self.saves_pending:
+            self.poll_saves()
+
+    def is_animating(self):
+        # Keep polling the asset loader until the real images are in, and a
+        # thinking computer player until it has chosen, and the save writer
+        return self.images_pending or self.bot_future is not None or bool(self.saves_pending)
+
+    def reload_images(self):
+        """
+        Replace the placeholder images with the loaded ones.
+        """
+        card_images, card_back_image, board_char_images = self.app.assets.images(self.card_numbers)
+        update_images(self.board, self.players, self.deck, card_images, board_char_images)
+        if card_back_image is not None:
+            self.card_back_image = self.renderer.card_back_image = card_back_image
+        self.renderer.invalidate()
+
+    def save_to(self, filename):
+        if self.app.autosave is None:
+            save_game(self.record, filename, self.engine)
+            if self.app.catalog is not None:
+                self.app.catalog.add(filename, self.catalog_entry('manual'), self.thumbnail_renderer()())
+            self.app.messages.show(f"Game saved to {filename}.", replace=True)
+            return
+        # Writing, fsyncing and cataloguing happen on the autosave thread
+        data, append = self.record.prepare_save(filename, self.engine)
+        future = self.app.autosave.save(filename, data, append, self.catalog_entry('manual'),
+                                        self.thumbnail_renderer())
+        self.saves_pending.append((filename, future))
+        self.app.messages.show(f"Saving game to {filename}...", replace=True)
+
+    def poll_saves(self):
+        """
+        Report the saves the autosave thread has finished writing.
+        """
+        while self.saves_pending and self.saves_pending[0][1].done():
+            filename, future = self.saves_pending.pop(0)
+            error = future.exception()
+            if error is None:
+                print(f"Game saved successfully to {filename}.")
+                self.app.messages.show(f"Game saved to {filename}.", replace=True)
             else:
-                message = "No match. Turn ends."
-                card.flip()
-                turn_active = False
+                print(f"Unable to save {filename}: {error}")
+                self.app.messages.show(f"Unable to save {filename}: {error}", replace=True)
+
+    def schedule_bot(self):
+        """
+        If a computer player is to move, flip its card after BOT_DELAY.
+        """
+        if (not self.bot_pending and self.bot_future is None and not self.engine.is_terminal()
+                and self.bots[self.engine.current_player_index]):
+            self.bot_pending = True
+            self.app.call_later(BOT_DELAY, self.bot_move)
+
+    def bot_move(self):
+        self.bot_pending = False
+        # Wait for the save dialog to close, or stop if the game was left
+        if self.app.scene is not self:
+            return
+        bot = self.bots[self.engine.current_player_index]
+        if bot is not None and not self.engine.is_terminal():
+            # Nothing changes the game until the bot has chosen: clicks are
+            # ignored on its turn and update() applies its flip
+            self.bot_future = bot_executor.submit(bot.choose, self.engine)
 
-        # Display the message
-        screen.fill(BLACK)
-        draw_board(screen, board)
-        draw_players(screen, players, board)
-        draw_cards(screen, deck, card_back_image, board)
-        draw_player_info(screen, player)
+    def catalog_entry(self, kind):
+        return catalog_entry(self.engine, self.card_numbers, self.num_cards_per_character, kind)
 
-        # Draw Save Game button
-        pygame.draw.rect(screen, GRAY, save_button)
-        save_text = small_font.render('Save Game', True, WHITE)
-        screen.blit(save_text, save_button.move(10, 5))
+    def thumbnail_renderer(self):
+        """
+        Return a function that draws the board thumbnail as it is now, for
+        another thread to call.
+        """
+        board, tokens = self.board, thumbnail_tokens(self.players)
+        return lambda: render_board_thumbnail(board, tokens)
 
-        display_message(screen, message)
-        clock.tick(FPS)
+    def handle_event(self, event):
+        if self.handle_scroll_event(event):
+            return
+        if self.handle_view_event(event):
+            self.renderer.invalidate()
+            return
+        if event.type != pygame.MOUSEBUTTONDOWN or event.button != 1:
+            return
+        if self.save_button.collidepoint(event.pos):
+            self.app.sounds.play('button_click')  # Play click sound
+            self.app.push(SaveMenuScene(self.app, self.app.catalog, self.save_to))
+        elif not self.engine.is_terminal() and self.bots[self.engine.current_player_index] is None:
+            card = self.renderer.layout.pick(event.pos, self.deck)
+            if card is not None:
+                self.flip_card(card)
+
+    def handle_scroll_event(self, event):
+        """
+        Scroll a deck too big for rings with the mouse wheel over its grid,
+        or a page at a time with PAGE UP and PAGE DOWN.
+        :return: True if the event was a scroll, even one already at the end
+        """
+        layout = self.renderer.layout
+        if layout.mode != layout.GRID:
+            return False
+        if event.type == pygame.MOUSEWHEEL and layout.panel.collidepoint(pygame.mouse.get_pos()):
+            rows = -event.y * self.SCROLL_ROWS
+        elif event.type == pygame.KEYDOWN and event.key in (pygame.K_PAGEUP, pygame.K_PAGEDOWN):
+            rows = layout.rows if event.key == pygame.K_PAGEDOWN else -layout.rows
+        else:
+            return False
+        if layout.scroll_by(rows):
+            self.renderer.mark_dirty(layout.panel)
+        return True
+
+    def handle_view_event(self, event):
+        """
+        Zoom with the mouse wheel or +/-, pan by dragging with the right
+        button or with the arrow keys, HOME shows the whole board and C
+        centres the current player.
+        :return: True if the view changed
+        """
+        view = self.renderer.view
+        before = (view.zoom, view.pan)
+        if event.type == pygame.MOUSEWHEEL:
+            view.zoom_at(pygame.mouse.get_pos(), self.ZOOM_STEP ** event.y)
+        elif event.type == pygame.MOUSEMOTION and event.buttons[2]:
+            view.pan_by(*event.rel)
+        elif event.type == pygame.KEYDOWN:
+            if event.key in (pygame.K_PLUS, pygame.K_EQUALS, pygame.K_KP_PLUS):
+                view.zoom_at(view.viewport.center, self.ZOOM_STEP)
+            elif event.key in (pygame.K_MINUS, pygame.K_KP_MINUS):
+                view.zoom_at(view.viewport.center, 1 / self.ZOOM_STEP)
+            elif event.key in self.PAN_KEYS:
+                view.pan_by(*self.PAN_KEYS[event.key])
+            elif event.key == pygame.K_HOME:
+                view.reset()
+            elif event.key == pygame.K_c:
+                if view.zoom == 1.0:
+                    view.zoom_at(view.viewport.center, view.max_zoom / 2)
+                view.center_on(self.engine.current_player.position)
+        return (view.zoom, view.pan) != before
+
+    def flip_card(self, card_index):
+        # Show the card a computer player picked if it is scrolled out of view
+        layout = self.renderer.layout
+        if layout.scroll_to(card_index):
+            self.renderer.mark_dirty(layout.panel)
+        event = self.engine.apply(card_index)
+        self.record.record(card_index)
+        sounds = self.app.sounds
+        sounds.play('card_flip')  # Play card flip sound
+        if event.kind == 'backward':
+            sounds.play('player_move')  # Play player move sound
+        self.app.messages.show(event.message(), replace=True)
+        if event.turn_over:
+            print_players_status(self.players)
+            if self.app.autosave is not None:
+                # The thumbnail is drawn on the autosave thread; on big boards it is not cheap
+                self.app.autosave.submit(self.record.snapshot(self.engine), self.catalog_entry('autosave'),
+                                         self.thumbnail_renderer())
 
         # Check for win condition
-        if player.laps_completed >= 1:
-            message = f"{player.name} has won the game!"
-            display_message(screen, message)
-            pygame.time.wait(2000)
-            return True
-
-    # Reset cards at the end of the turn
-    for c in deck:
-        c.is_flipped = False
-    player.flipped_cards.clear()
-
-    return False
+        if event.winner is not None:
+            sounds.play('game_end')
+            self.app.messages.show(f"{event.winner.name} has won the game!", 4.0, on_done=self.app.quit)
+        else:
+            self.schedule_bot()
+
+    def draw(self, screen):
+        return self.renderer.render(self.deck, self.players, self.engine.current_player, present=False)
 
 def print_players_status(players):
     print("Players' Status:")
@@ -0,0 +1,117 @@
+# engine.py
+
+# GameEngine holds the rules of Fiery Dragon with no pygame dependency.
+# The pygame controllers, bots, tests and simulations all advance a game
+# through the same legal_actions() / apply() / is_terminal() interface.
+
+
+class TurnEvent:
+    """
+    The outcome of flipping one card.
+    :param player: Player object who flipped the card
+    :param card_index: index of the flipped card in the deck
+    :param card: the flipped Card object
+    :param kind: 'backward', 'forward' or 'no_match'
+    :param turn_over: True if the flip ended the player's turn
+    :param winner: the winning Player object, or None
+    """
+    __slots__ = ('player', 'card_index', 'card', 'kind', 'turn_over', 'winner')
+
+    def __init__(self, player, card_index, card, kind, turn_over, winner=None):
+        self.player = player
+        self.card_index = card_index
+        self.card = card
+        self.kind = kind
+        self.turn_over = turn_over
+        self.winner = winner
+
+    def message(self):
+        """
+        Return the text shown to the players for this event.
+        """
+        if self.kind == 'backward':
+            return f"{self.player.name} moves backward {self.card.number} steps."
+        if self.kind == 'forward':
+            return f"{self.player.name} moves forward {self.card.number} steps."
+        return "No match. Turn ends."
+
+
+class GameEngine:
+    def __init__(self, board, deck, players, current_player_index=0, turn=0):
+        """
+        :param board: Board object
+        :param deck: Deck object
+        :param players: list of Player objects
+        :param current_player_index: index of the player whose turn it is
+        :param turn: number of turns completed so far
+        """
+        self.board = board
+        self.deck = deck
+        self.players = players
+        self.current_player_index = current_player_index
+        self.turn = turn
+        self.winner = None
+        # Called as listener(engine, event) after every flip, e.g. bots.Bot.observe
+        self.listeners = []
+
+    @property
+    def current_player(self):
+        return self.players[self.current_player_index]
+
+    def is_terminal(self):
+        return self.winner is not None or not len(self.deck)
+
+    def legal_actions(self):
+        """
+        Return the indices of the cards the current player may flip.
+        """
+        if self.winner is not None:
+            return []
+        return self.deck.face_down_indices()
+
+    def apply(self, card_index):
+        """
+        Flip the card at card_index for the current player and resolve it.
+        :param card_index: index of a face-down card in the deck
+        :return: TurnEvent describing what happened
+        """
+        if self.winner is not None:
+            raise ValueError("The game is already over.")
+        deck = self.deck
+        if deck.is_flipped(card_index):
+            raise ValueError(f"Card {card_index} is already flipped.")
+
+        card = deck[card_index]
+        player = self.current_player
+        deck.set_flipped(card_index, True)
+        if card.character == 'pirate':
+            player.move_backward(card.number, self.board)
+            kind = 'backward'
+            turn_over = True
+        elif card.character == player.character:
+            player.move(card.number, self.board)
+            player.flipped_cards.append(card)
+            kind = 'forward'
+            turn_over = deck.all_flipped()
+        else:
+            deck.set_flipped(card_index, False)
+            kind = 'no_match'
+            turn_over = True
+
+        if player.laps_completed >= 1:
+            self.winner = player
+            event = TurnEvent(player, card_index, card, kind, True, player)
+        else:
+            if turn_over:
+                self._end_turn()
+            event = TurnEvent(player, card_index, card, kind, turn_over)
+        for listener in self.listeners:
+            listener(self, event)
+        return event
+
+    def _end_turn(self):
+        # Reset cards at the end of the turn and pass to the next player
+        self.deck.reset()
+        self.current_player.flipped_cards.clear()
+        self.current_player_index = (self.current_player_index + 1) % len(self.players)
+        self.turn += 1
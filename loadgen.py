@@ -0,0 +1,252 @@
+# loadgen.py
+
+# Load generator for server.py.
+# Opens many tables at once, each played by one or more connections that
+# flip random face-down cards on their turns and start a rematch whenever a
+# game is won. Every flip carries an id, and the time from sending it to
+# receiving the server's broadcast of its outcome is recorded. After the run
+# the action-to-broadcast latency percentiles and the throughput are printed.
+#
+#   python loadgen.py --spawn --sessions 5000 --duration 30
+#   python loadgen.py --port 8765 --sessions 1000 --clients-per-session 4 --think 0.2
+
+import argparse
+import asyncio
+import gc
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+from settings import *
+from server import raise_file_limit
+
+CONNECT_CONCURRENCY = 256  # Connections opened at once while ramping up
+RESPONSE_TIMEOUT = 10.0    # Seconds to wait for the outcome of a flip
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = []
+        self.errors = 0
+        self.games = 0
+        self.disconnects = 0
+        self.record_after = None
+
+
+class LoadClient:
+    """
+    One connection playing the seats it holds at one table.
+    """
+    def __init__(self, reader, writer, rng, stats, think):
+        self.reader = reader
+        self.writer = writer
+        self.rng = rng
+        self.stats = stats
+        self.think = think
+        self.seats = []
+        self.cards = 0
+        self.face_up = set()
+        self.current = 0
+        self.winner = None
+        self.next_id = 0
+        self.sent = {}
+
+    def send(self, message):
+        self.writer.write((json.dumps(message, separators=(',', ':')) + '\n').encode())
+
+    async def receive(self):
+        line = await self.reader.readline()
+        if not line:
+            raise ConnectionError("The server closed the connection.")
+        return json.loads(line)
+
+    async def request(self, message):
+        """
+        Send a create or join request and read the table state from the reply.
+        """
+        self.send(message)
+        reply = await self.receive()
+        if reply['type'] == 'error':
+            raise ConnectionError(reply['error'])
+        self.load_state(reply)
+        self.seats = reply['seats']
+        return reply
+
+    def load_state(self, state):
+        self.cards = state['cards']
+        self.face_up = {index for index, *_ in state['face_up']}
+        self.current = state['current']
+        self.winner = state['winner']
+
+    def my_turn(self):
+        return self.winner is None and self.current in self.seats
+
+    def flip(self):
+        # Few cards are face up at a time, so a random guess rarely misses
+        card = self.rng.randrange(self.cards)
+        while card in self.face_up:
+            card = self.rng.randrange(self.cards)
+        self.next_id += 1
+        self.sent[self.next_id] = time.perf_counter()
+        self.send({'op': 'flip', 'card': card, 'id': self.next_id})
+
+    async def play(self, stop_at):
+        if self.my_turn():
+            await self.act(stop_at)
+        while True:
+            # Once time is up, wait only for the outcome of a flip still in flight
+            timeout = stop_at - time.perf_counter() if not self.sent else RESPONSE_TIMEOUT
+            if timeout <= 0:
+                break
+            try:
+                message = await asyncio.wait_for(self.receive(), timeout)
+            except asyncio.TimeoutError:
+                if self.sent:
+                    raise ConnectionError("No response from the server.")
+                break
+            kind = message['type']
+            if kind == 'flip':
+                sent = self.sent.pop(message['id'], None) if message['seat'] in self.seats else None
+                if sent is not None and self.stats.record_after <= sent:
+                    self.stats.latencies.append(time.perf_counter() - sent)
+                if message['turn_over']:
+                    self.face_up.clear()
+                elif message['kind'] == 'forward':
+                    self.face_up.add(message['card'])
+                self.current = message['current']
+                self.winner = message['winner']
+                if self.winner is not None and min(self.seats) == 0:
+                    self.stats.games += 1
+                    self.send({'op': 'rematch'})
+            elif kind == 'rematch':
+                self.load_state(message)
+            elif kind == 'error':
+                self.stats.errors += 1
+                self.sent.pop(message.get('id'), None)
+            if self.my_turn() and not self.sent:
+                await self.act(stop_at)
+
+    async def act(self, stop_at):
+        if self.think:
+            await asyncio.sleep(min(self.rng.uniform(0, 2 * self.think), max(0.0, stop_at - time.perf_counter())))
+        if time.perf_counter() < stop_at:
+            self.flip()
+
+
+async def open_client(host, port, connect_limit, rng, stats, think):
+    async with connect_limit:
+        reader, writer = await asyncio.open_connection(host, port)
+    return LoadClient(reader, writer, rng, stats, think)
+
+
+async def run_table(host, port, args, seed, connect_limit, stats, started, start_event):
+    rng = random.Random(seed)
+    seats_each = len(PLAYERS) // args.clients_per_session
+    clients = []
+    try:
+        first = await open_client(host, port, connect_limit, rng, stats, args.think)
+        clients.append(first)
+        state = await first.request({'op': 'create', 'sections': args.sections, 'numbers': args.numbers,
+                                     'cards': args.cards, 'seats': seats_each, 'seed': seed})
+        for i in range(1, args.clients_per_session):
+            client = await open_client(host, port, connect_limit, random.Random(seed + i), stats, args.think)
+            clients.append(client)
+            # The last client takes any seats left over
+            seats = len(PLAYERS) - seats_each * i if i == args.clients_per_session - 1 else seats_each
+            await client.request({'op': 'join', 'session': state['session'], 'seats': seats})
+        started.append(1)
+        await start_event.wait()
+        stop_at = time.perf_counter() + args.duration
+        await asyncio.gather(*(client.play(stop_at) for client in clients))
+    except (ConnectionError, OSError, ValueError) as e:
+        stats.disconnects += 1
+        if stats.disconnects <= 5:
+            print(f"Table {seed}: {e}")
+    finally:
+        for client in clients:
+            client.writer.close()
+
+
+def percentile(sorted_values, q):
+    return sorted_values[min(len(sorted_values) - 1, int(q / 100 * len(sorted_values)))]
+
+
+async def run(host, port, args):
+    stats = Stats()
+    connect_limit = asyncio.Semaphore(CONNECT_CONCURRENCY)
+    started = []
+    start_event = asyncio.Event()
+    ramp_start = time.perf_counter()
+    tables = [asyncio.ensure_future(run_table(host, port, args, args.seed + i * len(PLAYERS), connect_limit,
+                                              stats, started, start_event))
+              for i in range(args.sessions)]
+    # Play starts once every table is seated, or has failed to be
+    while len(started) + stats.disconnects < args.sessions:
+        await asyncio.sleep(0.05)
+    print(f"{len(started)} tables seated in {time.perf_counter() - ramp_start:.1f} s "
+          f"({len(started) * args.clients_per_session} connections)", flush=True)
+    # Keep the collector from rescanning the long-lived tables while measuring
+    gc.freeze()
+    start = time.perf_counter()
+    stats.record_after = start + args.warmup
+    start_event.set()
+    await asyncio.gather(*tables)
+    return stats
+
+
+def spawn_server(port):
+    """
+    Start server.py in a child process and wait until it is listening.
+    """
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'server.py')
+    process = subprocess.Popen([sys.executable, script, '--port', str(port), '--stats', '0'],
+                               stdout=subprocess.PIPE, text=True)
+    for line in process.stdout:
+        if line.startswith('Serving on'):
+            return process
+    raise RuntimeError("The server failed to start.")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the Fiery Dragon server.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=SERVER_PORT)
+    parser.add_argument('--spawn', action='store_true', help="start a server for the run")
+    parser.add_argument('--sessions', type=int, default=1000, help="tables to play at once")
+    parser.add_argument('--clients-per-session', type=int, default=1, choices=range(1, len(PLAYERS) + 1),
+                        help="connections sharing the seats of each table")
+    parser.add_argument('--duration', type=float, default=10.0, help="seconds to play for")
+    parser.add_argument('--warmup', type=float, default=1.0, help="seconds of play not measured")
+    parser.add_argument('--think', type=float, default=0.5, help="mean seconds between a client's flips")
+    parser.add_argument('--sections', type=int, default=8)
+    parser.add_argument('--numbers', type=lambda text: [int(n) for n in text.split(',')], default=[1, 2, 3])
+    parser.add_argument('--cards', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    raise_file_limit()
+    server = spawn_server(args.port) if args.spawn else None
+    try:
+        stats = asyncio.run(run(args.host, args.port, args))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    latencies = sorted(stats.latencies)
+    measured = max(args.duration - args.warmup, 1e-9)
+    print(f"{len(latencies)} flips measured in {measured:.1f} s "
+          f"({len(latencies) / measured:,.0f} flips/s), {stats.games} games won, "
+          f"{stats.errors} errors, {stats.disconnects} tables failed")
+    if latencies:
+        print("Action to broadcast latency: " + ", ".join(
+            f"p{q} {percentile(latencies, q) * 1000:.2f} ms" for q in (50, 95, 99))
+            + f", max {latencies[-1] * 1000:.2f} ms")
+    return 1 if stats.disconnects or not latencies else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,219 +1,260 @@
 # main.py
 
-# main_menu, configuration_menu, setup_new_game, and main functions
+# MainMenuScene, ConfigurationScene, setup_new_game, and main functions
 # are defined in this file. The main function is the entry point of the game.
 """
 """
 
+import argparse
+import glob
+import os
+
 import pygame
 from settings import *
-from models import Card, Player, Board
-from utils import load_game_menu
+from models import Card, Player, Board, create_deck, new_seed
+from utils import LoadMenuScene
 from views import *
-from controllers import player_turn, print_players_status
-from utils import load_card_images, create_deck, load_game, save_game, update_images, load_sounds
-import sys
+from controllers import GameScene, print_players_status
+from utils import create_circular_card_back, update_images
+from savefile import load_game, read_legacy_save, LEGACY_SAVE_PATTERN, SAVE_EXTENSION
+from scenes import App, Scene
+from assets import AssetManager
+from audio import AudioManager
+from autosave import AutosaveService
+from catalog import SaveCatalog, catalog_entry
+from profiler import profiler
+from bots import PLAYER_TYPES
 
-def main_menu(screen, sounds):
+class MainMenuScene(Scene):
     """
-    Display the main menu and return the user's choice.
-    :param screen: pygame.Surface object
-    :return: str
+    The main menu: start a new game or load a saved one.
     """
-    menu_running = True
-    font = pygame.font.Font(None, 74)
-    while menu_running:
+    def __init__(self, app):
+        super().__init__(app)
+        self.new_game_button = pygame.Rect(SCREEN_WIDTH / 2 - 150, 300, 300, 50) # Rect(left, top, width, height): create a new rectangle
+        self.load_game_button = pygame.Rect(SCREEN_WIDTH / 2 - 150, 400, 300, 50)
+
+    def enter(self):
+        super().enter()
+        # Decode the images and sounds while the player is still in the menus
+        self.app.assets.start()
+        self.app.sounds.start()
+
+    def draw_full(self, screen):
         screen.fill(BLACK)
         # Draw title
-        title_text = font.render('Fiery Dragon', True, WHITE)   # render() creates a new surface with the specified text
+        title_text = render_text('Fiery Dragon', 74)   # render_text() returns a cached surface with the specified text
         title_rect = title_text.get_rect(center=(SCREEN_WIDTH / 2, 100))    # get_rect() returns a new rect with the same size as the surface
         screen.blit(title_text, title_rect)
 
         # Draw buttons
-        new_game_button = pygame.Rect(SCREEN_WIDTH / 2 - 150, 300, 300, 50) # Rect(left, top, width, height): create a new rectangle
-        load_game_button = pygame.Rect(SCREEN_WIDTH / 2 - 150, 400, 300, 50)
-
-        pygame.draw.rect(screen, GRAY, new_game_button) # draw.rect(surface, color, rect): draw a rectangle
-        pygame.draw.rect(screen, GRAY, load_game_button)
-
-        small_font = pygame.font.Font(None, 48)
-        new_game_text = small_font.render('Start New Game', True, WHITE)
-        load_game_text = small_font.render('Load Saved Game', True, WHITE)
-
-        screen.blit(new_game_text, new_game_button.move(20, 10)) # .move(x, y): move the rectangle by the specified amount
-        screen.blit(load_game_text, load_game_button.move(5, 10))
-
-        pygame.display.flip()
-
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                pygame.quit()
-                sys.exit()
-            elif event.type == pygame.MOUSEBUTTONDOWN:
-                if new_game_button.collidepoint(event.pos):
-                    sounds['button_click'].play()
-                    return 'new'
-                elif load_game_button.collidepoint(event.pos):
-                    sounds['button_click'].play()
-                    return 'load'
-
-def configuration_menu(screen):
-    menu_running = True
-    font = pygame.font.Font(None, 36)
-    number_of_sections = '8'  # Default value
-    card_numbers_text = '1,2,3'  # Default values
-    number_of_cards_text = '4'  # Default number of cards per character
-
-    # Input boxes
-    sections_input_box = pygame.Rect(SCREEN_WIDTH / 2 - 100, 200, 200, 40)
-    card_numbers_input_box = pygame.Rect(SCREEN_WIDTH / 2 - 100, 260, 200, 40)
-    cards_input_box = pygame.Rect(SCREEN_WIDTH / 2 - 100, 320, 200, 40)
-
-    active_input = None
-
-    while menu_running:
+        pygame.draw.rect(screen, GRAY, self.new_game_button) # draw.rect(surface, color, rect): draw a rectangle
+        pygame.draw.rect(screen, GRAY, self.load_game_button)
+
+        new_game_text = render_text('Start New Game', 48)
+        load_game_text = render_text('Load Saved Game', 48)
+
+        screen.blit(new_game_text, self.new_game_button.move(20, 10)) # .move(x, y): move the rectangle by the specified amount
+        screen.blit(load_game_text, self.load_game_button.move(5, 10))
+
+    def handle_event(self, event):
+        if event.type == pygame.MOUSEBUTTONDOWN:
+            if self.new_game_button.collidepoint(event.pos):
+                self.app.sounds.play('button_click')
+                self.app.sounds.play('game_start')
+                self.app.switch(ConfigurationScene(self.app))
+            elif self.load_game_button.collidepoint(event.pos):
+                self.app.sounds.play('button_click')
+                self.app.switch(LoadMenuScene(self.app, self.app.catalog,
+                                              lambda filename: load_saved_game(self.app, filename),
+                                              lambda: self.app.switch(MainMenuScene(self.app))))
+
+class ConfigurationScene(Scene):
+    """
+    Text inputs for the board and deck configuration. ENTER with no input box
+    selected starts the game.
+    """
+    # Default values
+    DEFAULT_SECTIONS = '8'
+    DEFAULT_CARD_NUMBERS = '1,2,3'
+    DEFAULT_CARDS = '4'  # Default number of cards per character
+    DEFAULT_PLAYERS = ','.join(['human'] * 4)
+
+    LABELS = {
+        'sections': 'Enter the number of sections:',
+        'card_numbers': 'Enter the numbers on the cards (comma-separated):',
+        'cards': 'Enter the number of cards per character:',
+        'players': f"Players ({', '.join(PLAYER_TYPES)}), comma-separated:",
+    }
+
+    def __init__(self, app):
+        super().__init__(app)
+        self.reset_values()
+        # Input boxes, each under its label
+        self.input_boxes = {name: pygame.Rect(SCREEN_WIDTH / 2 - 200, 180 + i * 90, 400, 40)
+                            for i, name in enumerate(self.LABELS)}
+        self.active_input = None
+
+    def reset_values(self):
+        self.values = {
+            'sections': self.DEFAULT_SECTIONS,
+            'card_numbers': self.DEFAULT_CARD_NUMBERS,
+            'cards': self.DEFAULT_CARDS,
+            'players': self.DEFAULT_PLAYERS,
+        }
+
+    def draw_full(self, screen):
         screen.fill(BLACK)
-        instructions = [
-            'Game Configuration',
-            'Enter the number of sections:',
-            'Enter the numbers on the cards (comma-separated):',
-            'Enter the number of cards per character:',
-            'Press ENTER to continue'
-        ]
-        for i, line in enumerate(instructions):
-            text_surface = font.render(line, True, WHITE)
-            screen.blit(text_surface, (SCREEN_WIDTH / 2 - text_surface.get_width() / 2, 80 + i * 40))
-        # Render current text
-        sections_surface = font.render(number_of_sections, True, WHITE)
-        card_numbers_surface = font.render(card_numbers_text, True, WHITE)
-        cards_surface = font.render(number_of_cards_text, True, WHITE)
-        # Draw input boxes
-        pygame.draw.rect(screen, WHITE, sections_input_box, 2)
-        pygame.draw.rect(screen, WHITE, card_numbers_input_box, 2)
-        pygame.draw.rect(screen, WHITE, cards_input_box, 2)
-        # Blit text
-        screen.blit(sections_surface, (sections_input_box.x + 5, sections_input_box.y + 5))
-        screen.blit(card_numbers_surface, (card_numbers_input_box.x + 5, card_numbers_input_box.y + 5))
-        screen.blit(cards_surface, (cards_input_box.x + 5, cards_input_box.y + 5))
-        pygame.display.flip() # Update the display, flip() is inb
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                pygame.quit()
-                sys.exit()
-            elif event.type == pygame.MOUSEBUTTONDOWN:
-                if sections_input_box.collidepoint(event.pos):
-                    active_input = 'sections'
-                elif card_numbers_input_box.collidepoint(event.pos):
-                    active_input = 'card_numbers'
-                elif cards_input_box.collidepoint(event.pos):
-                    active_input = 'cards'
+        lines = [('Game Configuration', 80), ('Press ENTER to continue', 180 + len(self.LABELS) * 90)]
+        lines += [(self.LABELS[name], box.y - 40) for name, box in self.input_boxes.items()]
+        for line, y in lines:
+            text_surface = render_text(line, 36)
+            screen.blit(text_surface, (SCREEN_WIDTH / 2 - text_surface.get_width() / 2, y))
+        for name, box in self.input_boxes.items():
+            # Draw input box and the current text
+            pygame.draw.rect(screen, WHITE, box, 2)
+            screen.blit(render_text(self.values[name], 36), (box.x + 5, box.y + 5))
+
+    def handle_event(self, event):
+        if event.type == pygame.MOUSEBUTTONDOWN:
+            self.active_input = None
+            for name, box in self.input_boxes.items():
+                if box.collidepoint(event.pos):
+                    self.active_input = name
+        elif event.type == pygame.KEYDOWN:
+            self.needs_redraw = True
+            if self.active_input is not None:
+                if event.key == pygame.K_RETURN:
+                    self.active_input = None
+                elif event.key == pygame.K_BACKSPACE:
+                    self.values[self.active_input] = self.values[self.active_input][:-1]
                 else:
-                    active_input = None
-            elif event.type == pygame.KEYDOWN:
-                if active_input == 'sections':
-                    if event.key == pygame.K_RETURN:
-                        active_input = None
-                    elif event.key == pygame.K_BACKSPACE:
-                        number_of_sections = number_of_sections[:-1]
-                    else:
-                        number_of_sections += event.unicode
-                elif active_input == 'card_numbers':
-                    if event.key == pygame.K_RETURN:
-                        active_input = None
-                    elif event.key == pygame.K_BACKSPACE:
-                        card_numbers_text = card_numbers_text[:-1]
-                    else:
-                        card_numbers_text += event.unicode
-                elif active_input == 'cards':
-                    if event.key == pygame.K_RETURN:
-                        active_input = None
-                    elif event.key == pygame.K_BACKSPACE:
-                        number_of_cards_text = number_of_cards_text[:-1]
-                    else:
-                        number_of_cards_text += event.unicode
-                elif event.key == pygame.K_RETURN:
-                    try:
-                        num_sections = int(number_of_sections.strip())
-                        if num_sections <= 0:
-                            raise ValueError
-                        card_numbers = [int(num.strip()) for num in card_numbers_text.split(',') if num.strip()]
-                        if not card_numbers:
-                            raise ValueError
-                        num_cards_per_character = int(number_of_cards_text.strip())
-                        if num_cards_per_character <= 0:
-                            raise ValueError
-                        menu_running = False
-                    except ValueError:
-                        display_message(screen, 'Invalid input. Please try again.')
-                        number_of_sections = '8'
-                        card_numbers_text = '1,2,3'
-                        number_of_cards_text = '4'
-        pygame.time.wait(100)
-    return num_sections, card_numbers, num_cards_per_character
-
-
-def setup_new_game(center, board_char_images, card_images, num_sections, card_numbers, num_cards_per_character):
+                    self.values[self.active_input] += event.unicode
+            elif event.key == pygame.K_RETURN:
+                self.submit()
+
+    def submit(self):
+        try:
+            num_sections = int(self.values['sections'].strip())
+            if num_sections <= 0:
+                raise ValueError
+            card_numbers = [int(num.strip()) for num in self.values['card_numbers'].split(',') if num.strip()]
+            if not card_numbers:
+                raise ValueError
+            num_cards_per_character = int(self.values['cards'].strip())
+            if num_cards_per_character <= 0:
+                raise ValueError
+            player_types = [kind.strip().lower() for kind in self.values['players'].split(',') if kind.strip()]
+            if len(player_types) != len(PLAYERS) or any(kind not in PLAYER_TYPES for kind in player_types):
+                raise ValueError
+        except ValueError:
+            self.app.messages.show('Invalid input. Please try again.', replace=True)
+            self.reset_values()
+            return
+        start_new_game(self.app, num_sections, card_numbers, num_cards_per_character, player_types)
+
+
+def setup_new_game(center, board_char_images, card_images, num_sections, card_numbers, num_cards_per_character,
+                   seed=None):
     board = Board(center=center, radius=BOARD_RADIUS, num_sections=num_sections, board_char_images=board_char_images)
-    deck = create_deck(card_images, card_numbers, num_cards_per_character)
-    players = [
-        Player('Alice', 'dragon', RED),
-        Player('Bob', 'salamander', GREEN),
-        Player('Charlie', 'bat', BLUE),
-        Player('Diana', 'spider', YELLOW)
-    ]
+    board.precompute_steps(card_numbers)
+    deck = create_deck(card_images, card_numbers, num_cards_per_character, seed)
+    players = [Player(name, character, color) for name, character, color in PLAYERS]
     current_player_index = 0
     return board, deck, players, current_player_index
 
 
-def main():
-    pygame.init()
-    pygame.mixer.init()  # Initialize the mixer module
-    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-    pygame.display.set_caption('Fiery Dragon')
-    clock = pygame.time.Clock() # Create a clock object to control the frame rate of the game
+def game_images(app, card_numbers):
+    """
+    Return the images for a game with these card numbers. They may be
+    placeholders; GameScene swaps in the real ones once they are loaded.
+    """
+    card_images, card_back_image, board_char_images = app.assets.images(card_numbers)
+    if card_back_image is None:
+        card_back_image = create_circular_card_back()
+    return card_images, card_back_image, board_char_images
 
-    sounds = load_sounds()  # Load sounds here
 
+def start_new_game(app, num_sections, card_numbers, num_cards_per_character, player_types=None):
     center = (SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2)
+    card_images, card_back_image, board_char_images = game_images(app, card_numbers)
+    # Every game is reproducible from its seed and the recorded moves
+    seed = new_seed()
+    board, deck, players, current_player_index = setup_new_game(center, board_char_images, card_images, num_sections, card_numbers, num_cards_per_character, seed)
+    app.switch(GameScene(app, board, deck, players, current_player_index, card_back_image,
+                         card_numbers, num_cards_per_character, seed=seed, player_types=player_types))
 
-    # Display main menu
-    choice = main_menu(screen, sounds)
-
-    if choice == 'load':
-        filename = load_game_menu(screen, sounds)
-        game_state = load_game(filename)
-        if game_state:
-            board = game_state['board']
-            deck = game_state['deck']
-            players = game_state['players']
-            current_player_index = game_state['current_player_index']
-            card_numbers = game_state.get('card_numbers', [1, 2, 3])
-            num_sections = game_state.get('num_sections', 8)
-            card_images, card_back_image, board_char_images = load_card_images(card_numbers)
-            update_images(board, players, deck, card_images, board_char_images)
-            num_cards_per_character = game_state.get('num_cards_per_character', 4)
-        else:
-            display_message(screen, "No saved game found. Starting new game.")
-            sounds['game_start'].play()
-            num_sections, card_numbers, num_cards_per_character = configuration_menu(screen)
-            card_images, card_back_image, board_char_images = load_card_images(card_numbers)
-            board, deck, players, current_player_index = setup_new_game(center, board_char_images, card_images, num_sections, card_numbers, num_cards_per_character)
+
+def load_saved_game(app, filename):
+    center = (SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2)
+    game_state = load_game(filename, center, BOARD_RADIUS)
+    if game_state:
+        board = game_state['board']
+        deck = game_state['deck']
+        players = game_state['players']
+        current_player_index = game_state['current_player_index']
+        card_numbers = game_state['card_numbers']
+        card_images, card_back_image, board_char_images = game_images(app, card_numbers)
+        update_images(board, players, deck, card_images, board_char_images)
+        num_cards_per_character = game_state['num_cards_per_character']
+        app.switch(GameScene(app, board, deck, players, current_player_index, card_back_image,
+                             card_numbers, num_cards_per_character, game_state['record'],
+                             game_state['turn'], player_types=game_state['player_types']))
     else:
-        sounds['game_start'].play()
-        num_sections, card_numbers, num_cards_per_character = configuration_menu(screen)
-        card_images, card_back_image, board_char_images = load_card_images(card_numbers)
-        board, deck, players, current_player_index = setup_new_game(center, board_char_images, card_images, num_sections, card_numbers, num_cards_per_character)
-
-    running = True
-    while running:
-        player = players[current_player_index]
-        has_won = player_turn(player, deck, board, screen, players, clock, card_back_image, card_numbers, num_cards_per_character, sounds)
-        print_players_status(players)
-        if has_won:
-            sounds['game_end'].play()
-            running = False
+        app.messages.show("No saved game found. Starting new game.")
+        app.sounds.play('game_start')
+        app.switch(ConfigurationScene(app))
+
+
+def migrate_legacy_saves(catalog, directory='.'):
+    """
+    Convert the Save_Slot_N.pkl saves of older versions into the save
+    catalog, once; the old files are left where they are.
+    """
+    center = (SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2)
+    for path in sorted(glob.glob(os.path.join(directory, LEGACY_SAVE_PATTERN))):
+        stem = os.path.splitext(os.path.basename(path))[0]
+        target = os.path.join(catalog.directory, stem + SAVE_EXTENSION)
+        if os.path.exists(target):
+            continue
+        try:
+            record, engine = read_legacy_save(path, center, BOARD_RADIUS)
+            os.makedirs(catalog.directory, exist_ok=True)
+            record.save(target, engine)
+        except (OSError, KeyError, IndexError, ValueError) as e:
+            print(f"Unable to convert {path}: {e}")
             continue
-        current_player_index = (current_player_index + 1) % len(players)
+        header = record.header
+        catalog.add(target, catalog_entry(engine, header['card_numbers'], header['num_cards_per_character']),
+                    render_board_thumbnail(engine.board, thumbnail_tokens(engine.players)))
+        print(f"Converted {path} to {target}.")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fiery Dragon")
+    parser.add_argument('--profile', metavar='FILE',
+                        help="profile every frame and save the timings to FILE on exit "
+                             "(CSV if it ends in .csv, otherwise Chrome trace JSON)")
+    args = parser.parse_args(argv)
+
+    # The mixer is opened later by AudioManager, off the main thread
+    pygame.display.init()
+    pygame.font.init()
+    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    pygame.display.set_caption('Fiery Dragon')
+
+    sounds = AudioManager()
+
+    # One main loop drives every menu and the game itself
+    catalog = SaveCatalog()
+    migrate_legacy_saves(catalog)
+    app = App(screen, sounds, assets=AssetManager(), autosave=AutosaveService(catalog=catalog), catalog=catalog)
+    if args.profile:
+        app.toggle_profiler()
+    app.run(MainMenuScene(app))
+    app.autosave.close()
+    if args.profile:
+        profiler.export(args.profile)
     pygame.quit()
 
 if __name__ == '__main__':
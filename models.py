@@ -1,31 +1,219 @@
 # models.py
 
-import pygame
-import math
+import random
+from array import array
+from itertools import compress
+from operator import ne
+
+import numpy as np
+
+# Characters printed on the board squares, in board order
+BOARD_CHARACTERS = ['dragon', 'salamander', 'bat', 'spider']
+# Characters that can appear on a card; pirates move players backward
+CARD_CHARACTERS = BOARD_CHARACTERS + ['pirate']
 
 class Card:
+    """
+    The face of a card. Every card in a Deck with the same character and
+    number shares one Card object, so only the image is ever assigned after
+    construction. Whether a card is face up is stored in the Deck.
+    """
+    __slots__ = ('character', 'number', 'card_type', 'image')
+
     def __init__(self, character, number, card_type='normal', image=None):
         self.character = character
         self.number = number
         self.card_type = card_type
-        self.is_flipped = False
-        self.rect = None
         self.image = image
 
-    def flip(self):
-        self.is_flipped = not self.is_flipped
+    def __getstate__(self):
+        # The image is not serializable, so only the face data is kept
+        return (self.character, self.number, self.card_type)
+
+    def __setstate__(self, state):
+        self.character, self.number, self.card_type = state
+        self.image = None
+
+class Deck:
+    """
+    A deck of cards stored as compact arrays: one character code (an index
+    into CARD_CHARACTERS) and one number per card, a bitset of face-up cards
+    and a running count of them. Indexing the deck returns the shared Card
+    for that position's face.
+    """
+    def __init__(self, characters=(), numbers=()):
+        self.characters = array('b', characters)
+        self.numbers = array('i', numbers)
+        if len(self.characters) != len(self.numbers):
+            raise ValueError("characters and numbers must have the same length")
+        self._flipped = bytearray((len(self.numbers) + 7) // 8)
+        self.flipped_count = 0
+        self._faces = {}
+        self._images = {}
+
+    @classmethod
+    def from_cards(cls, cards):
+        """
+        Build a deck from (character, number) pairs or Card-like objects.
+        """
+        characters = []
+        numbers = []
+        for card in cards:
+            character, number = (card.character, card.number) if hasattr(card, 'character') else card
+            characters.append(CARD_CHARACTERS.index(character))
+            numbers.append(number)
+        return cls(characters, numbers)
+
+    def __len__(self):
+        return len(self.numbers)
+
+    def __getitem__(self, index):
+        return self.face(self.characters[index], self.numbers[index])
+
+    def __iter__(self):
+        face = self.face
+        for code, number in zip(self.characters, self.numbers):
+            yield face(code, number)
+
+    def face(self, code, number):
+        """
+        Return the shared Card for a character code and number.
+        """
+        card = self._faces.get((code, number))
+        if card is None:
+            character = CARD_CHARACTERS[code]
+            card_type = 'move_backward' if character == 'pirate' else 'normal'
+            card = Card(character, number, card_type, self._images.get(f"{character}_{number}"))
+            self._faces[(code, number)] = card
+        return card
+
+    def set_images(self, card_images):
+        """
+        Attach the card images, keyed like utils.load_card_images.
+        """
+        self._images = card_images
+        for card in self._faces.values():
+            card.image = card_images.get(f"{card.character}_{card.number}")
+
+    def is_flipped(self, index):
+        return self._flipped[index >> 3] >> (index & 7) & 1 == 1
+
+    def set_flipped(self, index, flipped):
+        mask = 1 << (index & 7)
+        byte = self._flipped[index >> 3]
+        if bool(byte & mask) != flipped:
+            self._flipped[index >> 3] = byte ^ mask
+            self.flipped_count += 1 if flipped else -1
+
+    def flip(self, index):
+        self.set_flipped(index, not self.is_flipped(index))
+
+    def all_flipped(self):
+        return self.flipped_count == len(self.numbers)
+
+    def face_down_indices(self):
+        indices = list(range(len(self.numbers)))
+        # Few cards are face up at a time, so deleting them is cheaper than a filter
+        for index in reversed(self.flipped_indices()):
+            del indices[index]
+        return indices
+
+    def flipped_indices(self):
+        if not self.flipped_count:
+            return []
+        # compress() skips the all-zero bytes of the bitset without a Python loop
+        indices = []
+        for byte_index in compress(range(len(self._flipped)), self._flipped):
+            byte = self._flipped[byte_index]
+            base = byte_index << 3
+            indices.extend(base + bit for bit in range(8) if byte >> bit & 1)
+        return indices
+
+    def flipped_state(self):
+        """
+        Return a snapshot of which cards are face up, for changed_since().
+        """
+        return bytes(self._flipped)
+
+    def set_flipped_state(self, state):
+        """
+        Turn the cards over to match a snapshot from flipped_state().
+        """
+        if len(state) != len(self._flipped) or (len(self.numbers) & 7 and state[-1] >> (len(self.numbers) & 7)):
+            raise ValueError("the snapshot is for a deck of a different size")
+        self._flipped[:] = state
+        self.flipped_count = int.from_bytes(state, 'little').bit_count()
+
+    def changed_since(self, state, start=0, stop=None):
+        """
+        Return the indices of the cards turned over since flipped_state()
+        returned `state`.
+        :param start, stop: only look at the cards in range(start, stop)
+        """
+        if stop is None:
+            stop = len(self.numbers)
+        first, last = start >> 3, (stop + 7) >> 3
+        flipped = self._flipped
+        changed = []
+        for byte_index in compress(range(first, last), map(ne, flipped[first:last], state[first:last])):
+            diff = flipped[byte_index] ^ state[byte_index]
+            base = byte_index << 3
+            changed.extend(base + bit for bit in range(8) if diff >> bit & 1 and start <= base + bit < stop)
+        return changed
+
+    def reset(self):
+        """
+        Turn every card face down.
+        """
+        if self.flipped_count:
+            self._flipped[:] = bytes(len(self._flipped))
+            self.flipped_count = 0
+
+    def shuffle(self, rng=random):
+        order = list(range(len(self.numbers)))
+        rng.shuffle(order)
+        self.characters = array('b', (self.characters[i] for i in order))
+        self.numbers = array('i', (self.numbers[i] for i in order))
+        self.reset()
 
     def __getstate__(self):
         state = self.__dict__.copy()
-        # del: removes the specified key from the dictionary
-        del state['image']
-        del state['rect']
+        # The shared faces hold images, which are not serializable
+        del state['_faces']
+        del state['_images']
         return state
 
     def __setstate__(self, state):
         self.__dict__.update(state)
-        self.image = None
-        self.rect = None
+        self._faces = {}
+        self._images = {}
+
+def new_seed():
+    """
+    Return a random seed for a new game.
+    """
+    return random.getrandbits(32)
+
+def create_deck(card_images, card_numbers, num_cards_per_character, seed=None):
+    """
+    Build and shuffle the deck. The same seed always gives the same order.
+    """
+    characters = []
+    numbers = []
+    for code, char in enumerate(BOARD_CHARACTERS):
+        for num in card_numbers:
+            characters += [code] * num_cards_per_character
+            numbers += [num] * num_cards_per_character
+    # Add Pirate cards
+    pirate = CARD_CHARACTERS.index('pirate')
+    for num in card_numbers:
+        if num <= 2:
+            characters += [pirate] * (num_cards_per_character // 2)  # Fewer pirate cards
+            numbers += [num] * (num_cards_per_character // 2)
+    deck = Deck(characters, numbers)
+    deck.set_images(card_images)
+    deck.shuffle(random.Random(seed))
+    return deck
 
 class Player:
     def __init__(self, name, character, color):
@@ -37,24 +225,17 @@ class Player:
         self.flipped_cards = []
 
     def move(self, steps, board):
-        previous_position = self.position
-        total_subsections = len(board.subsections)
-        self.position = (self.position + steps) % total_subsections
-        if self.position < previous_position:
-            self.laps_completed += 1
+        self.position, lap_delta = board.step(self.position, steps)
+        self.laps_completed += lap_delta
         self.update_character(board)
 
     def move_backward(self, steps, board):
-        previous_position = self.position
-        total_subsections = len(board.subsections)
-        self.position = (self.position - steps) % total_subsections
-        if self.position > previous_position:
-            self.laps_completed -= 1
+        self.position, lap_delta = board.step(self.position, -steps)
+        self.laps_completed += lap_delta
         self.update_character(board)
 
     def update_character(self, board):
-        subsection = board.subsections[self.position]
-        self.character = subsection['character']
+        self.character = board.character_at(self.position)
 
 class Board:
     def __init__(self, center, radius, num_sections, board_char_images):
@@ -65,21 +246,58 @@ class Board:
         self.create_sections()
 
     def create_sections(self):
-        characters = ['dragon', 'salamander', 'bat', 'spider']
+        """
+        Build the lookup tables for the board squares:
+        char_codes[i] is the index into BOARD_CHARACTERS of square i, and
+        (xs[i], ys[i]) is its centre on screen.
+        """
         total_subsections = self.num_sections * 3
-        angle_step = 360 / total_subsections
-        subsections = []
-        for i in range(total_subsections):
-            angle = math.radians(i * angle_step)
-            x_sub = self.center[0] + self.radius * math.cos(angle)
-            y_sub = self.center[1] + self.radius * math.sin(angle)
-            character = characters[i % len(characters)]
-            subsections.append({
-                'character': character,
-                'index': i,
-                'position': (x_sub, y_sub)
-            })
-        self.subsections = subsections
+        self.total_subsections = total_subsections
+        self.square_indices = np.arange(total_subsections, dtype=np.int32)
+        angles = np.radians(self.square_indices * (360 / total_subsections))
+        self.xs = self.center[0] + self.radius * np.cos(angles)
+        self.ys = self.center[1] + self.radius * np.sin(angles)
+        self.char_codes = (self.square_indices % len(BOARD_CHARACTERS)).astype(np.int8)
+        self._step_tables = {}
+
+    def precompute_steps(self, card_numbers):
+        """
+        Build the move tables for every card number, forward and backward.
+        """
+        for number in card_numbers:
+            self.step_table(number)
+            self.step_table(-number)
+
+    def step_table(self, steps):
+        """
+        Return the move table for moving `steps` squares from every square,
+        backward if steps is negative. The table is a pair of arrays: the
+        square reached, and the change in laps completed (+1 when a forward
+        move passes the start, -1 when a backward move does).
+        """
+        table = self._step_tables.get(steps)
+        if table is None:
+            destinations = (self.square_indices + steps) % self.total_subsections
+            if steps >= 0:
+                lap_deltas = (destinations < self.square_indices).astype(np.int8)
+            else:
+                lap_deltas = -(destinations > self.square_indices).astype(np.int8)
+            table = (destinations, lap_deltas)
+            self._step_tables[steps] = table
+        return table
+
+    def step(self, position, steps):
+        """
+        :return: (new position, change in laps completed)
+        """
+        destinations, lap_deltas = self.step_table(steps)
+        return int(destinations[position]), int(lap_deltas[position])
+
+    def character_at(self, position):
+        return BOARD_CHARACTERS[self.char_codes[position]]
+
+    def position_of(self, index):
+        return (float(self.xs[index]), float(self.ys[index]))
 
     def __getstate__(self):
         """
@@ -99,8 +317,14 @@ class Board:
 
         # del: removes the specified key from the dictionary
         del state['board_char_images']
+        # The lookup tables are rebuilt from num_sections when loading
+        for key in ('total_subsections', 'square_indices', 'xs', 'ys', 'char_codes', '_step_tables'):
+            state.pop(key, None)
         return state
 
     def __setstate__(self, state):
+        # Saves from before the lookup tables still carry a subsections list
+        state.pop('subsections', None)
         self.__dict__.update(state)
         self.board_char_images = None
+        self.create_sections()
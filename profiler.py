@@ -0,0 +1,182 @@
+# profiler.py
+
+# Per-frame phase timings.
+# App.frame marks the end of each phase of a frame (events, timers, update,
+# draw, messages, present, tasks) and the renderer wraps the expensive parts
+# of drawing (the board layer, the cards, the tokens, text rendering) in
+# sections. While the profiler is enabled these are stored in a ring buffer of
+# the last PROFILE_FRAMES frames, which the overlay (views.draw_profiler_overlay)
+# graphs and export() writes as CSV or Chrome trace JSON (chrome://tracing,
+# ui.perfetto.dev). While it is disabled every call returns at its first test.
+
+import csv
+import json
+import time
+
+import numpy as np
+from settings import *
+
+
+class _NullSection:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_SECTION = _NullSection()
+
+
+class _Section:
+    __slots__ = ('profiler', 'name', 'start')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter()
+        self.profiler.record(self.name, self.start, end - self.start)
+        return False
+
+
+class Profiler:
+    """
+    Ring buffer of per-frame phase timings. Phases that run more than once in
+    a frame (e.g. text rendering) are summed.
+    """
+    MAX_PHASES = 32
+
+    def __init__(self, capacity=PROFILE_FRAMES):
+        self.capacity = capacity
+        self.enabled = False
+        self.names = []
+        self._columns = {}
+        self.frame_starts = np.zeros(capacity)
+        self.frame_times = np.zeros(capacity)
+        self.starts = np.zeros((capacity, self.MAX_PHASES))
+        self.durations = np.full((capacity, self.MAX_PHASES), np.nan)
+        self.count = 0
+        self._row = None
+        self._mark = 0.0
+
+    def clear(self):
+        self.count = 0
+        self.durations.fill(np.nan)
+
+    def begin_frame(self):
+        if not self.enabled:
+            return
+        row = self.count % self.capacity
+        self.durations[row] = np.nan
+        self._row = row
+        self._mark = self.frame_starts[row] = time.perf_counter()
+
+    def mark(self, name):
+        """
+        End the phase called name, which began at the previous mark or at the
+        start of the frame.
+        """
+        if self._row is None:
+            return
+        now = time.perf_counter()
+        self.record(name, self._mark, now - self._mark)
+        self._mark = now
+
+    def section(self, name):
+        """
+        Return a context manager timing a nested part of a phase.
+        """
+        if self._row is None:
+            return NULL_SECTION
+        return _Section(self, name)
+
+    def end_frame(self):
+        row = self._row
+        if row is None:
+            return
+        self.frame_times[row] = time.perf_counter() - self.frame_starts[row]
+        self.count += 1
+        self._row = None
+
+    def record(self, name, start, duration):
+        row = self._row
+        if row is None:
+            return
+        column = self._columns.get(name)
+        if column is None:
+            if len(self.names) == self.MAX_PHASES:
+                return
+            column = self._columns[name] = len(self.names)
+            self.names.append(name)
+        if np.isnan(self.durations[row, column]):
+            self.starts[row, column] = start
+            self.durations[row, column] = duration
+        else:
+            self.durations[row, column] += duration
+
+    def rows(self):
+        """
+        Return the ring buffer rows of the recorded frames, oldest first.
+        """
+        n = min(self.count, self.capacity)
+        return (np.arange(self.count - n, self.count) % self.capacity) if n else np.arange(0)
+
+    def recent_frame_times(self, n):
+        rows = self.rows()[-n:]
+        return self.frame_times[rows]
+
+    def fps(self, n=60):
+        rows = self.rows()[-n:]
+        if len(rows) < 2:
+            return 0.0
+        span = self.frame_starts[rows[-1]] - self.frame_starts[rows[0]]
+        return (len(rows) - 1) / span if span > 0 else 0.0
+
+    def export(self, path):
+        """
+        Write the recorded frames to path: CSV if it ends in .csv, otherwise
+        Chrome trace JSON.
+        """
+        if path.endswith('.csv'):
+            self.export_csv(path)
+        else:
+            self.export_chrome_trace(path)
+
+    def export_csv(self, path):
+        rows = self.rows()
+        columns = range(len(self.names))
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['frame', 'start_ms', 'frame_ms'] + [f"{name}_ms" for name in self.names])
+            origin = self.frame_starts[rows[0]] if len(rows) else 0.0
+            for frame, row in enumerate(rows):
+                durations = self.durations[row]
+                writer.writerow(
+                    [frame, f"{(self.frame_starts[row] - origin) * 1000:.3f}", f"{self.frame_times[row] * 1000:.3f}"]
+                    + ['' if np.isnan(durations[c]) else f"{durations[c] * 1000:.3f}" for c in columns])
+
+    def export_chrome_trace(self, path):
+        rows = self.rows()
+        events = []
+        origin = self.frame_starts[rows[0]] if len(rows) else 0.0
+        for frame, row in enumerate(rows):
+            events.append({'name': 'frame', 'ph': 'X', 'pid': 1, 'tid': 1, 'args': {'frame': frame},
+                           'ts': (self.frame_starts[row] - origin) * 1e6, 'dur': self.frame_times[row] * 1e6})
+            for column, name in enumerate(self.names):
+                duration = self.durations[row, column]
+                if not np.isnan(duration):
+                    events.append({'name': name, 'ph': 'X', 'pid': 1, 'tid': 1,
+                                   'ts': (self.starts[row, column] - origin) * 1e6, 'dur': duration * 1e6})
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+
+
+profiler = Profiler()
@@ -0,0 +1,243 @@
+# replay.py
+
+# Replay recorded games.
+# Every game is shuffled from a seed kept in its save file header, and the
+# save file's journal holds every card flipped since its start checkpoint.
+# For a game recorded from its first move, the seed and the journal are the
+# whole game. ReplayIndex
+# re-runs it through GameEngine, keeping a keyframe every few turns so a
+# replay can seek to any turn without starting over, and the packed end state
+# so two runs can be compared byte for byte.
+#
+#   python replay.py saves/save-20240101-120000.fds
+#   python replay.py SAVE --expect 3f2a...   exit with status 1 if the end state differs
+#   python replay.py SAVE --ui --speed 4 --turn 30
+
+import argparse
+import bisect
+import hashlib
+import sys
+import time
+
+import pygame
+from settings import *
+from models import Player, create_deck
+from engine import GameEngine
+from savefile import GameRecord, encode_checkpoint, new_board, restore_checkpoint
+from scenes import Scene
+from views import DirtyRenderer, render_text
+
+KEYFRAME_INTERVAL = 10
+BOARD_CENTER = (SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2)
+
+
+def initial_engine(header, board):
+    """
+    Return a GameEngine at the start of the game described by a save file
+    header, with the deck shuffled from its seed.
+    """
+    deck = create_deck({}, header['card_numbers'], header['num_cards_per_character'], header['seed'])
+    players = [Player(name, character, tuple(color)) for name, color, character in header['players']]
+    return GameEngine(board, deck, players)
+
+
+def start_engine(record, board):
+    """
+    Return a GameEngine at the record's checkpoint. A checkpoint at the start
+    of a seeded game is rebuilt from the seed and must match the saved one.
+    """
+    header = record.header
+    engine = restore_checkpoint(record.checkpoint, header, board)
+    if engine.turn == 0 and header.get('seed') is not None and len(header['players'][0]) == 3:
+        seeded = initial_engine(header, board)
+        if encode_checkpoint(seeded) != encode_checkpoint(engine):
+            raise ValueError("The deck shuffled from the saved seed does not match the saved deck.")
+        engine = seeded
+    return engine
+
+
+def state_digest(engine):
+    """
+    Return a hex digest of the packed game state, for regression checks.
+    """
+    return hashlib.sha1(encode_checkpoint(engine)).hexdigest()
+
+
+class ReplayIndex:
+    """
+    Runs a recorded game once and remembers a keyframe (the packed state) at
+    every `interval` turns, so seek() can restore any turn quickly.
+    """
+    def __init__(self, record, interval=KEYFRAME_INTERVAL, center=BOARD_CENTER, radius=BOARD_RADIUS):
+        self.record = record
+        self.interval = interval
+        self.board = new_board(record.header, center, radius)
+        engine = start_engine(record, self.board)
+        self.first_turn = engine.turn
+        # Parallel lists: turn, position in the journal, packed state
+        self.turns = []
+        self.positions = []
+        self.states = []
+        self._add_keyframe(engine, 0)
+        start = time.perf_counter()
+        for position, card_index in enumerate(record.actions, 1):
+            event = engine.apply(card_index)
+            # A winning flip ends the game without starting a new turn
+            if event.turn_over and engine.turn % interval == 0 and engine.turn != self.turns[-1]:
+                self._add_keyframe(engine, position)
+        self.elapsed = time.perf_counter() - start
+        self.last_turn = engine.turn
+        self.end_state = encode_checkpoint(engine)
+        self.winner = engine.winner
+
+    def _add_keyframe(self, engine, position):
+        self.turns.append(engine.turn)
+        self.positions.append(position)
+        self.states.append(encode_checkpoint(engine))
+
+    def seek(self, turn, board=None):
+        """
+        Return (engine, position): the game at the start of the given turn
+        (or the last turn), and the number of journal entries played so far.
+        :param board: Board to use instead of the index's own
+        """
+        turn = max(self.first_turn, min(turn, self.last_turn))
+        i = bisect.bisect_right(self.turns, turn) - 1
+        engine = restore_checkpoint(self.states[i], self.record.header, board or self.board)
+        position = self.positions[i]
+        actions = self.record.actions
+        while engine.turn < turn and position < len(actions):
+            engine.apply(actions[position])
+            position += 1
+        return engine, position
+
+
+class ReplayScene(Scene):
+    """
+    Plays a recorded game in the window at `speed` flips per second.
+    SPACE pauses, LEFT/RIGHT seek by a keyframe interval, UP/DOWN change the
+    speed and ESCAPE quits.
+    """
+    def __init__(self, app, index, card_images, card_back_image, board_char_images, speed=2.0, turn=0):
+        super().__init__(app)
+        self.index = index
+        self.card_images = card_images
+        self.speed = speed
+        self.playing = True
+        self.elapsed = 0.0
+        self.status = None
+        self.status_rect = pygame.Rect(20, SCREEN_HEIGHT - 50, 600, 40)
+        self.board = index.board
+        self.board.board_char_images = board_char_images
+        self.renderer = DirtyRenderer(app.screen, self.board, card_back_image)
+        self.seek(turn)
+
+    def seek(self, turn):
+        self.engine, self.position = self.index.seek(turn)
+        self.engine.deck.set_images(self.card_images)
+        self.renderer.invalidate()
+        self.status = None
+
+    def enter(self):
+        self.renderer.invalidate()
+        self.status = None
+
+    def invalidate_rect(self, rect):
+        self.renderer.mark_dirty(rect)
+
+    def is_animating(self):
+        return self.playing and self.position < len(self.index.record.actions)
+
+    def handle_event(self, event):
+        if event.type != pygame.KEYDOWN:
+            return
+        if event.key == pygame.K_SPACE:
+            self.playing = not self.playing
+        elif event.key == pygame.K_RIGHT:
+            self.seek(self.engine.turn + self.index.interval)
+        elif event.key == pygame.K_LEFT:
+            self.seek(self.engine.turn - self.index.interval)
+        elif event.key == pygame.K_UP:
+            self.speed *= 2
+        elif event.key == pygame.K_DOWN:
+            self.speed = max(0.25, self.speed / 2)
+        elif event.key == pygame.K_ESCAPE:
+            self.app.quit()
+        self.status = None
+
+    def update(self, dt):
+        if not self.is_animating():
+            return
+        self.elapsed += dt
+        actions = self.index.record.actions
+        while self.elapsed >= 1 / self.speed and self.position < len(actions):
+            self.elapsed -= 1 / self.speed
+            event = self.engine.apply(actions[self.position])
+            self.position += 1
+            self.app.messages.show(event.message(), min(2.0, 1 / self.speed), replace=True)
+        if self.position >= len(actions):
+            self.elapsed = 0.0
+
+    def draw(self, screen):
+        engine = self.engine
+        dirty = self.renderer.render(engine.deck, engine.players, engine.current_player, present=False)
+        status = f"Turn {engine.turn}/{self.index.last_turn}  {self.speed:g} flips/s" + ('' if self.playing else '  paused')
+        if status != self.status or dirty is None:
+            self.status = status
+            screen.fill(BLACK, self.status_rect)
+            screen.blit(render_text(status, 32), self.status_rect)
+            if dirty is not None:
+                dirty.append(self.status_rect)
+        return dirty
+
+
+def run_ui(index, speed, turn):
+    from scenes import App
+    from audio import AudioManager
+    from assets import AssetManager
+    from utils import create_circular_card_back
+
+    pygame.display.init()
+    pygame.font.init()
+    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    pygame.display.set_caption('Fiery Dragon - Replay')
+    assets = AssetManager()
+    assets.wait(index.record.header['card_numbers'])
+    card_images, card_back_image, board_char_images = assets.images(index.record.header['card_numbers'])
+    app = App(screen, AudioManager(), assets=assets)
+    app.run(ReplayScene(app, index, card_images, card_back_image or create_circular_card_back(),
+                        board_char_images, speed, turn))
+    pygame.quit()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a saved Fiery Dragon game.")
+    parser.add_argument('save', help="save file to replay")
+    parser.add_argument('--ui', action='store_true', help="show the replay in a window")
+    parser.add_argument('--speed', type=float, default=2.0, help="flips per second in the window")
+    parser.add_argument('--turn', type=int, default=0, help="turn to start the window replay at")
+    parser.add_argument('--keyframe-interval', type=int, default=KEYFRAME_INTERVAL,
+                        help="turns between keyframes")
+    parser.add_argument('--expect', help="expected end state digest; exit with status 1 if it differs")
+    args = parser.parse_args(argv)
+
+    record = GameRecord.read(args.save)
+    index = ReplayIndex(record, args.keyframe_interval)
+    digest = hashlib.sha1(index.end_state).hexdigest()
+    moves = len(record.actions)
+    rate = moves / index.elapsed if index.elapsed > 0 else float('inf')
+    print(f"Seed {record.header.get('seed')}: replayed {moves} moves, turns {index.first_turn}-{index.last_turn}, "
+          f"in {index.elapsed * 1000:.1f} ms ({rate:,.0f} moves/s)")
+    if index.winner is not None:
+        print(f"Winner: {index.winner.name}")
+    print(f"End state: {digest}")
+    if args.expect and args.expect != digest:
+        print(f"End state differs from the expected {args.expect}")
+        return 1
+    if args.ui:
+        run_ui(index, args.speed, args.turn)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
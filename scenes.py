@@ -0,0 +1,388 @@
+# scenes.py
+
+# The game runs as a single main loop in App.run. Each screen of the game
+# (main menu, configuration, the game itself, the save and load dialogs) is a
+# Scene that reacts to events and draws itself, and App switches between them.
+# Messages are shown by a timed MessageQueue drawn over the current scene
+# instead of blocking the loop, and small pieces of background work can be
+# scheduled to run between frames.
+
+import heapq
+import time
+from collections import deque
+
+import pygame
+from settings import *
+from views import draw_message, message_rect, draw_profiler_overlay, profiler_overlay_rect
+from profiler import profiler
+
+
+class Scene:
+    """
+    Base class for the screens of the game. A scene is driven by App: it gets
+    every event, an update with the elapsed time each frame, and a draw call.
+    """
+    def __init__(self, app):
+        self.app = app
+        self.needs_redraw = True
+
+    def enter(self):
+        """
+        Called when the scene becomes the active scene, including when a
+        dialog on top of it closes.
+        """
+        self.needs_redraw = True
+
+    def exit(self):
+        """
+        Called when the scene stops being the active scene.
+        """
+
+    def handle_event(self, event):
+        pass
+
+    def update(self, dt):
+        pass
+
+    def is_animating(self):
+        """
+        Return True while the scene changes on its own, without input, so the
+        main loop keeps drawing at full frame rate.
+        """
+        return False
+
+    def invalidate_rect(self, rect):
+        """
+        Repaint rect on the next frame, e.g. where an overlay was removed.
+        """
+        self.needs_redraw = True
+
+    def draw(self, screen):
+        """
+        Draw the scene if anything changed.
+        :return: None if the whole screen was drawn, otherwise the list of
+            changed rects (empty if nothing changed)
+        """
+        if not self.needs_redraw:
+            return []
+        self.needs_redraw = False
+        self.draw_full(screen)
+        return None
+
+    def draw_full(self, screen):
+        screen.fill(BLACK)
+
+
+class Message:
+    __slots__ = ('text', 'duration', 'on_done')
+
+    def __init__(self, text, duration, on_done):
+        self.text = text
+        self.duration = duration
+        self.on_done = on_done
+
+
+class MessageQueue:
+    """
+    Messages shown one after another near the top of the screen, each for a
+    fixed time, without blocking the main loop.
+    """
+    def __init__(self):
+        self._queue = deque()
+        self.current = None
+        self.remaining = 0.0
+        self.rect = None
+        self.changed = False
+
+    def show(self, text, duration=2.0, replace=False, on_done=None):
+        """
+        Queue a message.
+        :param duration: seconds the message stays on screen
+        :param replace: drop the queued messages and show this one now
+        :param on_done: called when the message is taken down
+        """
+        message = Message(text, duration, on_done)
+        if replace:
+            self._queue.clear()
+            if self.current is not None:
+                self._finish()
+        self._queue.append(message)
+
+    @property
+    def active(self):
+        return self.current is not None or bool(self._queue)
+
+    def clear(self):
+        self._queue.clear()
+        self.current = None
+        self.changed = True
+
+    def _finish(self):
+        message = self.current
+        self.current = None
+        self.changed = True
+        if message.on_done:
+            message.on_done()
+
+    def update(self, dt):
+        """
+        Advance the timers.
+        :return: the rect of a message that was taken down, or None
+        """
+        uncovered = None
+        if self.current is not None:
+            self.remaining -= dt
+            if self.remaining <= 0:
+                uncovered = self.rect
+                self._finish()
+        elif self.rect is not None:
+            # Replaced or cleared since the last frame
+            uncovered = self.rect
+        if self.current is None:
+            self.rect = None
+            if self._queue:
+                self.current = self._queue.popleft()
+                self.remaining = self.current.duration
+                self.changed = True
+        return uncovered
+
+    def draw(self, screen):
+        self.rect = draw_message(screen, self.current.text)
+        self.changed = False
+        return self.rect
+
+    def current_rect(self, screen):
+        return message_rect(screen, self.current.text)
+
+
+class FrameScheduler:
+    """
+    Decide how long the main loop sleeps between frames. While something is
+    animating (a message, a background task, an animating scene) frames are
+    paced at FPS, or BACKGROUND_FPS when the window is not focused. Otherwise
+    the loop blocks in pygame.event.wait until input arrives or the next timer
+    is due, so an idle game uses almost no CPU.
+    """
+    def __init__(self, clock):
+        self.clock = clock
+        self.focused = True
+
+    def wait(self, busy, timeout):
+        """
+        Sleep until the next frame and return the events that arrived.
+        :param busy: True if the next frame must be drawn on schedule
+        :param timeout: seconds until the next timer, or None
+        """
+        if busy:
+            self.clock.tick(FPS if self.focused else BACKGROUND_FPS)
+            events = pygame.event.get()
+        else:
+            wait_ms = IDLE_TIMEOUT_MS if timeout is None else min(IDLE_TIMEOUT_MS, int(timeout * 1000) + 1)
+            # A timeout of 0 would wait forever
+            event = pygame.event.wait(max(wait_ms, 1))
+            events = [] if event.type == pygame.NOEVENT else [event]
+            events += pygame.event.get()
+            # Keep the clock from counting the idle time as one long frame
+            self.clock.tick()
+        for event in events:
+            self._track_focus(event)
+        return events
+
+    def _track_focus(self, event):
+        if event.type == pygame.WINDOWFOCUSLOST:
+            self.focused = False
+        elif event.type == pygame.WINDOWFOCUSGAINED:
+            self.focused = True
+
+
+class App:
+    """
+    Owns the window and runs the main loop for a stack of scenes. The top
+    scene receives the input; scenes below it (e.g. the game under a save
+    dialog) wait until it is popped.
+    """
+    # Time per frame given to background tasks
+    TASK_BUDGET = 0.004
+    # Show the profiler overlay, and save what it recorded
+    PROFILER_KEY = pygame.K_F3
+    PROFILE_EXPORT_KEY = pygame.K_F4
+
+    def __init__(self, screen, sounds, clock=None, assets=None, autosave=None, catalog=None):
+        self.screen = screen
+        self.sounds = sounds
+        # AssetManager loading the images in the background
+        self.assets = assets
+        # AutosaveService the game hands a snapshot to after every turn
+        self.autosave = autosave
+        # SaveCatalog listing the saved games
+        self.catalog = catalog
+        self.clock = clock or pygame.time.Clock()
+        self.scheduler = FrameScheduler(self.clock)
+        self.messages = MessageQueue()
+        self.running = False
+        self._scenes = []
+        self._timers = []
+        self._timer_count = 0
+        self._tasks = deque()
+        self.show_profiler = False
+
+    @property
+    def scene(self):
+        return self._scenes[-1] if self._scenes else None
+
+    def switch(self, scene):
+        """
+        Replace the whole scene stack with scene.
+        """
+        while self._scenes:
+            self._scenes.pop().exit()
+        self._scenes.append(scene)
+        scene.enter()
+
+    def push(self, scene):
+        """
+        Show scene on top of the current one, e.g. a dialog.
+        """
+        if self.scene:
+            self.scene.exit()
+        self._scenes.append(scene)
+        scene.enter()
+
+    def pop(self):
+        """
+        Close the top scene and return to the one below it.
+        """
+        self._scenes.pop().exit()
+        if self.scene:
+            self.scene.enter()
+
+    def quit(self):
+        self.running = False
+
+    def call_later(self, delay, callback):
+        """
+        Call callback from the main loop after delay seconds.
+        """
+        self._timer_count += 1
+        heapq.heappush(self._timers, (time.monotonic() + delay, self._timer_count, callback))
+
+    def add_task(self, task):
+        """
+        Run a generator as a background task: one step is taken at a time
+        between frames, for up to TASK_BUDGET seconds per frame.
+        """
+        self._tasks.append(task)
+
+    def is_busy(self):
+        """
+        Return True if the next frame has to be drawn without waiting for input.
+        """
+        scene = self.scene
+        return (self.messages.active or bool(self._tasks) or self.show_profiler
+                or (scene is not None and scene.is_animating()))
+
+    def time_to_next_timer(self):
+        if not self._timers:
+            return None
+        return max(0.0, self._timers[0][0] - time.monotonic())
+
+    def _run_timers(self):
+        now = time.monotonic()
+        while self._timers and self._timers[0][0] <= now:
+            _, _, callback = heapq.heappop(self._timers)
+            callback()
+
+    def _run_tasks(self):
+        deadline = time.perf_counter() + self.TASK_BUDGET
+        while self._tasks and time.perf_counter() < deadline:
+            task = self._tasks[0]
+            try:
+                next(task)
+                # Round robin between tasks
+                self._tasks.rotate(-1)
+            except StopIteration:
+                self._tasks.popleft()
+
+    def toggle_profiler(self):
+        """
+        Start or stop profiling and show or hide its overlay. While it is
+        shown frames are drawn continuously so the graph stays live.
+        """
+        self.show_profiler = profiler.enabled = not self.show_profiler
+        if not self.show_profiler and self.scene:
+            self.scene.invalidate_rect(profiler_overlay_rect(self.screen))
+
+    def export_profile(self):
+        path = time.strftime('profile-%Y%m%d-%H%M%S.json')
+        profiler.export(path)
+        self.messages.show(f"Profile saved to {path}.", replace=True)
+
+    def frame(self, dt, events=None):
+        """
+        Process one frame: events, timers, updates, drawing.
+        :param events: the events to handle, pygame.event.get() if None
+        """
+        profiler.begin_frame()
+        if events is None:
+            events = pygame.event.get()
+        for event in events:
+            if event.type == pygame.QUIT:
+                self.quit()
+                return
+            if event.type == pygame.KEYDOWN and event.key == self.PROFILER_KEY:
+                self.toggle_profiler()
+            elif event.type == pygame.KEYDOWN and event.key == self.PROFILE_EXPORT_KEY and profiler.count:
+                self.export_profile()
+            elif self.scene:
+                self.scene.handle_event(event)
+        profiler.mark('events')
+        self._run_timers()
+        profiler.mark('timers')
+        scene = self.scene
+        if scene is None:
+            self.quit()
+            return
+        scene.update(dt)
+        uncovered = self.messages.update(dt)
+        if uncovered is not None:
+            scene.invalidate_rect(uncovered)
+        profiler.mark('update')
+
+        screen = self.screen
+        dirty = scene.draw(screen)
+        profiler.mark('draw')
+        if self.messages.current is not None:
+            rect = self.messages.current_rect(screen)
+            if dirty is None or self.messages.changed or rect.collidelist(dirty) != -1:
+                self.messages.draw(screen)
+                if dirty is not None:
+                    dirty.append(rect)
+        if self.show_profiler:
+            rect = draw_profiler_overlay(screen, profiler)
+            if dirty is not None:
+                dirty.append(rect)
+        profiler.mark('overlays')
+        if dirty is None:
+            pygame.display.flip()
+        elif dirty:
+            pygame.display.update(dirty)
+        profiler.mark('present')
+        self._run_tasks()
+        profiler.mark('tasks')
+        profiler.end_frame()
+
+    def run(self, scene):
+        """
+        Run the main loop starting with scene until quit() is called.
+        """
+        self.switch(scene)
+        self.running = True
+        last = time.monotonic()
+        events = pygame.event.get()
+        while True:
+            now = time.monotonic()
+            self.frame(now - last, events)
+            last = now
+            if not self.running:
+                break
+            events = self.scheduler.wait(self.is_busy(), self.time_to_next_timer())
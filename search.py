@@ -0,0 +1,527 @@
+# search.py
+
+# A computer player that searches.
+# SearchBot remembers every card it sees like a perfect-recall bots.Bot, but
+# instead of taking its best-numbered match it plans the rest of its turn with
+# depth-limited expectimax. Each flip is either a decision (flip a remembered
+# card, or stop by flipping a remembered mismatch) or a chance node (flip an
+# unknown card, whose face is drawn from the cards not yet seen). A match
+# moves the player, which changes the character it must match next, so the
+# order of the flips matters. Leaves are scored by the player's progress round
+# the board, and a lap is a win.
+#
+# Cards with the same face are interchangeable, so a state is the square, the
+# laps and how many cards of each face have been taken from memory and from
+# the unknown pool. That multiset is hashed incrementally (Zobrist hashing)
+# and keys the transposition table. Search deepens one flip at a time until
+# the per-move time budget runs out, and answers with the deepest completed
+# depth. The Zobrist keys depend only on the deck configuration, so Rules
+# builds them once and every search, and every worker process, reuses them.
+#
+# With several workers the root is split into subtrees that are searched in
+# separate processes, each with its own table: taking each remembered card of
+# the player's character, and each of the player's faces an unseen card can
+# turn out to be (any other unseen card ends the turn and needs no search).
+# The parent combines the draws into the value of flipping an unseen card.
+# There are at most about twice as many subtrees as card numbers (about 5 on
+# the default deck, 11 with eight numbers) and they differ in size, so the
+# speedup stops well short of that many workers.
+#
+#   python search.py --budget 0.05 --games 20
+#   python search.py --budget 0.05 --workers 4 --sections 64 --numbers 1,2,3,4,5,6,7,8 --cards 16
+
+import argparse
+import random
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from settings import *
+from models import BOARD_CHARACTERS, CARD_CHARACTERS
+from bots import Bot, PIRATE, percentile, soak
+from simulator import parse_card_numbers
+
+WIN = 1e6   # Score of a won game, far above any progress round the board
+STOP = 'stop'
+EXACT = float('inf')   # Depth of a table entry searched to the end of the turn
+UNKNOWN = 'unknown'
+DRAW = 'draw'   # Root subtree: an unseen card turns out to be face f
+# How often (in nodes) the search checks the clock: about every 0.2 ms
+CLOCK_INTERVAL = 64
+# Seconds of the budget kept back for combining the results and picking a card
+FINISH_TIME = 0.0003
+# Squares a card is worth learning: a remembered card can be matched in a later turn
+LEARN_VALUE = 1.0
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+class Rules:
+    """
+    The parts of a board and deck the search needs, as plain lists, and the
+    Zobrist keys for its states.
+    :param board: Board object with move tables for every card number
+    :param card_numbers: list of integers
+    :param max_count: most cards of any one face in the deck
+    """
+    def __init__(self, board, card_numbers, max_count):
+        self.total = board.total_subsections
+        self.max_count = max_count
+        self.square_codes = board.char_codes.tolist()
+        self.numbers = sorted(card_numbers)
+        # Face f is (f // len(numbers), numbers[f % len(numbers)])
+        self.forward = []
+        self.backward = []
+        for number in self.numbers:
+            destinations, laps = board.step_table(number)
+            self.forward.append((destinations.tolist(), laps.tolist()))
+            destinations, laps = board.step_table(-number)
+            self.backward.append((destinations.tolist(), laps.tolist()))
+        # One key per face and count of that face taken, from memory or the pool
+        rng = random.Random(len(self.numbers))
+        num_faces = len(CARD_CHARACTERS) * len(self.numbers)
+        self.known_keys = [[rng.getrandbits(64) for _ in range(max_count)] for _ in range(num_faces)]
+        self.pool_keys = [[rng.getrandbits(64) for _ in range(max_count)] for _ in range(num_faces)]
+
+    def face(self, code, number):
+        return code * len(self.numbers) + self.numbers.index(number)
+
+
+class Search:
+    """
+    Expectimax over the rest of the current player's turn.
+    :param rules: Rules object
+    :param known: number of remembered face-down cards of each face
+    :param pool: number of unseen cards of each face
+    :param deadline: time.perf_counter() value to give up at
+    """
+    def __init__(self, rules, known, pool, deadline):
+        self.rules = rules
+        self.known = list(known)
+        self.pool = list(pool)
+        self.pool_total = sum(pool)
+        self.deadline = deadline
+        self._checked = time.perf_counter()
+        self.nodes = 0
+        self.table = {}
+        self.cutoff = False
+        self.hash = 0
+        n = len(rules.numbers)
+        self.own_faces = [range(code * n, code * n + n) for code in range(len(BOARD_CHARACTERS))]
+        self.pirate_faces = range(PIRATE * n, PIRATE * n + n)
+        # Remembered mismatches by character, to tell whether stopping is possible
+        self.known_by_code = [sum(known[code * n:code * n + n]) for code in range(len(CARD_CHARACTERS))]
+        self.known_keys = rules.known_keys
+        self.pool_keys = rules.pool_keys
+
+    def progress(self, square, laps):
+        return laps * self.rules.total + square
+
+    def can_stop(self, own):
+        counts = self.known_by_code
+        return any(counts[code] for code in range(len(BOARD_CHARACTERS)) if code != own)
+
+    def actions(self, own):
+        """
+        Return the moves worth searching at a decision: each remembered face
+        of the player's character, an unknown card and stopping.
+        :param own: code of the player's character
+        """
+        actions = [('known', f) for f in self.own_faces[own] if self.known[f]]
+        if self.pool_total:
+            actions.append((UNKNOWN, None))
+        if self.can_stop(own):
+            actions.append((STOP, None))
+        return actions
+
+    def decision(self, square, laps, depth):
+        if depth == 0:
+            self.cutoff = True
+            return self.progress(square, laps)
+        key = (square, laps, self.hash)
+        entry = self.table.get(key)
+        if entry is not None and entry[0] >= depth:
+            if entry[0] != EXACT:
+                self.cutoff = True
+            return entry[1]
+        outer_cutoff, self.cutoff = self.cutoff, False
+        best = None
+        # A player who has moved plays the character of the square it is on
+        own = self.rules.square_codes[square]
+        for action in self.actions(own):
+            value = self.action_value(action, own, square, laps, depth)
+            if best is None or value > best:
+                best = value
+        if best is None:
+            # Only pirates are left in memory; flipping one ends the turn
+            best = self.progress(square, laps)
+        # A value searched to the end of the turn holds at any depth
+        self.table[key] = (depth if self.cutoff else EXACT, best)
+        self.cutoff = self.cutoff or outer_cutoff
+        return best
+
+    def subtrees(self, own, actions):
+        """
+        Split root actions into subtrees that can be searched independently:
+        flipping an unseen card becomes one (DRAW, f) per face of the
+        player's character left in the pool.
+        """
+        subtrees = []
+        for kind, f in actions:
+            if kind == UNKNOWN:
+                subtrees += [(DRAW, g) for g in self.own_faces[own] if self.pool[g]]
+            else:
+                subtrees.append((kind, f))
+        return subtrees
+
+    def action_values(self, own, square, laps, actions, values):
+        """
+        Combine {subtree: value} into {action: value} for the root actions
+        whose subtrees were all searched.
+        """
+        result = {}
+        for action in actions:
+            if action[0] == UNKNOWN:
+                draws = {f: values.get((DRAW, f)) for f in self.own_faces[own] if self.pool[f]}
+                if None not in draws.values():
+                    result[action] = self.chance(own, square, laps, 0, draws)
+            elif action in values:
+                result[action] = values[action]
+        return result
+
+    def count_node(self):
+        # Called for every node expanded, decisions and draws alike, so that
+        # no subtree runs long between clock checks
+        self.nodes += 1
+        if self.nodes % CLOCK_INTERVAL == 0:
+            now = time.perf_counter()
+            # Stop if the next CLOCK_INTERVAL nodes would run past the deadline
+            if now + (now - self._checked) > self.deadline:
+                raise SearchTimeout
+            self._checked = now
+
+    def action_value(self, action, own, square, laps, depth):
+        self.count_node()
+        kind, f = action
+        if kind == STOP:
+            return self.progress(square, laps)
+        if kind == 'known':
+            return self.take_known(f, square, laps, depth)
+        return self.chance(own, square, laps, depth)
+
+    def take_known(self, f, square, laps, depth):
+        known = self.known
+        count = known[f] = known[f] - 1
+        self.known_by_code[f // len(self.rules.numbers)] -= 1
+        key = self.known_keys[f][count]
+        self.hash ^= key
+        try:
+            return self.forward(f, square, laps, depth)
+        finally:
+            self.hash ^= key
+            known[f] = count + 1
+            self.known_by_code[f // len(self.rules.numbers)] += 1
+
+    def forward(self, f, square, laps, depth):
+        destinations, lap_deltas = self.rules.forward[f % len(self.rules.numbers)]
+        laps += lap_deltas[square]
+        if laps >= 1:
+            return WIN
+        return self.decision(destinations[square], laps, depth - 1)
+
+    def chance(self, own, square, laps, depth, draws=None):
+        """
+        Expected value of flipping an unseen card.
+        :param draws: value of drawing each of the player's faces left in the
+            pool, if those subtrees were already searched
+        """
+        pool = self.pool
+        total = self.pool_total
+        stay = self.progress(square, laps)
+        expected = 0.0
+        mismatches = total
+        for f in self.own_faces[own]:
+            count = pool[f]
+            if not count:
+                continue
+            mismatches -= count
+            expected += count * (draws[f] if draws is not None else self.draw(f, square, laps, depth))
+        for i, f in enumerate(self.pirate_faces):
+            count = pool[f]
+            if count:
+                mismatches -= count
+                destinations, lap_deltas = self.rules.backward[i]
+                expected += count * self.progress(destinations[square], laps + lap_deltas[square])
+        # Any other card ends the turn where the player stands
+        expected += mismatches * stay
+        # The card is remembered whatever it turns out to be
+        return expected / total + LEARN_VALUE
+
+    def draw(self, f, square, laps, depth):
+        """
+        Value of an unseen card turning out to be face f, of the player's character.
+        """
+        self.count_node()
+        pool = self.pool
+        count = pool[f]
+        total = self.pool_total
+        pool[f] = count - 1
+        self.pool_total = total - 1
+        key = self.pool_keys[f][count - 1]
+        self.hash ^= key
+        try:
+            return self.forward(f, square, laps, depth)
+        finally:
+            self.hash ^= key
+            pool[f] = count
+            self.pool_total = total
+
+    def subtree_value(self, subtree, own, square, laps, depth):
+        kind, f = subtree
+        if kind == DRAW:
+            return self.draw(f, square, laps, depth)
+        return self.action_value(subtree, own, square, laps, depth)
+
+    def search_root(self, own, square, laps, subtrees, depth):
+        """
+        Return {subtree: value} for the given root subtrees at one depth.
+        """
+        return {subtree: self.subtree_value(subtree, own, square, laps, depth) for subtree in subtrees}
+
+
+def iterative_deepening(rules, known, pool, own, square, laps, subtrees, budget, max_depth=64):
+    """
+    Search the root subtrees one flip deeper at a time until the budget runs
+    out or the turn is searched to the end.
+    :return: ({subtree: value} at the deepest completed depth, that depth, nodes searched)
+    """
+    search = Search(rules, known, pool, time.perf_counter() + budget)
+    values = {}
+    depth = 0
+    try:
+        for d in range(1, max_depth + 1):
+            search.cutoff = False
+            values = search.search_root(own, square, laps, subtrees, d)
+            depth = d
+            if not search.cutoff:
+                break
+    except SearchTimeout:
+        pass
+    return values, depth, search.nodes
+
+
+_worker_rules = None
+
+
+def _init_worker(rules):
+    global _worker_rules
+    _worker_rules = rules
+
+
+def _search_worker(known, pool, own, square, laps, subtrees, budget):
+    return iterative_deepening(_worker_rules, known, pool, own, square, laps, subtrees, budget)
+
+
+class SearchBot(Bot):
+    """
+    A perfect-recall computer player that chooses by expectimax search.
+    :param rules: Rules for the game's board and card numbers
+    :param deck: the game's Deck; only its composition is used
+    :param budget: seconds allowed per move
+    :param workers: processes to split the root subtrees between; 1
+        searches in this process
+    """
+    def __init__(self, rules, deck, seed=None, budget=SEARCH_BUDGET, workers=SEARCH_WORKERS, executor=None):
+        super().__init__('perfect', len(deck), seed)
+        self.mode = 'search'
+        self.rules = rules
+        self.budget = budget
+        self.workers = workers
+        # A shared executor must have been started with _init_worker(rules)
+        self.executor = executor
+        self._owns_executor = executor is None
+        # The deck's composition is public: every face and how many there are
+        self.composition = [0] * (len(CARD_CHARACTERS) * len(rules.numbers))
+        for code, number in zip(deck.characters, deck.numbers):
+            self.composition[rules.face(code, number)] += 1
+        if max(self.composition, default=0) > rules.max_count:
+            raise ValueError(f"The deck has {max(self.composition)} cards of one face, "
+                             f"more than the {rules.max_count} the rules were built for")
+        self.last_depth = 0
+        self.last_nodes = 0
+        self.last_time = 0.0
+        self.total_nodes = 0
+        self.total_time = 0.0
+
+    def close(self):
+        if self.executor is not None and self._owns_executor:
+            self.executor.shutdown()
+        self.executor = None
+
+    def nodes_per_second(self):
+        return self.total_nodes / self.total_time if self.total_time else 0.0
+
+    def counts(self, deck):
+        """
+        Return (known, pool): remembered face-down cards and unseen cards of
+        each face.
+        """
+        rules = self.rules
+        known = [0] * len(self.composition)
+        seen = [0] * len(self.composition)
+        for code, faces in self.memory.by_face.items():
+            for number, indices in faces.items():
+                f = rules.face(code, number)
+                seen[f] = len(indices)
+                known[f] = sum(1 for index in indices if not deck.is_flipped(index))
+        pool = [total - count for total, count in zip(self.composition, seen)]
+        return known, pool
+
+    def choose(self, engine):
+        deck = engine.deck
+        if deck.all_flipped():
+            return None
+        start = time.perf_counter()
+        player = engine.current_player
+        known, pool = self.counts(deck)
+        own = CARD_CHARACTERS.index(player.character)
+        root = Search(self.rules, known, pool, 0)
+        actions = root.actions(own)
+        if len(actions) > 1:
+            # The budget covers the whole move, not just the search
+            budget = self.budget - FINISH_TIME - (time.perf_counter() - start)
+            square, laps = player.position, player.laps_completed
+            values, depth, nodes = self.search(known, pool, own, square, laps, root.subtrees(own, actions), budget)
+            values = root.action_values(own, square, laps, actions, values)
+            # Actions the search did not finish come last, in their usual order
+            actions = sorted(values, key=values.get, reverse=True) + [a for a in actions if a not in values]
+        else:
+            depth, nodes = 0, 0
+        self.last_depth = depth
+        self.last_nodes = nodes
+        self.last_time = time.perf_counter() - start
+        self.total_nodes += nodes
+        self.total_time += self.last_time
+        for kind, f in actions:
+            index = self.card_for(kind, f, engine)
+            if index is not None:
+                return index
+        # Nothing but pirates and face-up cards are remembered
+        return super().choose(engine)
+
+    def search(self, known, pool, own, square, laps, subtrees, budget):
+        """
+        Search the root subtrees, split between the worker processes.
+        :return: ({subtree: value}, shallowest completed depth, nodes searched)
+        """
+        if self.workers <= 1:
+            return iterative_deepening(self.rules, known, pool, own, square, laps, subtrees, budget)
+        if self.executor is None:
+            self.executor = start_executor(self.rules, self.workers)
+        shares = [subtrees[i::self.workers] for i in range(self.workers) if subtrees[i::self.workers]]
+        futures = [self.executor.submit(_search_worker, known, pool, own, square, laps, share, budget)
+                   for share in shares]
+        values = {}
+        depths = []
+        nodes = 0
+        for future in futures:
+            share_values, depth, share_nodes = future.result()
+            values.update(share_values)
+            depths.append(depth)
+            nodes += share_nodes
+        return values, min(depths, default=0), nodes
+
+    def card_for(self, kind, f, engine):
+        """
+        Return a face-down card to flip for a root action, or None.
+        """
+        deck = engine.deck
+        by_face = self.memory.by_face
+        if kind == UNKNOWN:
+            return self._random_unknown(deck)
+        if kind == 'known':
+            code, number = divmod(f, len(self.rules.numbers))
+            indices = by_face.get(code, {}).get(self.rules.numbers[number], ())
+            return next((index for index in indices if not deck.is_flipped(index)), None)
+        own = CARD_CHARACTERS.index(engine.current_player.character)
+        for code, faces in by_face.items():
+            if code != own and code != PIRATE:
+                for indices in faces.values():
+                    for index in indices:
+                        if not deck.is_flipped(index):
+                            return index
+        return None
+
+
+def start_executor(rules, workers):
+    """
+    Start worker processes that search with these rules. The rules, with
+    their Zobrist keys, are sent to each worker once, here.
+    """
+    return ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(rules,))
+
+
+def make_search_bot(engine, seed=None):
+    deck = engine.deck
+    max_count = max(Counter(zip(deck.characters, deck.numbers)).values(), default=0)
+    rules = Rules(engine.board, sorted(set(deck.numbers)), max_count)
+    return SearchBot(rules, deck, seed)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play Fiery Dragon games with a searching computer player.")
+    parser.add_argument('--sections', type=int, default=8, help='number of board sections')
+    parser.add_argument('--numbers', type=parse_card_numbers, default=[1, 2, 3],
+                        help='comma-separated numbers on the cards')
+    parser.add_argument('--cards', type=int, default=4, help='number of cards per character')
+    parser.add_argument('--games', type=int, default=20, help='number of games to play')
+    parser.add_argument('--players', default='search,perfect,perfect,perfect',
+                        help="comma-separated player type per seat")
+    parser.add_argument('--budget', type=float, default=SEARCH_BUDGET, help='seconds per search move')
+    parser.add_argument('--workers', type=int, default=SEARCH_WORKERS, help='search processes per move')
+    parser.add_argument('--seed', type=int, default=0, help='random seed')
+    args = parser.parse_args(argv)
+
+    player_types = args.players.split(',')
+    if len(player_types) != len(PLAYERS):
+        parser.error(f"--players needs one type for each of the {len(PLAYERS)} seats")
+    searchers = []
+    # Every game is played on the same board, so one set of workers serves them all
+    shared = {}
+
+    def make_bot(engine, seed):
+        if 'rules' not in shared:
+            shared['rules'] = Rules(engine.board, args.numbers, args.cards)
+            if args.workers > 1:
+                shared['executor'] = start_executor(shared['rules'], args.workers)
+        bot = SearchBot(shared['rules'], engine.deck, seed, args.budget, args.workers, shared.get('executor'))
+        searchers.append(bot)
+        return bot
+
+    start = time.perf_counter()
+    wins, unfinished, times = soak(args.games, player_types, args.sections, args.numbers, args.cards,
+                                   args.seed, search_factory=make_bot)
+    elapsed = time.perf_counter() - start
+    print(f"{args.games} games in {elapsed:.2f} s")
+    for seat, (kind, count) in enumerate(zip(player_types, wins)):
+        print(f"  seat {seat} {kind:<9} {count:>6} wins ({count / args.games:.0%})")
+    if unfinished:
+        print(f"  {unfinished} games hit the turn limit")
+    if times:
+        print(f"Decision time: p50 {percentile(times, 50):.1f} us, p99 {percentile(times, 99):.1f} us, "
+              f"max {times[-1]:.1f} us")
+    nodes = sum(bot.total_nodes for bot in searchers)
+    search_time = sum(bot.total_time for bot in searchers)
+    if search_time:
+        print(f"Search: {nodes:,} nodes in {search_time:.2f} s ({nodes / search_time:,.0f} nodes/s, "
+              f"{args.workers} worker{'s' if args.workers != 1 else ''})")
+    if 'executor' in shared:
+        shared['executor'].shutdown()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
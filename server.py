@@ -0,0 +1,372 @@
+# server.py
+
+# Game server hosting many tables in one process.
+# Clients connect over TCP and exchange JSON messages, one per line. Each
+# session is one game: a GameEngine with its own deck and players, on a Board
+# shared by every open session with the same configuration (boards never
+# change during play) and dropped when the last of them closes. A session
+# costs its deck's arrays, four Player objects and its clients, so memory
+# grows with the number and size of the decks and SERVER_MAX_CARDS bounds
+# each one. Flips are checked and resolved by GameEngine, exactly as in the
+# local game, and the outcome is sent to every client at the table.
+#
+# Requests (client to server), each optionally carrying an "id" that is
+# echoed in the reply or broadcast it causes:
+#   {"op": "create", "sections": 8, "numbers": [1, 2, 3], "cards": 4, "seats": 1, "seed": 7}
+#   {"op": "join", "session": 12, "seats": 1}
+#   {"op": "flip", "card": 31}
+#   {"op": "rematch"}                     start a new game once this one is won
+#   {"op": "state"}
+#   {"op": "leave"}
+# Replies and broadcasts (server to client) have a "type": "created",
+# "joined", "state", "flip", "rematch", "left" or "error".
+#
+#   python server.py --port 8765
+#   python loadgen.py --sessions 5000     in another terminal
+
+import argparse
+import asyncio
+import gc
+import itertools
+import json
+import resource
+import sys
+import traceback
+
+from settings import *
+from models import Board, Player, CARD_CHARACTERS, create_deck, new_seed
+from engine import GameEngine
+
+
+class ProtocolError(Exception):
+    pass
+
+
+def encode(message):
+    return (json.dumps(message, separators=(',', ':')) + '\n').encode()
+
+
+def is_int(value):
+    # JSON true and false decode to bools, which are ints to isinstance()
+    return type(value) is int
+
+
+class Client:
+    """
+    One connection. A client may hold several seats at one table.
+    """
+    __slots__ = ('writer', 'session', 'seats')
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.session = None
+        self.seats = []
+
+    def send(self, data):
+        transport = self.writer.transport
+        if transport.is_closing():
+            return
+        # A client that stops reading would make its backlog grow without end
+        if transport.get_write_buffer_size() > SERVER_SEND_BUFFER:
+            transport.abort()
+            return
+        transport.write(data)
+
+
+class Session:
+    """
+    One table: a game and the clients seated at it.
+    """
+    __slots__ = ('id', 'engine', 'seats', 'clients', 'card_numbers', 'num_cards_per_character')
+
+    def __init__(self, session_id, board, card_numbers, num_cards_per_character, seed):
+        self.id = session_id
+        self.card_numbers = card_numbers
+        self.num_cards_per_character = num_cards_per_character
+        self.new_game(board, seed)
+        # The client holding each seat, or None
+        self.seats = [None] * len(PLAYERS)
+        self.clients = []
+
+    def new_game(self, board, seed):
+        deck = create_deck({}, self.card_numbers, self.num_cards_per_character, seed)
+        players = [Player(name, character, color) for name, character, color in PLAYERS]
+        self.engine = GameEngine(board, deck, players)
+
+    def free_seats(self):
+        return [seat for seat, client in enumerate(self.seats) if client is None]
+
+    def state(self):
+        engine = self.engine
+        deck = engine.deck
+        return {
+            'session': self.id,
+            'cards': len(deck),
+            'face_up': [[index, CARD_CHARACTERS[deck.characters[index]], deck.numbers[index]]
+                        for index in deck.flipped_indices()],
+            'players': [[p.name, p.character, p.position, p.laps_completed] for p in engine.players],
+            'current': engine.current_player_index,
+            'turn': engine.turn,
+            'winner': engine.players.index(engine.winner) if engine.winner is not None else None,
+        }
+
+    def broadcast(self, message):
+        data = encode(message)
+        for client in self.clients:
+            client.send(data)
+
+
+class GameServer:
+    def __init__(self, max_sessions=SERVER_MAX_SESSIONS, max_cards=SERVER_MAX_CARDS):
+        self.max_sessions = max_sessions
+        self.max_cards = max_cards
+        self.sessions = {}
+        self.boards = {}
+        # The number of open sessions on each board, by the same key
+        self._board_sessions = {}
+        self.connections = 0
+        self.actions = 0
+        self._ids = itertools.count(1)
+
+    def board(self, num_sections, card_numbers):
+        """
+        Return the shared Board for a configuration, counting one more
+        session on it. Each call is matched by a release_board().
+        """
+        key = (num_sections, tuple(card_numbers))
+        board = self.boards.get(key)
+        if board is None:
+            board = Board((SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2), BOARD_RADIUS, num_sections, {})
+            board.precompute_steps(card_numbers)
+            self.boards[key] = board
+            self._board_sessions[key] = 0
+        self._board_sessions[key] += 1
+        return board
+
+    def release_board(self, num_sections, card_numbers):
+        """
+        Count one session fewer on a board, and drop it once none is left.
+        """
+        key = (num_sections, tuple(card_numbers))
+        self._board_sessions[key] -= 1
+        if not self._board_sessions[key]:
+            del self._board_sessions[key]
+            del self.boards[key]
+
+    async def handle_client(self, reader, writer):
+        client = Client(writer)
+        self.connections += 1
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    client.send(encode({'type': 'error', 'error': "Request too long."}))
+                    break
+                if not line:
+                    break
+                request_id = None
+                try:
+                    try:
+                        request = json.loads(line)
+                    except ValueError:
+                        raise ProtocolError("Request is not valid JSON.")
+                    if not isinstance(request, dict):
+                        raise ProtocolError("Request must be a JSON object.")
+                    request_id = request.get('id')
+                    self.dispatch(client, request)
+                except ProtocolError as e:
+                    client.send(encode({'type': 'error', 'id': request_id, 'error': str(e)}))
+                except Exception:
+                    # A bug in handling one request must not drop the connection
+                    traceback.print_exc()
+                    client.send(encode({'type': 'error', 'id': request_id, 'error': "Internal server error."}))
+        except ConnectionError:
+            pass
+        finally:
+            self.connections -= 1
+            self.leave(client)
+            writer.close()
+
+    def dispatch(self, client, request):
+        op = request.get('op')
+        if op == 'flip':
+            self.flip(client, request)
+        elif op == 'rematch':
+            self.rematch(client, request)
+        elif op == 'create':
+            self.create(client, request)
+        elif op == 'join':
+            self.join(client, request)
+        elif op == 'state':
+            session = self.session_of(client)
+            client.send(encode(dict(session.state(), type='state', id=request.get('id'), seats=client.seats)))
+        elif op == 'leave':
+            self.session_of(client)
+            self.leave(client)
+            client.send(encode({'type': 'left', 'id': request.get('id')}))
+        else:
+            raise ProtocolError(f"Unknown op {op!r}.")
+
+    def session_of(self, client):
+        if client.session is None:
+            raise ProtocolError("Not at a table.")
+        return client.session
+
+    def create(self, client, request):
+        if client.session is not None:
+            raise ProtocolError("Already at a table.")
+        if len(self.sessions) >= self.max_sessions:
+            raise ProtocolError("The server is full.")
+        num_sections = request.get('sections', 8)
+        card_numbers = request.get('numbers', [1, 2, 3])
+        num_cards_per_character = request.get('cards', 4)
+        seed = request.get('seed')
+        if not (is_int(num_sections) and 1 <= num_sections <= 1024):
+            raise ProtocolError("sections must be an integer from 1 to 1024.")
+        if (not isinstance(card_numbers, list) or not card_numbers or len(card_numbers) > 32
+                or not all(is_int(n) and 1 <= n <= SERVER_MAX_CARD_NUMBER for n in card_numbers)):
+            raise ProtocolError(f"numbers must be a list of integers from 1 to {SERVER_MAX_CARD_NUMBER}.")
+        if not (is_int(num_cards_per_character) and num_cards_per_character > 0):
+            raise ProtocolError("cards must be a positive integer.")
+        if num_cards_per_character * len(card_numbers) * len(CARD_CHARACTERS) > self.max_cards:
+            raise ProtocolError(f"The deck may have at most {self.max_cards} cards.")
+        if seed is not None and not is_int(seed):
+            raise ProtocolError("seed must be an integer.")
+        card_numbers = sorted(set(card_numbers))
+        board = self.board(num_sections, card_numbers)
+        session = Session(next(self._ids), board, card_numbers, num_cards_per_character,
+                          new_seed() if seed is None else seed)
+        try:
+            self.seat(client, session, request.get('seats', 1))
+        except ProtocolError:
+            # The table never opened, so nothing else holds its board
+            self.release_board(num_sections, card_numbers)
+            raise
+        self.sessions[session.id] = session
+        client.send(encode(dict(session.state(), type='created', id=request.get('id'), seats=client.seats)))
+
+    def join(self, client, request):
+        if client.session is not None:
+            raise ProtocolError("Already at a table.")
+        session_id = request.get('session')
+        session = self.sessions.get(session_id) if is_int(session_id) else None
+        if session is None:
+            raise ProtocolError("No such table.")
+        self.seat(client, session, request.get('seats', 1))
+        client.send(encode(dict(session.state(), type='joined', id=request.get('id'), seats=client.seats)))
+
+    def rematch(self, client, request):
+        session = self.session_of(client)
+        if session.engine.winner is None:
+            raise ProtocolError("The game is not over.")
+        session.new_game(session.engine.board, new_seed())
+        session.broadcast(dict(session.state(), type='rematch', id=request.get('id')))
+
+    def seat(self, client, session, count):
+        free = session.free_seats()
+        if not is_int(count) or count < 1:
+            raise ProtocolError("seats must be a positive integer.")
+        if count > len(free):
+            raise ProtocolError(f"Only {len(free)} seats are free.")
+        for seat in free[:count]:
+            session.seats[seat] = client
+        client.session = session
+        client.seats = free[:count]
+        session.clients.append(client)
+
+    def leave(self, client):
+        session = client.session
+        if session is None:
+            return
+        session.clients.remove(client)
+        for seat in client.seats:
+            session.seats[seat] = None
+        client.session = None
+        client.seats = []
+        # An empty table is closed
+        if not session.clients:
+            del self.sessions[session.id]
+            self.release_board(session.engine.board.num_sections, session.card_numbers)
+
+    def flip(self, client, request):
+        session = self.session_of(client)
+        engine = session.engine
+        if engine.winner is not None:
+            raise ProtocolError("The game is over.")
+        if session.seats[engine.current_player_index] is not client:
+            raise ProtocolError("It is not your turn.")
+        card_index = request.get('card')
+        if not is_int(card_index) or not 0 <= card_index < len(engine.deck):
+            raise ProtocolError("card must be the index of a card in the deck.")
+        if engine.deck.is_flipped(card_index):
+            raise ProtocolError(f"Card {card_index} is already face up.")
+        seat = engine.current_player_index
+        event = engine.apply(card_index)
+        self.actions += 1
+        player = event.player
+        session.broadcast({
+            'type': 'flip',
+            'id': request.get('id'),
+            'seat': seat,
+            'card': card_index,
+            'face': [event.card.character, event.card.number],
+            'kind': event.kind,
+            'turn_over': event.turn_over,
+            'position': player.position,
+            'laps': player.laps_completed,
+            'character': player.character,
+            'current': engine.current_player_index,
+            'turn': engine.turn,
+            'winner': seat if event.winner is not None else None,
+        })
+
+
+def raise_file_limit():
+    """
+    Allow as many open sockets as the system permits.
+    """
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+async def report(server, interval):
+    while True:
+        await asyncio.sleep(interval)
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        print(f"{len(server.sessions)} sessions, {server.connections} connections, "
+              f"{server.actions / interval:,.0f} flips/s, peak RSS {rss:.0f} MiB", flush=True)
+        server.actions = 0
+
+
+async def serve(host, port, stats_interval=None):
+    game_server = GameServer()
+    # Modules and constants live for the whole run; keep the collector off them
+    gc.freeze()
+    server = await asyncio.start_server(game_server.handle_client, host, port,
+                                        limit=SERVER_MAX_LINE, backlog=4096)
+    print(f"Serving on {host}:{port}", flush=True)
+    if stats_interval:
+        asyncio.ensure_future(report(game_server, stats_interval))
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Host Fiery Dragon games over TCP.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=SERVER_PORT)
+    parser.add_argument('--stats', type=float, default=5.0, metavar='SECONDS',
+                        help="print server statistics this often (0 to disable)")
+    args = parser.parse_args(argv)
+    raise_file_limit()
+    try:
+        asyncio.run(serve(args.host, args.port, args.stats))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
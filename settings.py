@@ -5,7 +5,28 @@ SCREEN_HEIGHT = 900
 CARD_WIDTH = 80
 CARD_HEIGHT = 80
 BOARD_RADIUS = 300
+BOARD_ICON_SIZE = 40
 FPS = 30    # Frames per second
+BACKGROUND_FPS = 5     # Frame rate cap while the window is not focused
+IDLE_TIMEOUT_MS = 1000  # Longest wait for input when nothing is animating
+
+CACHE_DIR = '.cache'    # Generated files such as the texture atlas
+SAVE_DIR = 'saves'      # Save files, the save catalog and its thumbnails
+AUTOSAVE_DIR = 'saves/autosaves'
+AUTOSAVE_COUNT = 3      # Autosaves kept before the oldest is deleted
+THUMBNAIL_SIZE = (160, 120)
+PROFILE_FRAMES = 600    # Frames kept by the profiler
+BOT_DELAY = 0.6        # Seconds a computer player waits before each flip
+BOT_HALF_LIFE = 24     # Flips after which a decaying bot recalls a card half the time
+SEARCH_BUDGET = 0.1    # Seconds a searching computer player may think per flip
+SEARCH_WORKERS = 1     # Processes it searches with; more split the moves between cores
+
+SERVER_PORT = 8765
+SERVER_MAX_SESSIONS = 20000
+SERVER_MAX_CARDS = 4096         # Largest deck a session may be created with
+SERVER_MAX_CARD_NUMBER = 1024   # Largest number a card may show
+SERVER_MAX_LINE = 4096          # Longest request line, in bytes
+SERVER_SEND_BUFFER = 256 * 1024 # Unsent bytes after which a slow client is dropped
 
 # Colors
 # RGB values for common colors
@@ -18,3 +39,11 @@ RED = (255, 0, 0)
 GREEN = (0, 255, 0)
 BLUE = (0, 0, 255)
 YELLOW = (255, 255, 0)
+
+# Name, character and colour of each seat
+PLAYERS = [
+    ('Alice', 'dragon', RED),
+    ('Bob', 'salamander', GREEN),
+    ('Charlie', 'bat', BLUE),
+    ('Diana', 'spider', YELLOW),
+]
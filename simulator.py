@@ -0,0 +1,232 @@
+# simulator.py
+
+# Vectorized Monte Carlo simulator for tuning deck configurations.
+# Each game is one row of a set of NumPy arrays, and all games advance in
+# lockstep one card flip at a time using the same rules as GameEngine:
+# pirates move backward and end the turn, a matching character moves forward
+# and keeps the turn, anything else ends the turn, and the first player to
+# complete a lap wins. Every seat flips a random face-down card.
+
+import argparse
+import time
+
+import numpy as np
+
+from models import BOARD_CHARACTERS, CARD_CHARACTERS
+
+PIRATE = CARD_CHARACTERS.index('pirate')
+
+
+def deck_composition(card_numbers, num_cards_per_character):
+    """
+    Return the character codes and numbers of an unshuffled deck.
+    The composition matches models.create_deck.
+    :param card_numbers: list of integers
+    :param num_cards_per_character: integer
+    :return: (characters, numbers) as NumPy arrays
+    """
+    characters = []
+    numbers = []
+    for code in range(len(BOARD_CHARACTERS)):
+        for num in card_numbers:
+            characters += [code] * num_cards_per_character
+            numbers += [num] * num_cards_per_character
+    # Fewer pirate cards, and only for the small numbers
+    for num in card_numbers:
+        if num <= 2:
+            characters += [PIRATE] * (num_cards_per_character // 2)
+            numbers += [num] * (num_cards_per_character // 2)
+    return np.array(characters, dtype=np.int8), np.array(numbers, dtype=np.int64)
+
+
+class SimulationResult:
+    """
+    Aggregated statistics of a batch of simulated games.
+    :param num_players: integer
+    :param winners: seat index of the winner of each game, -1 if unfinished
+    :param lengths: number of turns played in each game
+    :param flips: total number of cards flipped
+    :param elapsed: wall-clock seconds spent simulating
+    """
+    def __init__(self, num_players, winners, lengths, flips, elapsed):
+        self.num_players = num_players
+        self.winners = winners
+        self.lengths = lengths
+        self.flips = flips
+        self.elapsed = elapsed
+
+    @property
+    def num_games(self):
+        return len(self.winners)
+
+    @property
+    def finished(self):
+        return int(np.count_nonzero(self.winners >= 0))
+
+    @property
+    def turns(self):
+        return int(self.lengths.sum())
+
+    @property
+    def win_rates(self):
+        wins = np.bincount(self.winners[self.winners >= 0], minlength=self.num_players)
+        return wins / max(self.finished, 1)
+
+    @property
+    def turns_per_second(self):
+        return self.turns / self.elapsed if self.elapsed else float('inf')
+
+    @property
+    def flips_per_second(self):
+        return self.flips / self.elapsed if self.elapsed else float('inf')
+
+    def length_percentiles(self, percentiles=(5, 25, 50, 75, 95)):
+        finished = self.lengths[self.winners >= 0]
+        if not len(finished):
+            return {p: float('nan') for p in percentiles}
+        return dict(zip(percentiles, np.percentile(finished, percentiles)))
+
+    def length_histogram(self, bins=10):
+        return np.histogram(self.lengths[self.winners >= 0], bins=bins)
+
+    def summary(self):
+        lines = [f"Games: {self.num_games} ({self.finished} finished)"]
+        for seat, rate in enumerate(self.win_rates):
+            lines.append(f"  Seat {seat} ({BOARD_CHARACTERS[seat % 4]}): {rate:.2%} wins")
+        percentiles = ', '.join(f"p{p}={v:.0f}" for p, v in self.length_percentiles().items())
+        lines.append(f"Game length in turns: mean {self.lengths.mean():.1f}, {percentiles}")
+        lines.append(f"Speed: {self.turns_per_second:,.0f} turns/s, {self.flips_per_second:,.0f} flips/s")
+        return '\n'.join(lines)
+
+
+def simulate(num_sections, card_numbers, num_cards_per_character, num_games,
+             num_players=4, seed=None, max_turns=10000, batch_size=65536):
+    """
+    Play num_games random games and return a SimulationResult.
+    :param num_sections: integer, the board has num_sections * 3 squares
+    :param card_numbers: list of integers
+    :param num_cards_per_character: integer
+    :param num_games: integer
+    :param num_players: integer, seat i starts as BOARD_CHARACTERS[i % 4]
+    :param seed: seed or np.random.Generator
+    :param max_turns: games still running after this many turns are unfinished
+    :param batch_size: number of games held in memory at once
+    """
+    rng = np.random.default_rng(seed)
+    winners = np.empty(num_games, dtype=np.int64)
+    lengths = np.empty(num_games, dtype=np.int64)
+    flips = 0
+    start = time.perf_counter()
+    for offset in range(0, num_games, batch_size):
+        n = min(batch_size, num_games - offset)
+        flips += _simulate_batch(rng, num_sections, card_numbers, num_cards_per_character, n,
+                                 num_players, max_turns,
+                                 winners[offset:offset + n], lengths[offset:offset + n])
+    elapsed = time.perf_counter() - start
+    return SimulationResult(num_players, winners, lengths, flips, elapsed)
+
+
+def _simulate_batch(rng, num_sections, card_numbers, num_cards_per_character, n,
+                    num_players, max_turns, winners_out, lengths_out):
+    card_chars, card_nums = deck_composition(card_numbers, num_cards_per_character)
+    deck_size = len(card_chars)
+    total_subsections = num_sections * 3
+    board_chars = (np.arange(total_subsections) % len(BOARD_CHARACTERS)).astype(np.int8)
+
+    # Per-game deck permutations
+    order = rng.permuted(np.tile(np.arange(deck_size), (n, 1)), axis=1)
+    deck_chars = card_chars[order]
+    deck_nums = card_nums[order]
+
+    positions = np.zeros((n, num_players), dtype=np.int64)
+    laps = np.zeros((n, num_players), dtype=np.int64)
+    characters = np.tile(np.arange(num_players, dtype=np.int8) % len(BOARD_CHARACTERS), (n, 1))
+    current = np.zeros(n, dtype=np.int64)
+    flipped = np.zeros((n, deck_size), dtype=bool)
+    flipped_count = np.zeros(n, dtype=np.int64)
+    turns = np.zeros(n, dtype=np.int64)
+    game_ids = np.arange(n)
+    flips = 0
+
+    winners_out[:] = -1
+    if deck_size == 0:
+        lengths_out[:] = 0
+        return 0
+
+    while len(game_ids):
+        rows = np.arange(len(game_ids))
+        # Pick a random face-down card in every game. Only the matches of the
+        # current turn are face up, so rejection sampling rarely loops.
+        picked = rng.integers(0, deck_size, len(rows))
+        rejected = np.flatnonzero(flipped[rows, picked])
+        while len(rejected):
+            picked[rejected] = rng.integers(0, deck_size, len(rejected))
+            rejected = rejected[flipped[rejected, picked[rejected]]]
+        flips += len(rows)
+
+        card_char = deck_chars[rows, picked]
+        card_num = deck_nums[rows, picked]
+        old = positions[rows, current]
+        pirate = card_char == PIRATE
+        match = ~pirate & (card_char == characters[rows, current])
+
+        # Same arithmetic as Player.move and Player.move_backward
+        new = np.where(pirate, (old - card_num) % total_subsections,
+                       np.where(match, (old + card_num) % total_subsections, old))
+        positions[rows, current] = new
+        laps[rows, current] += (match & (new < old)).astype(np.int64) - (pirate & (new > old))
+        moved = pirate | match
+        characters[rows, current] = np.where(moved, board_chars[new], characters[rows, current])
+
+        flipped[rows[match], picked[match]] = True
+        flipped_count += match
+
+        won = laps[rows, current] >= 1
+        turn_over = ~match | (flipped_count == deck_size)
+        ended = turn_over & ~won
+        flipped[ended] = False
+        flipped_count[ended] = 0
+        current[ended] = (current[ended] + 1) % num_players
+        turns += turn_over | won
+
+        done = won | (turns >= max_turns)
+        if done.any():
+            finished = game_ids[done]
+            winners_out[finished] = np.where(won[done], current[done], -1)
+            lengths_out[finished] = turns[done]
+            keep = ~done
+            game_ids = game_ids[keep]
+            deck_chars = deck_chars[keep]
+            deck_nums = deck_nums[keep]
+            positions = positions[keep]
+            laps = laps[keep]
+            characters = characters[keep]
+            current = current[keep]
+            flipped = flipped[keep]
+            flipped_count = flipped_count[keep]
+            turns = turns[keep]
+    return flips
+
+
+def parse_card_numbers(text):
+    return [int(num.strip()) for num in text.split(',') if num.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Simulate Fiery Dragon games with random play.')
+    parser.add_argument('--sections', type=int, default=8, help='number of board sections')
+    parser.add_argument('--numbers', type=parse_card_numbers, default=[1, 2, 3],
+                        help='comma-separated numbers on the cards')
+    parser.add_argument('--cards', type=int, default=4, help='number of cards per character')
+    parser.add_argument('--games', type=int, default=100000, help='number of games to simulate')
+    parser.add_argument('--players', type=int, default=4, help='number of players')
+    parser.add_argument('--seed', type=int, default=None, help='random seed')
+    parser.add_argument('--max-turns', type=int, default=10000, help='turn limit per game')
+    args = parser.parse_args(argv)
+    result = simulate(args.sections, args.numbers, args.cards, args.games,
+                      num_players=args.players, seed=args.seed, max_turns=args.max_turns)
+    print(result.summary())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,355 @@
+# sweep.py
+
+# Command-line runner that sweeps deck configurations with the simulator.
+# Every (num_sections, card_numbers, num_cards_per_character) combination is
+# split into chunks of games that run on a ProcessPoolExecutor. Each chunk has
+# its own SeedSequence derived from the sweep seed and the chunk's position in
+# the sweep, so results are reproducible and independent of worker count.
+# Finished chunks are appended to a checkpoint file, and a rerun with the same
+# checkpoint only plays the chunks that are missing. Each chunk records the
+# seed, player count, chunk size and turn limit it was played with, and
+# chunks from a run with different settings are ignored.
+#
+# Example:
+#   python sweep.py --sections 6,8,10 --numbers "1,2,3;1,2,3,4" --cards 2,4,6 \
+#       --games 200000 --checkpoint sweep.jsonl
+#   python sweep.py ... --search --max-advantage 0.02 --length 60,150
+
+import argparse
+import itertools
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from simulator import simulate, parse_card_numbers
+
+
+class Config:
+    """
+    One deck configuration of the sweep.
+    """
+    __slots__ = ('num_sections', 'card_numbers', 'num_cards_per_character')
+
+    def __init__(self, num_sections, card_numbers, num_cards_per_character):
+        self.num_sections = num_sections
+        self.card_numbers = tuple(card_numbers)
+        self.num_cards_per_character = num_cards_per_character
+
+    @property
+    def spawn_key(self):
+        return (self.num_sections, self.num_cards_per_character, len(self.card_numbers)) + self.card_numbers
+
+    @property
+    def key(self):
+        numbers = ','.join(str(n) for n in self.card_numbers)
+        return f"{self.num_sections}|{numbers}|{self.num_cards_per_character}"
+
+
+class ConfigStats:
+    """
+    Results of all the chunks played so far for one configuration.
+    """
+    def __init__(self, config, num_players):
+        self.config = config
+        self.wins = np.zeros(num_players, dtype=np.int64)
+        self.unfinished = 0
+        self.length_counts = np.zeros(0, dtype=np.int64)
+        self.elapsed = 0.0
+        self.chunks = set()
+
+    def add(self, chunk):
+        if chunk['chunk'] in self.chunks:
+            return
+        if len(chunk['wins']) != len(self.wins):
+            raise ValueError(f"Chunk {chunk['chunk']} of {chunk['config']} has {len(chunk['wins'])} players, "
+                             f"expected {len(self.wins)}")
+        self.chunks.add(chunk['chunk'])
+        self.wins += chunk['wins']
+        self.unfinished += chunk['unfinished']
+        counts = np.bincount(chunk['lengths'], weights=chunk['counts']).astype(np.int64)
+        if len(counts) > len(self.length_counts):
+            counts[:len(self.length_counts)] += self.length_counts
+            self.length_counts = counts
+        else:
+            self.length_counts[:len(counts)] += counts
+        self.elapsed += chunk['elapsed']
+
+    @property
+    def finished(self):
+        return int(self.wins.sum())
+
+    @property
+    def games(self):
+        return self.finished + self.unfinished
+
+    @property
+    def win_rates(self):
+        return self.wins / max(self.finished, 1)
+
+    @property
+    def seat_advantage(self):
+        """
+        Difference between the best and worst seat's win rate.
+        """
+        rates = self.win_rates
+        return float(rates.max() - rates.min())
+
+    @property
+    def advantage_error(self):
+        # Standard error of a win-rate difference, used as a search margin
+        n = max(self.finished, 1)
+        p = 1 / len(self.wins)
+        return 2 * float(np.sqrt(2 * p * (1 - p) / n))
+
+    @property
+    def mean_length(self):
+        total = self.length_counts.sum()
+        if not total:
+            return float('nan')
+        return float(np.dot(np.arange(len(self.length_counts)), self.length_counts) / total)
+
+    def length_percentile(self, q):
+        total = self.length_counts.sum()
+        if not total:
+            return float('nan')
+        cumulative = np.cumsum(self.length_counts)
+        return int(np.searchsorted(cumulative, q / 100 * total))
+
+    @property
+    def turns_per_second(self):
+        turns = np.dot(np.arange(len(self.length_counts)), self.length_counts)
+        return turns / self.elapsed if self.elapsed else float('nan')
+
+
+# Settings that must match for a checkpointed chunk to be reused
+RUN_SETTINGS = ('seed', 'num_players', 'chunk_size', 'max_turns')
+
+
+def run_chunk(config, chunk_index, num_games, num_players, seed, seed_sequence, max_turns):
+    """
+    Simulate one chunk of games in a worker process.
+    :param seed: the sweep seed, recorded with the results
+    :return: a JSON-serializable dict with the chunk's results
+    """
+    result = simulate(config.num_sections, list(config.card_numbers), config.num_cards_per_character,
+                      num_games, num_players=num_players, seed=np.random.default_rng(seed_sequence),
+                      max_turns=max_turns)
+    finished = result.winners >= 0
+    lengths, counts = np.unique(result.lengths[finished], return_counts=True)
+    return {
+        'config': config.key,
+        'chunk': chunk_index,
+        'seed': seed,
+        'num_players': num_players,
+        'chunk_size': num_games,
+        'max_turns': max_turns,
+        'wins': np.bincount(result.winners[finished], minlength=num_players).tolist(),
+        'unfinished': int(np.count_nonzero(~finished)),
+        'lengths': lengths.tolist(),
+        'counts': counts.tolist(),
+        'elapsed': result.elapsed,
+    }
+
+
+def load_checkpoint(path):
+    """
+    Read the chunks recorded by earlier runs. A line left truncated by an
+    interrupted run is skipped.
+    """
+    chunks = []
+    if path and os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                try:
+                    chunks.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+    return chunks
+
+
+def open_checkpoint(path):
+    out = open(path, 'a+')
+    # Start on a fresh line if the previous run died halfway through a write
+    if out.tell():
+        out.seek(out.tell() - 1)
+        if out.read(1) != '\n':
+            out.write('\n')
+    return out
+
+
+def run_sweep(configs, games, chunk_size, num_players=4, seed=0, max_turns=10000,
+              workers=None, checkpoint=None, stats=None, on_chunk=None):
+    """
+    Play `games` games for every config and return {config key: ConfigStats}.
+    Games are rounded up to whole chunks so a chunk index always means the
+    same games. Chunks found in the checkpoint or already in `stats` are not
+    replayed; checkpointed chunks played with other RUN_SETTINGS are ignored.
+    """
+    if stats is None:
+        stats = {}
+    for config in configs:
+        stats.setdefault(config.key, ConfigStats(config, num_players))
+    settings = dict(seed=seed, num_players=num_players, chunk_size=chunk_size, max_turns=max_turns)
+    ignored = 0
+    for chunk in load_checkpoint(checkpoint):
+        if chunk['config'] not in stats:
+            continue
+        if any(chunk.get(name) != settings[name] for name in RUN_SETTINGS):
+            ignored += 1
+            continue
+        stats[chunk['config']].add(chunk)
+    if ignored:
+        print(f"Ignored {ignored} checkpointed chunks played with a different seed, player count, "
+              f"chunk size or turn limit")
+
+    tasks = []
+    for config in configs:
+        for chunk_index in range(-(-games // chunk_size)):
+            if chunk_index in stats[config.key].chunks:
+                continue
+            # The spawn key ties the stream to the config and chunk, not to the worker
+            seed_sequence = np.random.SeedSequence(seed, spawn_key=config.spawn_key + (chunk_index,))
+            tasks.append((config, chunk_index, chunk_size, num_players, seed, seed_sequence, max_turns))
+    if not tasks:
+        return stats
+
+    out = open_checkpoint(checkpoint) if checkpoint else None
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(run_chunk, *task) for task in tasks]
+            for future in as_completed(futures):
+                chunk = future.result()
+                stats[chunk['config']].add(chunk)
+                if out:
+                    out.write(json.dumps(chunk) + '\n')
+                    out.flush()
+                if on_chunk:
+                    on_chunk(chunk)
+    finally:
+        if out:
+            out.close()
+    return stats
+
+
+def within_bounds(stat, max_advantage=None, length_bounds=None, margin=False):
+    """
+    Check a config against the target bounds. With margin=True the bounds are
+    widened by the statistical error, so promising configs are not dropped
+    early on a small sample.
+    """
+    if max_advantage is not None:
+        slack = stat.advantage_error if margin else 0.0
+        if stat.seat_advantage > max_advantage + slack:
+            return False
+    if length_bounds is not None:
+        low, high = length_bounds
+        slack = 0.1 * stat.mean_length if margin else 0.0
+        if not low - slack <= stat.mean_length <= high + slack:
+            return False
+    return True
+
+
+def search(configs, games, chunk_size, rounds=3, max_advantage=None, length_bounds=None, **kwargs):
+    """
+    Successive halving over configs: every round plays more games for the
+    configs still within the bounds (allowing for sampling error), and the
+    final round applies the bounds exactly.
+    :return: (stats for all configs, list of config keys that passed)
+    """
+    stats = {}
+    survivors = list(configs)
+    round_games = max(chunk_size, games >> (rounds - 1))
+    for round_index in range(rounds):
+        run_sweep(survivors, round_games, chunk_size, stats=stats, **kwargs)
+        final = round_index == rounds - 1
+        survivors = [c for c in survivors
+                     if within_bounds(stats[c.key], max_advantage, length_bounds, margin=not final)]
+        print(f"Round {round_index + 1}: {round_games} games per config, {len(survivors)} configs left")
+        if not survivors:
+            break
+        round_games = min(games, round_games * 2)
+    return stats, [c.key for c in survivors]
+
+
+def format_table(stats, num_players, passed=None):
+    header = ['sections', 'numbers', 'cards', 'games']
+    header += [f"seat{i}" for i in range(num_players)]
+    header += ['adv', 'mean', 'p50', 'p95', 'turns/s']
+    if passed is not None:
+        header.append('ok')
+    rows = []
+    for key, stat in stats.items():
+        if not stat.games:
+            continue
+        config = stat.config
+        row = [str(config.num_sections), ','.join(str(n) for n in config.card_numbers),
+               str(config.num_cards_per_character), str(stat.games)]
+        row += [f"{rate:.3f}" for rate in stat.win_rates]
+        row += [f"{stat.seat_advantage:.3f}", f"{stat.mean_length:.1f}",
+                str(stat.length_percentile(50)), str(stat.length_percentile(95)),
+                f"{stat.turns_per_second:,.0f}"]
+        if passed is not None:
+            row.append('*' if key in passed else '')
+        rows.append(row)
+    widths = [max(len(h), *(len(row[i]) for row in rows)) for i, h in enumerate(header)]
+    lines = ['  '.join(h.rjust(w) for h, w in zip(header, widths))]
+    for row in rows:
+        lines.append('  '.join(cell.rjust(w) for cell, w in zip(row, widths)))
+    return '\n'.join(lines)
+
+
+def parse_int_list(text):
+    return [int(v) for v in text.split(',') if v.strip()]
+
+
+def parse_number_sets(text):
+    return [parse_card_numbers(part) for part in text.split(';') if part.strip()]
+
+
+def parse_bounds(text):
+    low, high = (float(v) for v in text.split(','))
+    return low, high
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Sweep Fiery Dragon deck configurations.')
+    parser.add_argument('--sections', type=parse_int_list, default=[8],
+                        help='comma-separated numbers of board sections')
+    parser.add_argument('--numbers', type=parse_number_sets, default=[[1, 2, 3]],
+                        help='semicolon-separated card number sets, e.g. "1,2,3;1,2,3,4"')
+    parser.add_argument('--cards', type=parse_int_list, default=[4],
+                        help='comma-separated numbers of cards per character')
+    parser.add_argument('--games', type=int, default=100000, help='games per config')
+    parser.add_argument('--chunk', type=int, default=20000, help='games per worker task')
+    parser.add_argument('--players', type=int, default=4, help='number of players')
+    parser.add_argument('--seed', type=int, default=0, help='sweep seed')
+    parser.add_argument('--max-turns', type=int, default=10000, help='turn limit per game')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: all cores)')
+    parser.add_argument('--checkpoint', default=None, help='file to record finished chunks and resume from')
+    parser.add_argument('--search', action='store_true', help='search for configs within the target bounds')
+    parser.add_argument('--rounds', type=int, default=3, help='successive halving rounds in search mode')
+    parser.add_argument('--max-advantage', type=float, default=None,
+                        help='largest allowed difference between seat win rates')
+    parser.add_argument('--length', type=parse_bounds, default=None,
+                        help='allowed mean game length in turns, as "low,high"')
+    args = parser.parse_args(argv)
+
+    configs = [Config(s, n, c) for s, n, c in itertools.product(args.sections, args.numbers, args.cards)]
+    options = dict(num_players=args.players, seed=args.seed, max_turns=args.max_turns,
+                   workers=args.workers, checkpoint=args.checkpoint)
+    if args.search:
+        stats, passed = search(configs, args.games, args.chunk, rounds=args.rounds,
+                               max_advantage=args.max_advantage, length_bounds=args.length, **options)
+        print(format_table(stats, args.players, passed))
+    else:
+        stats = run_sweep(configs, args.games, args.chunk, **options)
+        passed = None
+        if args.max_advantage is not None or args.length is not None:
+            passed = [k for k, s in stats.items() if within_bounds(s, args.max_advantage, args.length)]
+        print(format_table(stats, args.players, passed))
+
+
+if __name__ == '__main__':
+    main()
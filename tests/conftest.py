@@ -0,0 +1,60 @@
+# conftest.py
+
+# The game's modules live at the top of the repository, and the tests run
+# without a window or sound card (SDL dummy drivers).
+
+import os
+import sys
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import random
+
+import pygame
+import pytest
+
+from settings import *
+from models import Board, Player, create_deck
+from engine import GameEngine
+
+CENTER = (SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2)
+
+
+def new_game(num_sections=8, card_numbers=(1, 2, 3), num_cards_per_character=4, seed=1):
+    """
+    Return a GameEngine at the start of a game, seated from settings.PLAYERS.
+    """
+    board = Board(CENTER, BOARD_RADIUS, num_sections, {})
+    board.precompute_steps(card_numbers)
+    deck = create_deck({}, card_numbers, num_cards_per_character, seed)
+    players = [Player(name, character, color) for name, character, color in PLAYERS]
+    return GameEngine(board, deck, players)
+
+
+def play(engine, moves, rng, on_move=None):
+    """
+    Flip random face-down cards until the game ends or `moves` flips.
+    :param on_move: called with each card index after it is applied
+    """
+    for _ in range(moves):
+        if engine.is_terminal():
+            break
+        card_index = rng.choice(engine.legal_actions())
+        engine.apply(card_index)
+        if on_move is not None:
+            on_move(card_index)
+
+
+@pytest.fixture
+def rng():
+    return random.Random(1234)
+
+
+@pytest.fixture(scope='session')
+def screen():
+    pygame.display.init()
+    pygame.font.init()
+    yield pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    pygame.quit()
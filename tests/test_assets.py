@@ -0,0 +1,137 @@
+# test_assets.py
+
+# The texture atlas cache, on small generated images instead of images/.
+
+import os
+
+import pygame
+import pytest
+
+import assets
+from assets import load_atlas, atlas_sources, target_size
+
+COLORS = {'card_cover': (200, 0, 0), 'dragon': (0, 200, 0), 'dragon_1': (0, 0, 200), 'bat_1': (200, 200, 0)}
+
+
+def write_image(path, color, size=(16, 16)):
+    image = pygame.Surface(size, pygame.SRCALPHA)
+    image.fill(color)
+    pygame.image.save(image, path)
+
+
+@pytest.fixture
+def image_dir(tmp_path):
+    directory = tmp_path / 'images'
+    directory.mkdir()
+    for name, color in COLORS.items():
+        write_image(str(directory / f"{name}.png"), color)
+    return str(directory)
+
+
+@pytest.fixture
+def builds(monkeypatch):
+    """
+    Record the names decoded by every build_atlas call.
+    """
+    calls = []
+    build_atlas = assets.build_atlas
+
+    def record(sources, *args, **kwargs):
+        calls.append(set(sources))
+        return build_atlas(sources, *args, **kwargs)
+    monkeypatch.setattr(assets, 'build_atlas', record)
+    return calls
+
+
+def color_of(atlas, name):
+    return tuple(atlas.get(name).get_at((4, 4)))[:3]
+
+
+def test_atlas_holds_scaled_images(image_dir, tmp_path):
+    atlas = load_atlas(image_dir, str(tmp_path / 'cache'), convert=False)
+    for name, color in COLORS.items():
+        assert atlas.get(name).get_size() == target_size(name)
+        assert color_of(atlas, name) == color
+    rects = [pygame.Rect(rect) for rect in atlas.entries.values()]
+    assert not any(a.colliderect(b) for i, a in enumerate(rects) for b in rects[i + 1:])
+    assert atlas.get('missing') is None
+
+
+def test_cached_atlas_is_not_decoded_again(image_dir, tmp_path, builds):
+    cache_dir = str(tmp_path / 'cache')
+    load_atlas(image_dir, cache_dir, convert=False)
+    atlas = load_atlas(image_dir, cache_dir, convert=False)
+    assert builds == [set(COLORS)]
+    assert color_of(atlas, 'dragon_1') == COLORS['dragon_1']
+
+
+def test_edited_image_rebuilds_the_atlas(image_dir, tmp_path, builds):
+    cache_dir = str(tmp_path / 'cache')
+    load_atlas(image_dir, cache_dir, convert=False)
+    path = os.path.join(image_dir, 'dragon_1.png')
+    mtime = os.stat(path).st_mtime_ns
+    write_image(path, (10, 20, 30))
+    os.utime(path, ns=(mtime + 10 ** 9, mtime + 10 ** 9))
+
+    atlas = load_atlas(image_dir, cache_dir, convert=False)
+    assert len(builds) == 2
+    assert color_of(atlas, 'dragon_1') == (10, 20, 30)
+    assert load_atlas(image_dir, cache_dir, convert=False).entries == atlas.entries
+    assert len(builds) == 2
+
+
+def test_added_image_rebuilds_the_atlas(image_dir, tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    load_atlas(image_dir, cache_dir, convert=False)
+    write_image(os.path.join(image_dir, 'spider_2.png'), (1, 2, 3))
+    atlas = load_atlas(image_dir, cache_dir, convert=False)
+    assert set(atlas.entries) == set(COLORS) | {'spider_2'}
+
+
+def test_corrupt_cache_is_rebuilt(image_dir, tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    load_atlas(image_dir, cache_dir, convert=False)
+    with open(os.path.join(cache_dir, 'atlas.png'), 'wb') as f:
+        f.write(b'not a png')
+    atlas = load_atlas(image_dir, cache_dir, convert=False)
+    assert color_of(atlas, 'card_cover') == COLORS['card_cover']
+    assert set(atlas_sources(image_dir)) == set(atlas.entries)
+
+
+def test_manager_decodes_only_the_configuration(image_dir, tmp_path, screen, builds):
+    manager = assets.AssetManager(image_dir, str(tmp_path / 'cache'))
+    card_images, _, _ = manager.images((1,))
+    assert not manager.ready
+    assert card_images['dragon_1'].get_size() == target_size('dragon_1')
+    manager.wait((1,))
+    assert builds == [{'card_cover', 'dragon', 'dragon_1', 'bat_1'}]
+    card_images, card_back, board_images = manager.images((1,))
+    assert tuple(card_images['dragon_1'].get_at((4, 4)))[:3] == COLORS['dragon_1']
+    assert card_back is manager.get('card_cover')
+    assert set(board_images) == {'dragon'}
+    # Everything needed is loaded, so nothing is decoded again
+    manager.wait((1,))
+    assert len(builds) == 1
+
+
+def test_manager_keeps_placeholders_for_broken_images(image_dir, tmp_path, screen):
+    with open(os.path.join(image_dir, 'bat_1.png'), 'wb') as f:
+        f.write(b'not a png')
+    manager = assets.AssetManager(image_dir, str(tmp_path / 'cache'))
+    manager.wait((1,))
+    assert manager.ready
+    assert manager.get('bat_1') is manager.placeholder('bat_1')
+    assert manager.get('dragon_1') is not manager.placeholder('dragon_1')
+    # A failed image is not retried
+    manager.start((1,))
+    assert manager.ready
+
+
+def test_manager_reports_worker_errors(image_dir, tmp_path, screen, monkeypatch):
+    def fail(*args, **kwargs):
+        raise ValueError('broken cache')
+    monkeypatch.setattr(assets, 'load_atlas', fail)
+    manager = assets.AssetManager(image_dir, str(tmp_path / 'cache'))
+    manager.wait((1,))
+    assert manager.ready and manager.atlas is None
+    assert manager.get('dragon_1').get_size() == target_size('dragon_1')
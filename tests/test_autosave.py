@@ -0,0 +1,145 @@
+# test_autosave.py
+
+# AutosaveService on a temporary directory. Snapshots are plain bytes here;
+# the service writes them as they are.
+
+import os
+import threading
+
+import pytest
+
+import autosave
+import savefile
+from autosave import AutosaveService, autosave_files
+from catalog import SaveCatalog
+
+
+def contents(paths):
+    result = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            result.append(f.read())
+    return result
+
+
+@pytest.fixture
+def service(tmp_path):
+    service = AutosaveService(str(tmp_path / 'autosave'), keep=3)
+    yield service
+    service.close()
+
+
+def test_keeps_the_last_autosaves(service):
+    for turn in range(7):
+        service.submit(b'turn %d' % turn)
+        service.flush()
+    paths = autosave_files(service.directory)
+    assert [os.path.basename(path) for path in paths] == \
+        [f"autosave-{n:06d}{savefile.SAVE_EXTENSION}" for n in (5, 6, 7)]
+    assert contents(paths) == [b'turn 4', b'turn 5', b'turn 6']
+    assert service.written == 7
+
+
+def test_numbering_continues_after_a_restart(service):
+    service.submit(b'first')
+    service.close()
+    restarted = AutosaveService(service.directory, keep=3)
+    restarted.submit(b'second')
+    restarted.close()
+    assert contents(autosave_files(service.directory)) == [b'first', b'second']
+
+
+def test_snapshots_waiting_for_the_writer_are_coalesced(service, monkeypatch):
+    writing, release = threading.Event(), threading.Event()
+    write_atomic = autosave.write_atomic
+
+    def slow_write(path, data):
+        writing.set()
+        release.wait(5)
+        write_atomic(path, data)
+    monkeypatch.setattr(autosave, 'write_atomic', slow_write)
+
+    service.submit(b'turn 0')
+    assert writing.wait(5)
+    for turn in range(1, 6):
+        service.submit(b'turn %d' % turn)
+    release.set()
+    service.flush()
+    assert service.written == 2
+    assert contents(autosave_files(service.directory)) == [b'turn 0', b'turn 5']
+
+
+def test_close_writes_the_last_snapshot(service):
+    service.submit(b'last')
+    service.close()
+    assert contents(autosave_files(service.directory)) == [b'last']
+    service.submit(b'ignored')
+    assert service.written == 1
+
+
+def test_failed_write_keeps_the_old_file(tmp_path, monkeypatch):
+    path = str(tmp_path / 'game.fds')
+    savefile.write_atomic(path, b'old')
+
+    def fail(fd):
+        raise OSError('disk full')
+    monkeypatch.setattr(savefile.os, 'fsync', fail)
+    with pytest.raises(OSError):
+        savefile.write_atomic(path, b'new')
+    assert contents([path]) == [b'old']
+
+
+def test_failed_autosave_does_not_stop_the_writer(service, monkeypatch):
+    service.submit(b'turn 0')
+    service.flush()
+    write_atomic = autosave.write_atomic
+    failures = [OSError('disk full')]
+
+    def flaky_write(path, data):
+        if failures:
+            raise failures.pop()
+        write_atomic(path, data)
+    monkeypatch.setattr(autosave, 'write_atomic', flaky_write)
+    service.submit(b'turn 1')
+    service.flush()
+    service.submit(b'turn 2')
+    service.flush()
+    assert contents(autosave_files(service.directory)) == [b'turn 0', b'turn 2']
+
+
+def test_failed_thumbnail_does_not_stop_the_writer(tmp_path):
+    catalog = SaveCatalog(str(tmp_path / 'saves'))
+    service = AutosaveService(str(tmp_path / 'autosave'), keep=3, catalog=catalog)
+
+    def broken_thumbnail():
+        raise ValueError('no board to draw')
+    service.submit(b'turn 0', {'time': 0, 'turn': 0}, broken_thumbnail)
+    service.flush()
+    path = str(tmp_path / 'manual.fds')
+    future = service.save(path, b'manual', entry={'time': 1, 'turn': 1})
+    assert future.result(timeout=5) is None
+    service.close()
+    assert contents([path]) == [b'manual']
+    assert [p for p, _ in catalog.entries()] == [path]
+
+
+def test_manual_saves_are_written_in_order(tmp_path, service):
+    catalog = service.catalog = SaveCatalog(str(tmp_path / 'saves'))
+    path = str(tmp_path / 'manual.fds')
+    futures = [service.save(path, b'start'), service.save(path, b' more', append=True, entry={'time': 1, 'turn': 2})]
+    service.submit(b'turn 2')
+    assert [future.result(timeout=5) for future in futures] == [None, None]
+    service.flush()
+    assert contents([path]) == [b'start more']
+    assert [(p, entry['turn']) for p, entry in catalog.entries()] == [(path, 2)]
+
+
+def test_manual_save_errors_reach_the_future(tmp_path, service):
+    # A directory cannot be written over as a file
+    future = service.save(str(tmp_path), b'data')
+    with pytest.raises(OSError):
+        future.result(timeout=5)
+    assert service.save(str(tmp_path / 'ok.fds'), b'data').result(timeout=5) is None
+    service.close()
+    with pytest.raises(OSError):
+        service.save(str(tmp_path / 'late.fds'), b'data').result(timeout=5)
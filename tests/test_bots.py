@@ -0,0 +1,117 @@
+# test_bots.py
+
+# CardMemory bookkeeping and what each recall mode does with it.
+
+import pytest
+
+from models import CARD_CHARACTERS
+from engine import TurnEvent
+from bots import Bot, CardMemory, attach_bots, soak
+from conftest import new_game, play
+
+
+def check_memory(memory):
+    known = {index for index, code in enumerate(memory.codes) if code != -1}
+    assert set(memory.unknown) == set(range(len(memory.codes))) - known
+    assert len(memory.unknown) == len(set(memory.unknown))
+    for slot, index in enumerate(memory.unknown):
+        assert memory._slots[index] == slot
+    by_face = {(code, number): indices for code, faces in memory.by_face.items()
+               for number, indices in faces.items() if indices}
+    assert by_face == {face: {index for index in known if (memory.codes[index], memory.numbers[index]) == face}
+                       for face in {(memory.codes[index], memory.numbers[index]) for index in known}}
+
+
+def test_memory_bookkeeping(rng):
+    memory = CardMemory(40)
+    for step in range(500):
+        index = rng.randrange(40)
+        if rng.random() < 0.3:
+            memory.forget(index)
+        else:
+            memory.observe(index, index % 5, index % 3 + 1)
+        if step % 25 == 0:
+            check_memory(memory)
+    check_memory(memory)
+    memory.observe(7, 2, 2)
+    assert memory.age(7) == 0
+    memory.observe(8, 3, 3)
+    assert memory.age(7) == 1
+
+
+def watched_game(mode, seed=1, **kwargs):
+    engine = new_game(seed=seed)
+    bot = Bot(mode, len(engine.deck), seed=seed, **kwargs)
+    engine.listeners.append(bot.observe)
+    return engine, bot
+
+
+def show(engine, bot, indices):
+    # Show cards to the bot without turning them over
+    for index in indices:
+        bot.observe(engine, TurnEvent(engine.current_player, index, engine.deck[index], 'no_match', False))
+
+
+def own_cards(engine):
+    code = CARD_CHARACTERS.index(engine.current_player.character)
+    return [index for index in range(len(engine.deck)) if engine.deck.characters[index] == code]
+
+
+def test_perfect_bot_picks_its_best_seen_card():
+    engine, bot = watched_game('perfect')
+    cards = own_cards(engine)
+    show(engine, bot, cards)
+    best = max(engine.deck.numbers[index] for index in cards)
+    for _ in range(10):
+        choice = bot.choose(engine)
+        assert choice in cards and engine.deck.numbers[choice] == best
+
+
+@pytest.mark.parametrize('half_life, remembered', [(1e-9, False), (1e9, True)])
+def test_decaying_bot_forgets_old_cards(half_life, remembered):
+    engine, bot = watched_game('decaying', half_life=half_life)
+    cards = own_cards(engine)
+    show(engine, bot, cards)
+    # Another card, so that every card of ours is at least a flip old
+    show(engine, bot, [next(index for index in range(len(engine.deck)) if index not in cards)])
+    choice = bot.choose(engine)
+    assert all((bot.memory.codes[index] != -1) == remembered for index in cards)
+    if remembered:
+        assert choice in cards
+
+
+def test_random_bot_remembers_nothing(rng):
+    engine, bot = watched_game('random')
+    play(engine, 20, rng)
+    assert bot.memory is None
+    assert not engine.deck.is_flipped(bot.choose(engine))
+
+
+def test_unknown_mode():
+    with pytest.raises(ValueError):
+        Bot('psychic', 10)
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_bots_only_make_legal_moves(seed):
+    engine = new_game(seed=seed)
+    bots = attach_bots(engine, ['perfect', 'decaying', 'random', 'human'], seed)
+    assert bots[3] is None
+    for _ in range(3000):
+        if engine.is_terminal():
+            break
+        bot = bots[engine.current_player_index] or bots[0]
+        index = bot.choose(engine)
+        assert index in engine.legal_actions()
+        engine.apply(index)
+    assert engine.is_terminal()
+
+
+def test_soak_is_seeded_and_memory_beats_chance():
+    players = ['perfect', 'random', 'decaying', 'random']
+    wins, unfinished, _ = soak(100, players, 8, [1, 2, 3], 4, seed=1)
+    assert soak(100, players, 8, [1, 2, 3], 4, seed=1)[:2] == (wins, unfinished)
+    assert not unfinished and sum(wins) == 100
+    assert wins[0] + wins[2] > 3 * (wins[1] + wins[3])
+    with pytest.raises(ValueError):
+        soak(1, players[:2], 8, [1, 2, 3], 4)
@@ -0,0 +1,84 @@
+# test_catalog.py
+
+# SaveCatalog on a temporary directory.
+
+import json
+import os
+
+import pygame
+import pytest
+
+from catalog import SaveCatalog, catalog_entry
+from conftest import new_game, play
+
+
+def touch(path):
+    with open(path, 'wb') as f:
+        f.write(b'save')
+    return path
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    return SaveCatalog(str(tmp_path / 'saves'))
+
+
+def test_entry_describes_the_game(rng):
+    engine = new_game()
+    play(engine, 30, rng)
+    entry = catalog_entry(engine, (1, 2, 3), 4, kind='autosave')
+    assert entry['kind'] == 'autosave' and entry['turn'] == engine.turn
+    assert entry['num_sections'] == 8 and entry['card_numbers'] == [1, 2, 3]
+    assert entry['current_player'] == engine.current_player.name
+    assert entry['players'] == [[p.name, p.position, p.laps_completed] for p in engine.players]
+    # The index is JSON
+    assert json.loads(json.dumps(entry)) == entry
+
+
+def test_entries_are_sorted_and_survive_a_reload(catalog):
+    for turn, name in enumerate(['a', 'b', 'c']):
+        catalog.add(touch(catalog.new_save_path()), {'time': 10 - turn, 'turn': turn, 'name': name})
+    names = lambda entries: [entry['name'] for _, entry in entries]
+    assert names(catalog.entries('Newest')) == ['a', 'b', 'c']
+    assert names(catalog.entries('Oldest')) == ['c', 'b', 'a']
+    assert names(SaveCatalog(catalog.directory).entries('Most turns')) == ['c', 'b', 'a']
+
+
+def test_new_save_paths_are_unique(catalog):
+    paths = [touch(catalog.new_save_path()) for _ in range(3)]
+    assert len(set(paths)) == 3
+    assert all(os.path.dirname(path) == catalog.directory for path in paths)
+
+
+def test_deleted_saves_are_dropped(catalog):
+    kept, deleted = touch(catalog.new_save_path()), touch(catalog.new_save_path())
+    catalog.add(kept, {'time': 1, 'turn': 1})
+    catalog.add(deleted, {'time': 2, 'turn': 2})
+    os.remove(deleted)
+    assert [path for path, _ in catalog.entries()] == [kept]
+    assert [path for path, _ in SaveCatalog(catalog.directory).entries()] == [kept]
+
+
+def test_thumbnails_are_stored_and_removed(catalog, screen):
+    path = touch(catalog.new_save_path())
+    thumbnail = pygame.Surface((32, 24))
+    thumbnail.fill((10, 200, 30))
+    catalog.add(path, {'time': 1, 'turn': 1}, thumbnail)
+    (_, entry), = catalog.entries()
+    image = SaveCatalog.load_thumbnail(entry)
+    assert image.get_size() == (32, 24) and tuple(image.get_at((5, 5)))[:3] == (10, 200, 30)
+    catalog.remove(path)
+    assert not os.path.exists(entry['thumbnail'])
+    assert catalog.entries() == []
+    assert SaveCatalog.load_thumbnail(entry) is None
+
+
+@pytest.mark.parametrize('index', [b'', b'{"version": 1', b'{"version": 99, "saves": {}}', b'[]'])
+def test_unreadable_index_starts_empty(catalog, index):
+    os.makedirs(catalog.directory)
+    with open(catalog.index_path, 'wb') as f:
+        f.write(index)
+    assert catalog.entries() == []
+    path = touch(catalog.new_save_path())
+    catalog.add(path, {'time': 1, 'turn': 1})
+    assert [p for p, _ in SaveCatalog(catalog.directory).entries()] == [path]
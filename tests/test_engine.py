@@ -0,0 +1,114 @@
+# test_engine.py
+
+# GameEngine against the rules of the original player_turn loop, replayed
+# here on plain lists the way that loop resolved each click.
+
+import random
+
+import pytest
+
+from settings import PLAYERS
+from models import BOARD_CHARACTERS
+from conftest import new_game
+
+
+class BaselineGame:
+    """
+    The original rules: Card.is_flipped flags, Player.move / move_backward
+    with modulo arithmetic and the character of the square landed on.
+    """
+    def __init__(self, engine):
+        self.squares = engine.board.total_subsections
+        self.cards = [[card.character, card.number, False] for card in engine.deck]
+        self.players = [{'character': character, 'position': 0, 'laps': 0} for _, character, _ in PLAYERS]
+        self.current = 0
+
+    def move(self, player, steps):
+        previous = player['position']
+        player['position'] = (previous + steps) % self.squares
+        if steps > 0 and player['position'] < previous:
+            player['laps'] += 1
+        if steps < 0 and player['position'] > previous:
+            player['laps'] -= 1
+        player['character'] = BOARD_CHARACTERS[player['position'] % len(BOARD_CHARACTERS)]
+
+    def click(self, index):
+        """
+        :return: (kind, turn over, won)
+        """
+        card = self.cards[index]
+        player = self.players[self.current]
+        card[2] = not card[2]
+        if card[0] == 'pirate':
+            self.move(player, -card[1])
+            kind, turn_over = 'backward', True
+        elif card[0] == player['character']:
+            self.move(player, card[1])
+            card[2] = True
+            kind, turn_over = 'forward', all(c[2] for c in self.cards)
+        else:
+            card[2] = not card[2]
+            kind, turn_over = 'no_match', True
+        if player['laps'] >= 1:
+            return kind, True, True
+        if turn_over:
+            for c in self.cards:
+                c[2] = False
+            self.current = (self.current + 1) % len(self.players)
+        return kind, turn_over, False
+
+
+@pytest.mark.parametrize('seed', range(20))
+@pytest.mark.parametrize('config', [(8, (1, 2, 3), 4), (3, (1, 2), 2), (16, (1, 2, 3, 4, 5), 3)])
+def test_engine_matches_player_turn(seed, config):
+    num_sections, card_numbers, num_cards_per_character = config
+    engine = new_game(num_sections, card_numbers, num_cards_per_character, seed)
+    baseline = BaselineGame(engine)
+    rng = random.Random(seed)
+    for _ in range(5000):
+        if engine.is_terminal():
+            break
+        index = rng.choice(engine.legal_actions())
+        event = engine.apply(index)
+        kind, turn_over, won = baseline.click(index)
+        assert (event.kind, event.turn_over, event.winner is not None) == (kind, turn_over, won)
+        assert engine.current_player_index == baseline.current
+        for player, expected in zip(engine.players, baseline.players):
+            assert (player.position, player.laps_completed, player.character) == \
+                (expected['position'], expected['laps'], expected['character'])
+        assert engine.deck.flipped_indices() == [i for i, c in enumerate(baseline.cards) if c[2]]
+    assert engine.is_terminal()
+
+
+def test_turn_ends_after_miss():
+    engine = new_game(seed=3)
+    player = engine.current_player
+    miss = next(i for i, card in enumerate(engine.deck)
+                if card.character not in ('pirate', player.character))
+    event = engine.apply(miss)
+    assert event.kind == 'no_match' and event.turn_over
+    assert engine.current_player_index == 1 and engine.turn == 1
+    assert not engine.deck.flipped_count
+
+
+def test_match_keeps_turn_and_card_face_up():
+    engine = new_game(seed=3)
+    player = engine.current_player
+    match = next(i for i, card in enumerate(engine.deck) if card.character == player.character)
+    event = engine.apply(match)
+    assert event.kind == 'forward' and not event.turn_over
+    assert engine.current_player is player
+    assert engine.deck.is_flipped(match)
+    assert match not in engine.legal_actions()
+    with pytest.raises(ValueError):
+        engine.apply(match)
+
+
+def test_no_moves_after_win(rng):
+    engine = new_game(num_sections=1, seed=5)
+    while not engine.is_terminal():
+        engine.apply(rng.choice(engine.legal_actions()))
+    assert engine.winner.laps_completed >= 1
+    assert engine.legal_actions() == []
+    with pytest.raises(ValueError):
+        engine.apply(0)
@@ -0,0 +1,92 @@
+# test_models.py
+
+# Deck's compact arrays and face-up bitset.
+
+import random
+
+import pytest
+
+from models import Deck, CARD_CHARACTERS, create_deck
+
+
+def deck_of(size):
+    return Deck([i % len(CARD_CHARACTERS) for i in range(size)], [1 + i % 3 for i in range(size)])
+
+
+def test_set_flipped_counts_and_indices():
+    deck = deck_of(20)
+    for index in (0, 7, 8, 15, 19):
+        deck.set_flipped(index, True)
+    deck.set_flipped(7, True)  # Already face up: no change
+    assert deck.flipped_count == 5
+    assert deck.flipped_indices() == [0, 7, 8, 15, 19]
+    assert deck.face_down_indices() == [i for i in range(20) if i not in (0, 7, 8, 15, 19)]
+    deck.set_flipped(8, False)
+    deck.flip(0)
+    deck.flip(1)
+    assert deck.flipped_indices() == [1, 7, 15, 19]
+    assert deck.flipped_count == 4
+    assert [deck.is_flipped(i) for i in (0, 1, 7)] == [False, True, True]
+
+
+def test_all_flipped_and_reset():
+    deck = deck_of(9)
+    for index in range(9):
+        assert not deck.all_flipped()
+        deck.flip(index)
+    assert deck.all_flipped()
+    deck.reset()
+    assert deck.flipped_count == 0
+    assert deck.flipped_indices() == []
+    assert deck.face_down_indices() == list(range(9))
+
+
+def test_random_flips_match_a_set():
+    rng = random.Random(3)
+    deck = deck_of(1000)
+    face_up = set()
+    for _ in range(5000):
+        index = rng.randrange(1000)
+        deck.flip(index)
+        face_up ^= {index}
+    assert deck.flipped_indices() == sorted(face_up)
+    assert deck.flipped_count == len(face_up)
+    assert deck.face_down_indices() == sorted(set(range(1000)) - face_up)
+
+
+def test_changed_since():
+    deck = deck_of(100)
+    deck.set_flipped(3, True)
+    state = deck.flipped_state()
+    assert deck.changed_since(state) == []
+    deck.set_flipped(3, False)
+    for index in (4, 9, 63, 99):
+        deck.set_flipped(index, True)
+    assert deck.changed_since(state) == [3, 4, 9, 63, 99]
+    # Ranges that start and stop inside a byte of the bitset
+    assert deck.changed_since(state, 4, 64) == [4, 9, 63]
+    assert deck.changed_since(state, 5, 63) == [9]
+    assert deck.changed_since(state, 99) == [99]
+    # A card turned back to how it was is no longer a change
+    deck.set_flipped(3, True)
+    assert deck.changed_since(state) == [4, 9, 63, 99]
+
+
+def test_faces_are_shared():
+    deck = Deck.from_cards([('dragon', 1), ('pirate', 2), ('dragon', 1)])
+    assert deck[0] is deck[2]
+    assert (deck[1].character, deck[1].number, deck[1].card_type) == ('pirate', 2, 'move_backward')
+    assert [card.character for card in deck] == ['dragon', 'pirate', 'dragon']
+
+
+def test_mismatched_arrays():
+    with pytest.raises(ValueError):
+        Deck([0, 1], [1])
+
+
+def test_create_deck_is_seeded():
+    first = create_deck({}, [1, 2, 3], 4, seed=5)
+    second = create_deck({}, [1, 2, 3], 4, seed=5)
+    assert list(first.characters) == list(second.characters)
+    assert list(first.numbers) == list(second.numbers)
+    assert len(first) == 4 * 3 * 4 + 2 * 2
@@ -0,0 +1,105 @@
+# test_profiler.py
+
+# Profiler on a fake clock that advances one millisecond per reading, so
+# every duration is known exactly.
+
+import csv
+import itertools
+import json
+
+import pytest
+
+import profiler as profiler_module
+from profiler import Profiler, NULL_SECTION
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    ticks = itertools.count()
+    monkeypatch.setattr(profiler_module.time, 'perf_counter', lambda: next(ticks) / 1000)
+
+
+def frame(profiler, text_sections=1):
+    # Clock readings: 1 at the start, 1 per mark, 2 per section, 1 at the end
+    profiler.begin_frame()
+    profiler.mark('events')
+    for _ in range(text_sections):
+        with profiler.section('text'):
+            pass
+    profiler.mark('draw')
+    profiler.end_frame()
+
+
+def test_disabled_profiler_records_nothing(clock):
+    profiler = Profiler(capacity=4)
+    frame(profiler)
+    assert profiler.section('text') is NULL_SECTION
+    assert profiler.count == 0 and profiler.names == []
+    assert len(profiler.rows()) == 0 and profiler.fps() == 0.0
+
+
+def test_repeated_sections_are_summed(clock):
+    profiler = Profiler(capacity=4)
+    profiler.enabled = True
+    frame(profiler, text_sections=3)
+    row, = profiler.rows()
+    durations = dict(zip(profiler.names, profiler.durations[row] * 1000))
+    assert durations == pytest.approx({'events': 1, 'text': 3, 'draw': 7})
+    assert profiler.frame_times[row] * 1000 == pytest.approx(9)
+
+
+def test_ring_buffer_keeps_the_last_frames(clock):
+    profiler = Profiler(capacity=4)
+    profiler.enabled = True
+    for _ in range(6):
+        frame(profiler)
+    rows = profiler.rows()
+    assert rows.tolist() == [2, 3, 0, 1]
+    assert list(profiler.frame_starts[rows] * 1000) == pytest.approx([12, 18, 24, 30])
+    assert profiler.fps(4) == pytest.approx(3 / 0.018)
+
+
+def test_phases_past_the_limit_are_dropped(clock, monkeypatch):
+    monkeypatch.setattr(Profiler, 'MAX_PHASES', 2)
+    profiler = Profiler(capacity=4)
+    profiler.enabled = True
+    frame(profiler)
+    assert profiler.names == ['events', 'text']
+
+
+def test_export_csv(tmp_path, clock):
+    profiler = Profiler(capacity=4)
+    profiler.enabled = True
+    frame(profiler)
+    frame(profiler, text_sections=0)
+    path = str(tmp_path / 'profile.csv')
+    profiler.export(path)
+    with open(path, newline='') as f:
+        rows = list(csv.reader(f))
+    assert rows == [
+        ['frame', 'start_ms', 'frame_ms', 'events_ms', 'text_ms', 'draw_ms'],
+        ['0', '0.000', '5.000', '1.000', '1.000', '3.000'],
+        ['1', '6.000', '3.000', '1.000', '', '1.000'],
+    ]
+
+
+def test_export_chrome_trace(tmp_path, clock):
+    profiler = Profiler(capacity=4)
+    profiler.enabled = True
+    frame(profiler)
+    frame(profiler)
+    path = str(tmp_path / 'profile.json')
+    profiler.export(path)
+    with open(path) as f:
+        trace = json.load(f)
+    events = trace['traceEvents']
+    assert all(event['ph'] == 'X' for event in events)
+    assert [(e['name'], round(e['ts']), round(e['dur'])) for e in events] == [
+        ('frame', 0, 5000), ('events', 0, 1000), ('text', 2000, 1000), ('draw', 1000, 3000),
+        ('frame', 6000, 5000), ('events', 6000, 1000), ('text', 8000, 1000), ('draw', 7000, 3000),
+    ]
+    # Every phase lies inside its frame
+    for frame_event, *phases in (events[:4], events[4:]):
+        for phase in phases:
+            assert frame_event['ts'] <= phase['ts'] <= phase['ts'] + phase['dur'] <= \
+                frame_event['ts'] + frame_event['dur']
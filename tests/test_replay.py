@@ -0,0 +1,51 @@
+# test_replay.py
+
+# A recorded game replays to the same state digest every time, and seeking
+# lands on the same state as playing the journal from the start.
+
+import hashlib
+import random
+
+import pytest
+
+from savefile import GameRecord
+from replay import ReplayIndex, start_engine, state_digest
+from conftest import new_game, play
+
+
+def recorded_game(directory, rng, seed, moves=400):
+    engine = new_game(num_sections=16, seed=seed)
+    record = GameRecord.start(engine, [1, 2, 3], 4, seed)
+    play(engine, moves, rng, record.record)
+    path = str(directory / f'game-{seed}.fds')
+    record.save(path, engine)
+    return engine, path
+
+
+@pytest.mark.parametrize('seed', [1, 2, 3])
+def test_replay_digest_is_deterministic(tmp_path, rng, seed):
+    engine, path = recorded_game(tmp_path, rng, seed)
+    digests = [hashlib.sha1(ReplayIndex(GameRecord.read(path)).end_state).hexdigest() for _ in range(2)]
+    assert digests[0] == digests[1] == state_digest(engine)
+
+
+def test_same_seed_and_moves_give_the_same_digest(tmp_path):
+    (tmp_path / 'a').mkdir()
+    (tmp_path / 'b').mkdir()
+    first, _ = recorded_game(tmp_path / 'a', random.Random(7), 11)
+    second, _ = recorded_game(tmp_path / 'b', random.Random(7), 11)
+    assert state_digest(first) == state_digest(second)
+
+
+def test_seek_matches_playing_from_the_start(tmp_path, rng):
+    engine, path = recorded_game(tmp_path, rng, 4)
+    record = GameRecord.read(path)
+    index = ReplayIndex(record, interval=3)
+    assert index.last_turn > 10
+    for turn in range(index.first_turn, index.last_turn + 1, 2):
+        sought, position = index.seek(turn)
+        played = start_engine(record, index.board)
+        for card_index in record.actions[:position]:
+            played.apply(card_index)
+        assert played.turn == sought.turn == turn
+        assert state_digest(played) == state_digest(sought)
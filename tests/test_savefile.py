@@ -0,0 +1,205 @@
+# test_savefile.py
+
+# GameRecord save / append / load round trips, with the seek index small
+# enough that games cross COMPACT_AFTER.
+
+import json
+import os
+import struct
+from array import array
+
+import pytest
+
+import savefile
+from models import BOARD_CHARACTERS
+from savefile import GameRecord, SaveFileError, encode_checkpoint, load_game, restore_checkpoint
+from conftest import CENTER, new_game, play
+
+
+@pytest.fixture
+def compact_after(monkeypatch):
+    monkeypatch.setattr(savefile, 'COMPACT_AFTER', 16)
+    return 16
+
+
+def start(seed=1):
+    # A big board, so random games last long enough to cross COMPACT_AFTER
+    engine = new_game(num_sections=64, card_numbers=(1, 2, 3), num_cards_per_character=4, seed=seed)
+    return engine, GameRecord.start(engine, [1, 2, 3], 4, seed, ['human', 'random', 'human', 'perfect'])
+
+
+def assert_same_game(path, engine, record):
+    loaded = GameRecord.read(path)
+    assert list(loaded.actions) == list(record.actions)
+    assert loaded.header == record.header
+    assert encode_checkpoint(loaded.restore(CENTER, 300)) == encode_checkpoint(engine)
+    return loaded
+
+
+def test_round_trip(tmp_path, rng):
+    engine, record = start()
+    play(engine, 30, rng, record.record)
+    path = str(tmp_path / 'game.fds')
+    record.save(path, engine)
+    loaded = assert_same_game(path, engine, record)
+    assert loaded.header['player_types'] == ['human', 'random', 'human', 'perfect']
+
+
+def test_save_again_appends(tmp_path, rng, compact_after):
+    engine, record = start()
+    path = str(tmp_path / 'game.fds')
+    play(engine, 5, rng, record.record)
+    record.save(path, engine)
+    size = os.path.getsize(path)
+    play(engine, 5, rng, record.record)
+    data, append = record.prepare_save(path, engine)
+    assert append and len(data) == 4 * 5
+    savefile.write_save(path, data, append)
+    assert os.path.getsize(path) == size + len(data)
+    assert_same_game(path, engine, record)
+
+
+def test_crossing_compact_after_keeps_the_journal(tmp_path, rng, compact_after):
+    engine, record = start()
+    path = str(tmp_path / 'game.fds')
+    while len(record.actions) < 5 * compact_after and not engine.is_terminal():
+        play(engine, 7, rng, record.record)
+        data, append = record.prepare_save(path, engine)
+        savefile.write_save(path, data, append)
+        assert_same_game(path, engine, record)
+    assert len(record.actions) >= 5 * compact_after, "the game ended too early to cross COMPACT_AFTER"
+    loaded = assert_same_game(path, engine, record)
+    # Every checkpoint is kept, and loading replays at most COMPACT_AFTER moves
+    assert len(loaded.index) == len(record.index) >= 4
+    position, _ = loaded.latest_checkpoint()
+    assert len(loaded.actions) - position < compact_after + 7
+    positions = [position for position, _ in loaded.index]
+    assert positions == sorted(positions)
+
+
+def test_file_changed_behind_the_record_is_rewritten(tmp_path, rng):
+    engine, record = start()
+    path = str(tmp_path / 'game.fds')
+    play(engine, 5, rng, record.record)
+    record.save(path, engine)
+    with open(path, 'ab') as f:
+        f.write(b'junk')
+    play(engine, 5, rng, record.record)
+    data, append = record.prepare_save(path, engine)
+    assert not append
+    savefile.write_save(path, data, append)
+    assert_same_game(path, engine, record)
+
+
+def test_load_game_returns_state(tmp_path, rng):
+    engine, record = start()
+    play(engine, 20, rng, record.record)
+    path = str(tmp_path / 'game.fds')
+    record.save(path, engine)
+    state = load_game(path, CENTER, 300)
+    assert state['turn'] == engine.turn
+    assert state['current_player_index'] == engine.current_player_index
+    assert [p.position for p in state['players']] == [p.position for p in engine.players]
+    assert state['deck'].flipped_indices() == engine.deck.flipped_indices()
+
+
+@pytest.mark.parametrize('data', [b'', b'FDSV', b'not a save file at all', b'FDSV\x63\x00\x00\x00\x00\x00'])
+def test_bad_files(tmp_path, data):
+    path = str(tmp_path / 'bad.fds')
+    with open(path, 'wb') as f:
+        f.write(data)
+    with pytest.raises(SaveFileError):
+        GameRecord.read(path)
+    assert load_game(path, CENTER, 300) is None
+
+
+def test_torn_append_drops_the_last_move(tmp_path, rng):
+    engine, record = start()
+    play(engine, 20, rng, record.record)
+    path = str(tmp_path / 'game.fds')
+    record.save(path, engine)
+    with open(path, 'r+b') as f:
+        f.truncate(os.path.getsize(path) - 2)
+    loaded = GameRecord.read(path)
+    assert list(loaded.actions) == list(record.actions[:-1])
+    # The next save rewrites the file rather than append after the torn record
+    data, append = loaded.prepare_save(path, loaded.restore(CENTER, 300))
+    assert not append
+
+
+def test_seeded_deck_is_not_stored(rng):
+    # 105,000 cards
+    engine = new_game(card_numbers=(1, 2, 3, 4, 5), num_cards_per_character=5000, seed=9)
+    record = GameRecord.start(engine, [1, 2, 3, 4, 5], 5000, 9)
+    play(engine, 50, rng, record.record)
+    checkpoint = encode_checkpoint(engine, record.header, record.deck_encoding)
+    assert record.deck_encoding == savefile.DECK_SEEDED
+    # The face-up bitset and a few bytes per player
+    assert len(checkpoint) <= len(engine.deck) // 8 + 64
+    assert encode_checkpoint(restore_checkpoint(checkpoint, record.header, engine.board)) == encode_checkpoint(engine)
+
+
+@pytest.mark.parametrize('card_numbers', [(1, 2, 3), (1, 2, 3, 4, 5, 6, 7, 8), tuple(range(1, 61))])
+def test_unseeded_deck_takes_a_code_per_card(rng, card_numbers):
+    engine = new_game(card_numbers=card_numbers, num_cards_per_character=200, seed=5)
+    record = GameRecord.start(engine, card_numbers, 200)
+    play(engine, 50, rng, record.record)
+    checkpoint = encode_checkpoint(engine, record.header, record.deck_encoding)
+    assert record.deck_encoding == savefile.DECK_FACES
+    # Two bytes per card once there are more than 256 faces
+    width = 1 if len(card_numbers) * 5 <= 256 else 2
+    assert len(checkpoint) <= len(engine.deck) * width + len(engine.deck) // 8 + 64
+    assert encode_checkpoint(restore_checkpoint(checkpoint, record.header, engine.board)) == encode_checkpoint(engine)
+
+
+def test_deck_outside_the_header_is_stored_whole(rng):
+    engine = new_game(card_numbers=(1, 2, 3, 4), seed=5)
+    record = GameRecord.start(engine, [1, 2, 3], 4)
+    assert record.deck_encoding == savefile.DECK_ARRAYS
+    play(engine, 30, rng, record.record)
+    checkpoint = encode_checkpoint(engine, record.header, record.deck_encoding)
+    assert encode_checkpoint(restore_checkpoint(checkpoint, record.header, engine.board)) == encode_checkpoint(engine)
+
+
+def old_checkpoint(engine):
+    # The checkpoint layout of versions 2 and 3
+    deck = engine.deck
+    flipped = array('i', deck.flipped_indices())
+    return b''.join((
+        struct.pack('<IIiII', len(engine.players), len(deck), engine.current_player_index, engine.turn, len(flipped)),
+        array('i', (p.position for p in engine.players)).tobytes(),
+        array('i', (p.laps_completed for p in engine.players)).tobytes(),
+        array('b', (BOARD_CHARACTERS.index(p.character) for p in engine.players)).tobytes(),
+        deck.characters.tobytes(), deck.numbers.tobytes(), flipped.tobytes(),
+    ))
+
+
+@pytest.mark.parametrize('version', [2, 3])
+def test_old_versions_are_converted(tmp_path, rng, compact_after, version):
+    engine, record = start()
+    start_checkpoint = old_checkpoint(engine)
+    index = []
+    for _ in range(3):
+        play(engine, compact_after, rng, record.record)
+        index.append((len(record.actions), old_checkpoint(engine)))
+    play(engine, 5, rng, record.record)
+    header = json.dumps(record.header).encode()
+    parts = [struct.pack('<4sHI', b'FDSV', version, len(header)), header,
+             struct.pack('<I', len(start_checkpoint)), start_checkpoint]
+    if version == 3:
+        parts.append(struct.pack('<I', len(index)))
+        for position, checkpoint in index:
+            parts += [struct.pack('<II', position, len(checkpoint)), checkpoint]
+    parts.append(record.actions.tobytes())
+    path = str(tmp_path / 'old.fds')
+    with open(path, 'wb') as f:
+        f.write(b''.join(parts))
+
+    loaded = assert_same_game(path, engine, record)
+    assert loaded.deck_encoding == savefile.DECK_SEEDED
+    assert len(loaded.index) == (3 if version == 3 else 0)
+    # The next save rewrites the file in this version
+    data, append = loaded.prepare_save(path, engine)
+    assert not append
+    savefile.write_save(path, data, append)
+    assert_same_game(path, engine, record)
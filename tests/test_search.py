@@ -0,0 +1,147 @@
+# test_search.py
+
+# SearchBot on positions reached by random play, which the bot watched.
+
+import statistics
+
+import pytest
+
+import search
+from search import Search, iterative_deepening, make_search_bot, CLOCK_INTERVAL, UNKNOWN
+from models import CARD_CHARACTERS
+from conftest import new_game, play
+
+
+# A deck of 18 cards, small enough to search whole turns
+SMALL = dict(num_sections=3, card_numbers=(1, 2), num_cards_per_character=2)
+
+
+def position(rng, moves=40, max_unseen=None, **config):
+    """
+    Return (engine, bot) after random moves the bot saw, at a move with
+    something to decide.
+    :param max_unseen: most unseen cards, so the rest of the turn can be
+        searched to the end quickly
+    """
+    engine = new_game(**config)
+    bot = make_search_bot(engine, seed=1)
+    engine.listeners.append(bot.observe)
+    play(engine, moves, rng)
+    while not engine.is_terminal():
+        known, pool = bot.counts(engine.deck)
+        root = Search(bot.rules, known, pool, 0)
+        own = CARD_CHARACTERS.index(engine.current_player.character)
+        if len(root.actions(own)) > 2 and root.subtrees(own, root.actions(own)) and \
+                (max_unseen is None or 0 < sum(pool) <= max_unseen):
+            return engine, bot
+        play(engine, 1, rng)
+    pytest.skip("the game ended before a position with a choice")
+
+
+def root_of(engine, bot):
+    known, pool = bot.counts(engine.deck)
+    player = engine.current_player
+    own = CARD_CHARACTERS.index(player.character)
+    root = Search(bot.rules, known, pool, 0)
+    actions = root.actions(own)
+    return known, pool, own, player.position, player.laps_completed, root, actions
+
+
+def test_split_root_matches_whole_root(rng):
+    # Tables hold deeper values than a depth-limited search asks for, so
+    # only searches to the end of the turn agree however they are split
+    engine, bot = position(rng, max_unseen=4, **SMALL)
+    known, pool, own, square, laps, root, actions = root_of(engine, bot)
+    subtrees = root.subtrees(own, actions)
+    whole, depth, _ = iterative_deepening(bot.rules, known, pool, own, square, laps, subtrees, budget=60)
+    # Each subtree searched on its own, as a worker with its own table would
+    split = {}
+    for subtree in subtrees:
+        values, _, _ = iterative_deepening(bot.rules, known, pool, own, square, laps, [subtree], budget=60)
+        split.update(values)
+    assert split == pytest.approx(whole)
+    # Combined, the draws are the value of flipping an unseen card
+    combined = root.action_values(own, square, laps, actions, split)
+    direct = Search(bot.rules, known, pool, float('inf'))
+    expected = {action: direct.action_value(action, own, square, laps, 64) for action in actions}
+    assert combined == pytest.approx(expected)
+    assert set(combined) == set(actions) and UNKNOWN in {kind for kind, _ in combined}
+
+
+def test_one_worker_or_two_choose_alike(rng):
+    engine, bot = position(rng, max_unseen=4, **SMALL)
+    one = make_search_bot(engine, seed=2)
+    two = make_search_bot(engine, seed=2)
+    one.budget = two.budget = 60
+    two.workers = 2
+    for watcher in (one, two):
+        watcher.memory = bot.memory
+    try:
+        known, pool, own, square, laps, root, actions = root_of(engine, bot)
+        subtrees = root.subtrees(own, actions)
+        assert one.search(known, pool, own, square, laps, subtrees, 60)[0] == \
+            pytest.approx(two.search(known, pool, own, square, laps, subtrees, 60)[0])
+        assert one.choose(engine) == two.choose(engine)
+    finally:
+        two.close()
+
+
+class NoTable(dict):
+    def get(self, key, default=None):
+        return default
+
+
+def test_transposition_table_saves_nodes(rng, monkeypatch):
+    engine, bot = position(rng, card_numbers=(1, 2, 3, 4), num_cards_per_character=6)
+    known, pool, own, square, laps, root, actions = root_of(engine, bot)
+    subtrees = root.subtrees(own, actions)
+    values, depth, nodes = iterative_deepening(bot.rules, known, pool, own, square, laps, subtrees, budget=60,
+                                               max_depth=6)
+
+    class Untabled(Search):
+        def __init__(self, *args):
+            super().__init__(*args)
+            self.table = NoTable()
+    monkeypatch.setattr(search, 'Search', Untabled)
+    untabled_values, untabled_depth, untabled_nodes = iterative_deepening(
+        bot.rules, known, pool, own, square, laps, subtrees, budget=60, max_depth=6)
+    assert (untabled_values, untabled_depth) == (pytest.approx(values), depth)
+    assert nodes < untabled_nodes
+
+
+def test_table_answers_a_repeated_search(rng):
+    engine, bot = position(rng)
+    known, pool, own, square, laps, root, actions = root_of(engine, bot)
+    subtrees = root.subtrees(own, actions)
+    tree = Search(bot.rules, known, pool, float('inf'))
+    first = tree.search_root(own, square, laps, subtrees, 4)
+    nodes = tree.nodes
+    assert tree.search_root(own, square, laps, subtrees, 4) == first
+    # Only the root moves are expanded again; everything below comes from the table
+    assert tree.nodes - nodes <= len(subtrees)
+
+
+def test_spent_budget_stops_within_a_clock_interval(rng):
+    engine, bot = position(rng, num_sections=16, card_numbers=(1, 2, 3, 4, 5, 6), num_cards_per_character=8)
+    known, pool, own, square, laps, root, actions = root_of(engine, bot)
+    subtrees = root.subtrees(own, actions)
+    assert iterative_deepening(bot.rules, known, pool, own, square, laps, subtrees, 60, max_depth=3)[2] > \
+        CLOCK_INTERVAL
+    assert iterative_deepening(bot.rules, known, pool, own, square, laps, subtrees, budget=0)[2] <= CLOCK_INTERVAL
+
+
+def test_moves_fit_the_budget(rng):
+    engine = new_game(num_sections=16, card_numbers=(1, 2, 3, 4, 5, 6), num_cards_per_character=8, seed=3)
+    bot = make_search_bot(engine, seed=1)
+    bot.budget = 0.005
+    engine.listeners.append(bot.observe)
+    times = []
+    while not engine.is_terminal() and len(times) < 40:
+        if engine.current_player_index == 0:
+            engine.apply(bot.choose(engine))
+            if bot.last_nodes:
+                times.append(bot.last_time)
+        else:
+            play(engine, 1, rng)
+    assert len(times) >= 10
+    assert statistics.median(times) <= bot.budget
@@ -0,0 +1,151 @@
+# test_server.py
+
+# Malformed requests get an error reply and leave the connection usable.
+
+import asyncio
+import json
+
+import pytest
+
+from settings import SERVER_MAX_CARD_NUMBER, SERVER_MAX_LINE
+from server import GameServer
+
+
+def exchange(requests, server=None, connections=1):
+    """
+    Send each request and return the reply to each.
+    :param requests: requests, or (connection number, request) pairs to
+        send them on another connection than the first
+    """
+    server = server or GameServer()
+
+    async def run():
+        listener = await asyncio.start_server(server.handle_client, '127.0.0.1', 0, limit=SERVER_MAX_LINE)
+        port = listener.sockets[0].getsockname()[1]
+        streams = [await asyncio.open_connection('127.0.0.1', port) for _ in range(connections)]
+        replies = []
+        for request in requests:
+            number, request = request if isinstance(request, tuple) else (0, request)
+            reader, writer = streams[number]
+            writer.write(request if isinstance(request, bytes) else (json.dumps(request) + '\n').encode())
+            await writer.drain()
+            replies.append(json.loads(await asyncio.wait_for(reader.readline(), 5)))
+        for _, writer in streams:
+            writer.close()
+        listener.close()
+        await listener.wait_closed()
+        return replies
+
+    return asyncio.run(run())
+
+
+def error_of(message):
+    # Each bad request is followed by a good one on the same connection
+    reply, state = exchange([message, {'op': 'create', 'id': 'ok'}])
+    assert state['type'] == 'created' and state['id'] == 'ok'
+    assert reply['type'] == 'error'
+    return reply['error']
+
+
+@pytest.mark.parametrize('request_line', [b'not json\n', b'[1, 2]\n', b'"create"\n', b'null\n'])
+def test_not_a_request(request_line):
+    error_of(request_line)
+
+
+@pytest.mark.parametrize('message', [
+    {'op': 'nope'},
+    {'op': ['create']},
+    {'op': 'join', 'session': [1]},
+    {'op': 'join', 'session': {'a': 1}},
+    {'op': 'join', 'session': True},
+    {'op': 'join', 'session': 1.0},
+    {'op': 'join', 'session': 99},
+    {'op': 'create', 'numbers': [2 ** 70]},
+    {'op': 'create', 'numbers': [SERVER_MAX_CARD_NUMBER + 1]},
+    {'op': 'create', 'numbers': [True]},
+    {'op': 'create', 'numbers': [1.5]},
+    {'op': 'create', 'numbers': []},
+    {'op': 'create', 'numbers': '1,2,3'},
+    {'op': 'create', 'sections': True},
+    {'op': 'create', 'sections': 10 ** 30},
+    {'op': 'create', 'cards': False},
+    {'op': 'create', 'cards': 0},
+    {'op': 'create', 'cards': 10 ** 9},
+    {'op': 'create', 'seed': 'x'},
+    {'op': 'create', 'seats': 0},
+    {'op': 'create', 'seats': 5},
+    {'op': 'create', 'seats': True},
+    {'op': 'flip', 'card': 0},
+    {'op': 'state'},
+    {'op': 'rematch'},
+])
+def test_malformed_requests_are_rejected(message):
+    error_of(message)
+
+
+@pytest.mark.parametrize('card', [True, -1, 52, 2 ** 70, '3', None, [0]])
+def test_bad_flips_are_rejected(card):
+    created, reply, state = exchange([{'op': 'create', 'seats': 4, 'seed': 1}, {'op': 'flip', 'card': card},
+                                      {'op': 'state'}])
+    assert created['type'] == 'created'
+    assert reply['type'] == 'error'
+    assert state['type'] == 'state' and state['turn'] == 0
+
+
+def test_flip_out_of_turn_is_rejected():
+    # The first table a server opens is number 1
+    created, joined, reply = exchange([(0, {'op': 'create', 'seats': 1, 'seed': 1}),
+                                       (1, {'op': 'join', 'session': 1}),
+                                       (1, {'op': 'flip', 'card': 0})], connections=2)
+    assert created['session'] == 1 and created['seats'] == [0]
+    assert joined['type'] == 'joined' and joined['seats'] == [1]
+    assert reply == {'type': 'error', 'id': None, 'error': "It is not your turn."}
+
+
+def test_valid_flip():
+    created, flip = exchange([{'op': 'create', 'seats': 4, 'seed': 1}, {'op': 'flip', 'card': 0, 'id': 7}])
+    assert flip['type'] == 'flip' and flip['id'] == 7 and flip['card'] == 0
+
+
+def test_unexpected_errors_get_a_reply():
+    server = GameServer()
+
+    def broken(client, request):
+        raise RuntimeError("bug")
+    server.dispatch = broken
+    reply, again = exchange([{'op': 'state', 'id': 3}, {'op': 'state', 'id': 4}], server)
+    assert reply == {'type': 'error', 'id': 3, 'error': "Internal server error."}
+    assert again['id'] == 4
+
+
+def test_boards_are_dropped_with_their_last_table():
+    server = GameServer()
+    requests = []
+    for sections in range(1, 41):
+        # Two tables on each board, one of them opened twice over
+        requests += [(0, {'op': 'create', 'sections': sections, 'seed': 1}),
+                     (1, {'op': 'create', 'sections': sections, 'seed': 1}),
+                     (0, {'op': 'leave'}),
+                     (0, {'op': 'create', 'sections': sections, 'seats': 5}),
+                     (0, {'op': 'state'}),
+                     (1, {'op': 'state'})]
+        requests += [(1, {'op': 'leave'})]
+    replies = exchange(requests, server, connections=2)
+    assert [reply['type'] for reply in replies[:7]] == ['created', 'created', 'left', 'error', 'error', 'state', 'left']
+    assert server.sessions == {} and server.boards == {}
+
+
+def test_boards_are_shared_while_tables_are_open():
+    server = GameServer()
+    board = server.board(5, [1, 2])
+    assert server.board(5, [1, 2]) is board
+    server.release_board(5, [1, 2])
+    assert server.boards == {(5, (1, 2)): board}
+    server.release_board(5, [1, 2])
+    assert server.boards == {}
+
+
+def test_disconnecting_closes_tables_and_their_boards():
+    server = GameServer()
+    exchange([(0, {'op': 'create', 'sections': 5}), (1, {'op': 'create', 'sections': 6})], server, connections=2)
+    assert server.sessions == {} and server.boards == {}
@@ -0,0 +1,83 @@
+# test_simulator.py
+
+# The vectorized simulator plays the same games as GameEngine: one game is
+# simulated with a generator that records its shuffle and card picks, and the
+# picks are replayed through the engine.
+
+import numpy as np
+import pytest
+
+from models import Deck
+from simulator import _simulate_batch, deck_composition, simulate
+from conftest import new_game
+
+
+class RecordingGenerator:
+    """
+    A NumPy generator that remembers the deck order and every card drawn.
+    """
+    def __init__(self, seed):
+        self.rng = np.random.default_rng(seed)
+        self.order = None
+        self.draws = []
+
+    def permuted(self, x, axis):
+        result = self.rng.permuted(x, axis=axis)
+        self.order = result[0]
+        return result
+
+    def integers(self, low, high, size):
+        result = self.rng.integers(low, high, size)
+        self.draws.extend(int(value) for value in result)
+        return result
+
+
+def simulate_one(seed, num_sections, card_numbers, num_cards_per_character, max_turns):
+    rng = RecordingGenerator(seed)
+    winners, lengths = np.empty(1, dtype=np.int64), np.empty(1, dtype=np.int64)
+    flips = _simulate_batch(rng, num_sections, card_numbers, num_cards_per_character, 1, 4, max_turns,
+                            winners, lengths)
+    return rng, int(winners[0]), int(lengths[0]), flips
+
+
+@pytest.mark.parametrize('seed', range(25))
+@pytest.mark.parametrize('config', [(8, [1, 2, 3], 4), (2, [1, 2], 2), (20, [1, 2, 3, 4], 6)])
+def test_simulator_matches_engine(seed, config):
+    num_sections, card_numbers, num_cards_per_character = config
+    max_turns = 500
+    rng, winner, length, flips = simulate_one(seed, num_sections, card_numbers, num_cards_per_character, max_turns)
+
+    engine = new_game(num_sections, card_numbers, num_cards_per_character)
+    characters, numbers = deck_composition(card_numbers, num_cards_per_character)
+    engine.deck = Deck(characters[rng.order], numbers[rng.order])
+    draws = iter(rng.draws)
+    applied = 0
+    while not engine.is_terminal() and engine.turn < max_turns:
+        # Draws that land on a face-up card are the simulator's rejections
+        card_index = next(draws)
+        while engine.deck.is_flipped(card_index):
+            card_index = next(draws)
+        engine.apply(card_index)
+        applied += 1
+    assert next(draws, None) is None
+    assert applied == flips
+    if engine.winner is None:
+        assert (winner, length) == (-1, max_turns)
+    else:
+        assert winner == engine.players.index(engine.winner)
+        # The simulator counts the winning turn too
+        assert length == engine.turn + 1
+
+
+def test_deck_composition_matches_create_deck():
+    engine = new_game(card_numbers=(1, 2, 3, 4), num_cards_per_character=6)
+    characters, numbers = deck_composition([1, 2, 3, 4], 6)
+    assert sorted(zip(characters.tolist(), numbers.tolist())) == \
+        sorted(zip(engine.deck.characters, engine.deck.numbers))
+
+
+def test_simulate_is_reproducible():
+    first = simulate(8, [1, 2, 3], 4, 200, seed=9)
+    second = simulate(8, [1, 2, 3], 4, 200, seed=9)
+    assert np.array_equal(first.winners, second.winners)
+    assert np.array_equal(first.lengths, second.lengths)
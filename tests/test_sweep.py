@@ -0,0 +1,61 @@
+# test_sweep.py
+
+# Sweep results are keyed by config and chunk, so they must not depend on
+# how many workers played them or on how many runs it took to finish.
+
+import numpy as np
+import pytest
+
+from sweep import Config, run_sweep, load_checkpoint
+
+CONFIGS = [Config(3, (1, 2), 2), Config(4, (1, 2, 3), 2)]
+
+
+def summary(stats):
+    return {key: (stat.wins.tolist(), stat.unfinished, stat.length_counts.tolist())
+            for key, stat in stats.items()}
+
+
+@pytest.fixture(scope='module')
+def reference():
+    return summary(run_sweep(CONFIGS, 120, 40, seed=7, workers=1))
+
+
+def test_results_do_not_depend_on_worker_count(reference):
+    assert summary(run_sweep(CONFIGS, 120, 40, seed=7, workers=2)) == reference
+    assert summary(run_sweep(CONFIGS, 120, 40, seed=8, workers=1)) != reference
+
+
+def test_resume_plays_only_missing_chunks(tmp_path, reference):
+    checkpoint = str(tmp_path / 'sweep.jsonl')
+    run_sweep(CONFIGS, 40, 40, seed=7, workers=1, checkpoint=checkpoint)
+    # A run killed halfway through writing a chunk
+    with open(checkpoint, 'a') as f:
+        f.write('{"config": "3|1,2|2", "chu')
+
+    played = []
+    stats = run_sweep(CONFIGS, 120, 40, seed=7, workers=1, checkpoint=checkpoint, on_chunk=played.append)
+    assert sorted((chunk['config'], chunk['chunk']) for chunk in played) == \
+        sorted((config.key, i) for config in CONFIGS for i in (1, 2))
+    assert summary(stats) == reference
+    assert len(load_checkpoint(checkpoint)) == 6
+
+    played.clear()
+    run_sweep(CONFIGS, 120, 40, seed=7, workers=1, checkpoint=checkpoint, on_chunk=played.append)
+    assert not played
+
+
+def test_checkpoint_from_other_settings_is_ignored(tmp_path, reference):
+    checkpoint = str(tmp_path / 'sweep.jsonl')
+    run_sweep(CONFIGS, 120, 40, seed=3, workers=1, checkpoint=checkpoint)
+    stats = run_sweep(CONFIGS, 120, 40, seed=7, workers=1, checkpoint=checkpoint)
+    assert summary(stats) == reference
+
+
+def test_chunk_counts_add_up():
+    stats = run_sweep(CONFIGS[:1], 80, 40, num_players=3, seed=1, workers=1)
+    stat = stats[CONFIGS[0].key]
+    assert stat.games == 80 and len(stat.wins) == 3
+    assert stat.length_counts.sum() == stat.finished
+    assert np.isclose(stat.win_rates.sum(), 1.0)
+    assert sorted(stat.chunks) == [0, 1]
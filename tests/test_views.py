@@ -0,0 +1,93 @@
+# test_views.py
+
+# CardLayout picking against the rects the cards are drawn at, in ring and
+# grid mode: a click must hit the card drawn on top at that point, as a
+# brute-force test over the blit sequence finds it.
+
+import random
+
+import pygame
+import pytest
+
+from settings import *
+from models import Board, Deck, CARD_CHARACTERS
+from views import CardLayout, draw_cards
+from conftest import CENTER
+
+
+def deck_of(size):
+    return Deck([i % len(CARD_CHARACTERS) for i in range(size)], [1 + i % 3 for i in range(size)])
+
+
+def drawn_card_at(drawn, pos):
+    """
+    The index of the topmost card drawn at pos, by testing every drawn rect.
+    :param drawn: (index, (surface, rect)) in drawing order
+    """
+    x, y = pos
+    hit = None
+    for index, (_, rect) in drawn:
+        radius = rect.width / 2
+        if (x - rect.centerx) ** 2 + (y - rect.centery) ** 2 <= radius * radius:
+            hit = index
+    return hit
+
+
+def check_picks(layout, deck, back, rng):
+    drawn = list(zip(layout.visible_indices(), layout.blit_sequence(deck, back)))
+    assert drawn, "no cards were drawn"
+    points = [rect.center for _, (_, rect) in drawn]
+    points += [(rng.randrange(SCREEN_WIDTH), rng.randrange(SCREEN_HEIGHT)) for _ in range(2000)]
+    for _, (_, rect) in rng.sample(drawn, min(50, len(drawn))):
+        points += [(rng.randrange(rect.left, rect.right), rng.randrange(rect.top, rect.bottom)) for _ in range(10)]
+    for pos in points:
+        expected = drawn_card_at(drawn, pos)
+        if expected is not None and deck.is_flipped(expected):
+            expected = None
+        assert layout.pick(pos, deck) == expected, pos
+
+
+@pytest.fixture
+def back():
+    return pygame.Surface((CARD_WIDTH, CARD_WIDTH), pygame.SRCALPHA)
+
+
+@pytest.mark.parametrize('num_sections, num_cards', [(8, 10), (8, 52), (64, 100)])
+def test_ring_picking(screen, back, num_sections, num_cards):
+    board = Board(CENTER, BOARD_RADIUS, num_sections, {})
+    deck = deck_of(num_cards)
+    rng = random.Random(num_cards)
+    for index in rng.sample(range(num_cards), num_cards // 5):
+        deck.flip(index)
+    layout = draw_cards(screen, deck, back, board, CardLayout())
+    assert layout.mode == layout.RINGS
+    assert list(layout.visible_indices()) == list(range(num_cards))
+    check_picks(layout, deck, back, rng)
+
+
+def test_grid_picking_while_scrolling(screen, back):
+    board = Board(CENTER, BOARD_RADIUS, 512, {})
+    deck = deck_of(20000)
+    rng = random.Random(5)
+    for index in rng.sample(range(len(deck)), 3000):
+        deck.flip(index)
+    layout = draw_cards(screen, deck, back, board, CardLayout())
+    assert layout.mode == layout.GRID
+    check_picks(layout, deck, back, rng)
+    assert layout.scroll_by(layout.rows)
+    draw_cards(screen, deck, back, board, layout)
+    assert layout.visible_indices()[0] == layout.rows * layout.columns
+    check_picks(layout, deck, back, rng)
+    # Nothing is picked on the scrollbar or outside the grid
+    assert layout.pick(layout.scrollbar_rect().center, deck) is None
+
+
+def test_grid_scroll_to(screen, back):
+    board = Board(CENTER, BOARD_RADIUS, 512, {})
+    deck = deck_of(20000)
+    layout = draw_cards(screen, deck, back, board, CardLayout())
+    for index in (12345, 0, len(deck) - 1, 777):
+        layout.scroll_to(index)
+        rect = layout.rect(index)
+        assert rect is not None and layout.panel.contains(rect)
+        assert layout.pick(rect.center, deck) == index
@@ -2,47 +2,23 @@
 
 import pygame
 import os
-import pickle
 from settings import *
-from models import Card
-import random
-import sys
+from views import render_text
+from scenes import Scene
+from assets import load_atlas, resolve_images
+from catalog import SORT_ORDERS
+import time
 
 def load_card_images(card_numbers):
-    card_images = {}
-    board_char_images = {}
-    characters = ['dragon', 'salamander', 'bat', 'spider', 'pirate']
-    for character in characters:
-        for number in card_numbers:
-            if character == 'pirate' and number > 2:
-                continue
-            filename = f"{character.replace(' ', '_')}_{number}.png"
-            image_path = os.path.join('images', filename)
-            try:
-                image = pygame.image.load(image_path).convert_alpha()
-                image = pygame.transform.scale(image, (CARD_WIDTH, CARD_HEIGHT))
-                card_images[f"{character}_{number}"] = image
-            except pygame.error as e:
-                print(f"Unable to load image {image_path}: {e}")
-        # Load board character image
-        board_char_filename = f"{character.replace(' ', '_')}.png"
-        image_path = os.path.join('images', board_char_filename)
-        try:
-            image = pygame.image.load(image_path).convert_alpha()
-            image = pygame.transform.scale(image, (40, 40))
-            board_char_images[character] = image
-        except pygame.error as e:
-            print(f"Unable to load board character image {image_path}: {e}")
-
-    # Load card back image
-    try:
-        card_back_image = pygame.image.load('images/card_cover.png').convert_alpha()
-        min_dimension = min(CARD_WIDTH, CARD_HEIGHT)
-        card_back_image = pygame.transform.scale(card_back_image, (min_dimension, min_dimension))
-    except pygame.error as e:
-        print(f"Unable to load card back image: {e}")
+    """
+    Return the card faces, card back and board icons for the given numbers,
+    cut from the cached texture atlas. This blocks until the images are
+    decoded; the game itself uses AssetManager to load them in the background.
+    """
+    atlas = load_atlas()
+    card_images, card_back_image, board_char_images = resolve_images(atlas.get, card_numbers, atlas.entries)
+    if card_back_image is None:
         card_back_image = create_circular_card_back()
-
     return card_images, card_back_image, board_char_images
 
 def create_circular_card_back():
@@ -51,115 +27,176 @@ def create_circular_card_back():
     pygame.draw.circle(card_back_image, DARK_GRAY, (min_dimension // 2, min_dimension // 2), min_dimension // 2)
     return card_back_image
 
-def save_game(game_state, filename):
-    with open(filename, 'wb') as f:
-        pickle.dump(game_state, f)
-    print(f"Game saved successfully to {filename}.")
-
-def save_game_menu(screen, sounds):
-    menu_running = True
-    font = pygame.font.Font(None, 36)
-    save_slots = ['Save Slot 1', 'Save Slot 2', 'Save Slot 3']
-    save_buttons = []
-    for i, slot in enumerate(save_slots):
-        rect = pygame.Rect(SCREEN_WIDTH / 2 - 100, 200 + i * 60, 200, 50)
-        save_buttons.append((rect, slot))
-    while menu_running:
-        screen.fill(BLACK)
-        title_text = font.render('Select Save Slot', True, WHITE)
-        screen.blit(title_text, (SCREEN_WIDTH / 2 - title_text.get_width() / 2, 100))
-        for rect, slot in save_buttons:
-            pygame.draw.rect(screen, GRAY, rect)
-            slot_text = font.render(slot, True, WHITE)
-            screen.blit(slot_text, (rect.x + 20, rect.y + 10))
-        pygame.display.flip()
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                pygame.quit()
-                exit()
-            elif event.type == pygame.MOUSEBUTTONDOWN:
-                for rect, slot in save_buttons:
-                    if rect.collidepoint(event.pos):
-                        sounds['button_click'].play()
-                        return slot.replace(' ', '_') + '.pkl'
-        pygame.time.wait(100)
-
-def load_game(filename):
-    try:
-        with open(filename, 'rb') as f:
-            game_state = pickle.load(f)
-        print(f"Game loaded successfully from {filename}.")
-        return game_state
-    except FileNotFoundError:
-        print(f"No saved game found in {filename}.")
-        return None
-    
-def load_game_menu(screen, sounds):
-    menu_running = True
-    font = pygame.font.Font(None, 36)
-    save_slots = ['Save Slot 1', 'Save Slot 2', 'Save Slot 3']
-    load_buttons = []
-    for i, slot in enumerate(save_slots):
-        rect = pygame.Rect(SCREEN_WIDTH / 2 - 100, 200 + i * 60, 200, 50)
-        load_buttons.append((rect, slot))
-    while menu_running:
+class SaveBrowserScene(Scene):
+    """
+    A paged list of the saved games from the save catalog, with a preview of
+    the one under the mouse. Clicking a save calls on_select with its path.
+    """
+    title = 'Saved Games'
+    PAGE_SIZE = 10
+
+    def __init__(self, app, catalog, on_select, on_cancel=None):
+        """
+        :param catalog: SaveCatalog object
+        :param on_select: called with the path of the chosen save
+        :param on_cancel: called by the Back button; closes the menu if None
+        """
+        super().__init__(app)
+        self.catalog = catalog
+        self.on_select = on_select
+        self.on_cancel = on_cancel
+        self.order = next(iter(SORT_ORDERS))
+        self.page = 0
+        self.hover = None
+        self._thumbnails = {}
+        self.rows = [pygame.Rect(60, 170 + i * 56, 600, 48) for i in range(self.PAGE_SIZE)]
+        self.sort_button = pygame.Rect(60, 110, 220, 44)
+        self.prev_button = pygame.Rect(300, 110, 100, 44)
+        self.next_button = pygame.Rect(420, 110, 100, 44)
+        self.back_button = pygame.Rect(SCREEN_WIDTH - 180, 20, 160, 44)
+        self.new_button = None
+        self.refresh()
+
+    def refresh(self):
+        self.entries = self.catalog.entries(self.order)
+        self.page = min(self.page, self.page_count() - 1)
+        self.needs_redraw = True
+
+    def page_count(self):
+        return max(1, -(-len(self.entries) // self.PAGE_SIZE))
+
+    def page_entries(self):
+        start = self.page * self.PAGE_SIZE
+        return self.entries[start:start + self.PAGE_SIZE]
+
+    def thumbnail(self, path, entry):
+        if path not in self._thumbnails:
+            self._thumbnails[path] = self.catalog.load_thumbnail(entry)
+        return self._thumbnails[path]
+
+    def draw_button(self, screen, rect, label):
+        pygame.draw.rect(screen, GRAY, rect)
+        text = render_text(label, 32)
+        screen.blit(text, text.get_rect(center=rect.center))
+
+    def draw_full(self, screen):
         screen.fill(BLACK)
-        title_text = font.render('Select Save Slot to Load', True, WHITE)
-        screen.blit(title_text, (SCREEN_WIDTH / 2 - title_text.get_width() / 2, 100))
-        for rect, slot in load_buttons:
-            pygame.draw.rect(screen, GRAY, rect)
-            slot_text = font.render(slot, True, WHITE)
-            screen.blit(slot_text, (rect.x + 20, rect.y + 10))
-        pygame.display.flip()
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                pygame.quit()
-                sys.exit()
-            elif event.type == pygame.MOUSEBUTTONDOWN:
-                for rect, slot in load_buttons:
-                    if rect.collidepoint(event.pos):
-                        sounds['button_click'].play()
-                        return slot.replace(' ', '_') + '.pkl'
-        pygame.time.wait(100)
-
-
-def create_deck(card_images, card_numbers, num_cards_per_character):
-    deck = []
-    for char in ['dragon', 'salamander', 'bat', 'spider']:
-        for num in card_numbers:
-            image_key = f"{char}_{num}"
-            image = card_images.get(image_key)
-            for _ in range(num_cards_per_character):
-                card = Card(char, num, image=image)
-                deck.append(card)
-    # Add Pirate cards
-    for num in card_numbers:
-        if num <= 2:
-            image_key = f"pirate_{num}"
-            image = card_images.get(image_key)
-            for _ in range(num_cards_per_character // 2):  # Fewer pirate cards
-                card = Card('pirate', num, 'move_backward', image=image)
-                deck.append(card)
-    random.shuffle(deck)
-    return deck
+        title_text = render_text(self.title, 48)
+        screen.blit(title_text, (SCREEN_WIDTH / 2 - title_text.get_width() / 2, 30))
+        self.draw_button(screen, self.sort_button, f"Sort: {self.order}")
+        self.draw_button(screen, self.prev_button, 'Prev')
+        self.draw_button(screen, self.next_button, 'Next')
+        self.draw_button(screen, self.back_button, 'Back')
+        if self.new_button is not None:
+            self.draw_button(screen, self.new_button, 'New Save')
+        page_text = render_text(f"Page {self.page + 1}/{self.page_count()}", 32)
+        screen.blit(page_text, (540, 120))
 
+        entries = self.page_entries()
+        if not entries:
+            screen.blit(render_text('No saved games', 36), (self.rows[0].x + 20, self.rows[0].y + 10))
+        for i, (path, entry) in enumerate(entries):
+            rect = self.rows[i]
+            pygame.draw.rect(screen, LIGHT_GRAY if i == self.hover else GRAY, rect)
+            label = f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(entry['time']))}  Turn {entry['turn']}"
+            if entry['kind'] == 'autosave':
+                label += '  (auto)'
+            screen.blit(render_text(label, 32), (rect.x + 15, rect.y + 12))
 
-def update_images(board, players, deck, card_images, board_char_images):
-    for card in deck:
-        image_key = f"{card.character}_{card.number}"
-        card.image = card_images.get(image_key)
-    board.board_char_images = board_char_images
+        # Preview of the save under the mouse, or the first on the page
+        if entries:
+            path, entry = entries[self.hover if self.hover is not None else 0]
+            x, y = 700, 170
+            thumbnail = self.thumbnail(path, entry)
+            if thumbnail is not None:
+                thumbnail = pygame.transform.scale(thumbnail, (THUMBNAIL_SIZE[0] * 2, THUMBNAIL_SIZE[1] * 2))
+                screen.blit(thumbnail, (x, y))
+                y += thumbnail.get_height() + 20
+            lines = [
+                os.path.basename(path),
+                f"Sections: {entry['num_sections']}  Cards: {entry['num_cards_per_character']}",
+                f"Numbers: {', '.join(map(str, entry['card_numbers']))}",
+                f"Winner: {entry['winner']}" if entry['winner'] else f"Next: {entry['current_player']}",
+            ]
+            lines += [f"{name}: square {position}, laps {laps}" for name, position, laps in entry['players']]
+            for line in lines:
+                screen.blit(render_text(line, 28), (x, y))
+                y += 28
+
+    def handle_event(self, event):
+        if event.type == pygame.MOUSEMOTION:
+            hover = None
+            for i in range(len(self.page_entries())):
+                if self.rows[i].collidepoint(event.pos):
+                    hover = i
+            if hover != self.hover:
+                self.hover = hover
+                self.needs_redraw = True
+        elif event.type == pygame.KEYDOWN:
+            if event.key in (pygame.K_RIGHT, pygame.K_PAGEDOWN):
+                self.turn_page(1)
+            elif event.key in (pygame.K_LEFT, pygame.K_PAGEUP):
+                self.turn_page(-1)
+        elif event.type == pygame.MOUSEBUTTONDOWN:
+            pos = event.pos
+            if self.sort_button.collidepoint(pos):
+                orders = list(SORT_ORDERS)
+                self.order = orders[(orders.index(self.order) + 1) % len(orders)]
+                self.page = 0
+                self.refresh()
+            elif self.prev_button.collidepoint(pos):
+                self.turn_page(-1)
+            elif self.next_button.collidepoint(pos):
+                self.turn_page(1)
+            elif self.back_button.collidepoint(pos):
+                self.app.sounds.play('button_click')
+                if self.on_cancel is not None:
+                    self.on_cancel()
+                else:
+                    self.app.pop()
+            elif self.new_button is not None and self.new_button.collidepoint(pos):
+                self.app.sounds.play('button_click')
+                self.select(self.catalog.new_save_path())
+            else:
+                for i, (path, entry) in enumerate(self.page_entries()):
+                    if self.rows[i].collidepoint(pos):
+                        self.app.sounds.play('button_click')
+                        self.select(path)
+                        return
+
+    def turn_page(self, step):
+        page = max(0, min(self.page_count() - 1, self.page + step))
+        if page != self.page:
+            self.page = page
+            self.hover = None
+            self.needs_redraw = True
+
+    def select(self, path):
+        self.on_select(path)
+
+class SaveMenuScene(SaveBrowserScene):
+    """
+    Dialog shown over the game: save to a new file or overwrite a listed
+    save. It closes before saving.
+    """
+    title = 'Save Game'
 
+    def __init__(self, app, catalog, on_select):
+        super().__init__(app, catalog, on_select)
+        self.new_button = pygame.Rect(SCREEN_WIDTH - 360, 20, 160, 44)
 
+    def select(self, path):
+        self.app.pop()
+        self.on_select(path)
 
-def load_sounds():
-    sounds = {}
-    try:
-        sounds['card_flip'] = pygame.mixer.Sound(os.path.join('sounds', 'flipcard.mp3'))
-        sounds['player_move'] = pygame.mixer.Sound(os.path.join('sounds', 'moving.mp3'))
-        sounds['game_start'] = pygame.mixer.Sound(os.path.join('sounds', 'start.mp3'))
-        sounds['game_end'] = pygame.mixer.Sound(os.path.join('sounds', 'end.mp3'))
-        sounds['button_click'] = pygame.mixer.Sound(os.path.join('sounds', 'click.mp3'))
-    except pygame.error as e:
-        print(f"Unable to load sound: {e}")
-    return sounds
+class LoadMenuScene(SaveBrowserScene):
+    title = 'Load Saved Game'
+
+
+
+def update_images(board, players, deck, card_images, board_char_images):
+    deck.set_images(card_images)
+    for player in players:
+        for card in player.flipped_cards:
+            card.image = card_images.get(f"{card.character}_{card.number}")
+    board.board_char_images = board_char_images
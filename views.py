@@ -4,70 +4,827 @@ import pygame
 # Import the settings module, * means import everything
 from settings import *
 import math
+import numpy as np
+from collections import OrderedDict
+from models import BOARD_CHARACTERS
+from profiler import profiler
 
-def draw_board(screen, board):
-    pygame.draw.circle(screen, LIGHT_GRAY, (int(board.center[0]), int(board.center[1])), board.radius + 30, 2)
-    for subsection in board.subsections:
-        x_sub, y_sub = subsection['position']
-        pygame.draw.circle(screen, GRAY, (int(x_sub), int(y_sub)), 20)
-        character = subsection['character']
-        image = board.board_char_images.get(character) 
-        if image:
-            rect = image.get_rect(center=(int(x_sub), int(y_sub)))
-            screen.blit(image, rect)
-        else:
-            font = pygame.font.Font(None, 24)
-            text = font.render(character[0].upper(), True, WHITE)
-            screen.blit(text, (x_sub - 10, y_sub - 10))
-
-def draw_players(screen, players, board):
-    for p in players:
-        subsection = board.subsections[p.position]
-        x_sub, y_sub = subsection['position']
-        player_index = players.index(p)
-        offset_angle = math.radians(player_index * 15)
-        x_offset = 5 * math.cos(offset_angle)
-        y_offset = 5 * math.sin(offset_angle)
-        x = x_sub + x_offset
-        y = y_sub + y_offset
-        pygame.draw.circle(screen, p.color, (int(x), int(y)), 10)
-
-def draw_cards(screen, deck, card_back_image, board):
-    center_x, center_y = screen.get_rect().center
-    radius = board.radius - 100
-    card_width = card_back_image.get_width()
-    card_height = card_back_image.get_height()
-    num_cards = len(deck)
-    angle_step = 360 / num_cards
-    for index, card in enumerate(deck):
-        angle = math.radians(index * angle_step)
-        x = center_x + radius * math.cos(angle)
-        y = center_y + radius * math.sin(angle)
-        card.rect = pygame.Rect(x - card_width / 2, y - card_height / 2, card_width, card_height)
-        if card.is_flipped and card.image:
-            screen.blit(card.image, card.rect)
-        else:
-            if card_back_image:
-                rect = card_back_image.get_rect(center=(int(x), int(y)))
-                screen.blit(card_back_image, rect)
+class TextCache:
+    """
+    Cache of rendered text surfaces keyed by (font size, text, colour,
+    antialias), with least-recently-used eviction once the cached surfaces
+    exceed max_bytes. Font objects are pooled by size and never evicted.
+    """
+    def __init__(self, max_bytes=8 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.size_bytes = 0
+        self._fonts = {}
+        self._surfaces = OrderedDict()
+
+    def font(self, size):
+        font = self._fonts.get(size)
+        if font is None:
+            font = self._fonts[size] = pygame.font.Font(None, size)
+        return font
+
+    def render(self, text, size, color, antialias=True):
+        key = (size, text, tuple(color), antialias)
+        surface = self._surfaces.get(key)
+        if surface is not None:
+            self._surfaces.move_to_end(key)
+            return surface
+        with profiler.section('text'):
+            surface = self.font(size).render(text, antialias, color)
+        cost = surface.get_width() * surface.get_height() * surface.get_bytesize()
+        self._surfaces[key] = surface
+        self.size_bytes += cost
+        while self.size_bytes > self.max_bytes and len(self._surfaces) > 1:
+            _, evicted = self._surfaces.popitem(last=False)
+            self.size_bytes -= evicted.get_width() * evicted.get_height() * evicted.get_bytesize()
+        return surface
+
+    def clear(self):
+        self._surfaces.clear()
+        self.size_bytes = 0
+
+text_cache = TextCache()
+
+def get_font(size):
+    """
+    Return the shared default font of the given size.
+    """
+    return text_cache.font(size)
+
+def render_text(text, size, color=WHITE, antialias=True):
+    """
+    Return a cached surface with text rendered in the default font. The
+    surface is shared, so callers must not draw on it.
+    """
+    return text_cache.render(text, size, color, antialias)
+
+# Fill colour of each character's squares when they are too small for icons
+SQUARE_COLORS = {
+    'dragon': (170, 60, 40),
+    'salamander': (60, 150, 60),
+    'bat': (90, 80, 170),
+    'spider': (160, 140, 50),
+}
+
+class BoardView:
+    """
+    The zoom and pan of the board on screen. At zoom 1 with no pan the board
+    is drawn where its own coordinates put it. Only the squares inside the
+    viewport are drawn, and how depends on how far apart they are on screen:
+    icons when there is room (DETAIL), coloured dots (DOTS), and below that
+    runs of sections merged into alternating bands labelled with their first
+    section number (BANDS), so the cost of drawing is bounded by the size of
+    the viewport, not the board.
+    """
+    DETAIL, DOTS, BANDS = 'detail', 'dots', 'bands'
+    DETAIL_SPACING = 24     # Screen pixels between squares needed for icons
+    DOT_SPACING = 4         # ... and for one dot per square
+    MIN_BAND_WIDTH = 16     # Narrowest band drawn, in pixels
+    MIN_LABEL_SPACING = 60  # Closest two band labels may be, in pixels
+    SQUARE_RADIUS = 20
+    RING_MARGIN = 30        # Gap between the squares and the outer ring line
+
+    def __init__(self, board, viewport=None):
+        """
+        :param board: Board object
+        :param viewport: Rect of the screen the board is drawn in
+        """
+        self.board = board
+        self.viewport = pygame.Rect(viewport or (0, 0, SCREEN_WIDTH, SCREEN_HEIGHT))
+        self.zoom = 1.0
+        self.pan = (0.0, 0.0)
+
+    @property
+    def max_zoom(self):
+        # Enough to show any board at full detail, and a little closer
+        return max(4.0, 2.5 * self.DETAIL_SPACING / self.square_spacing(1.0))
+
+    def square_spacing(self, zoom=None):
+        """
+        Return the distance in screen pixels between neighbouring squares.
+        """
+        zoom = self.zoom if zoom is None else zoom
+        return 2 * math.pi * self.board.radius * zoom / self.board.total_subsections
+
+    def level(self):
+        spacing = self.square_spacing()
+        if spacing >= self.DETAIL_SPACING:
+            return self.DETAIL
+        if spacing >= self.DOT_SPACING:
+            return self.DOTS
+        return self.BANDS
+
+    def is_home(self):
+        return self.zoom == 1.0 and self.pan == (0.0, 0.0)
+
+    def reset(self):
+        self.zoom = 1.0
+        self.pan = (0.0, 0.0)
+
+    def screen_center(self):
+        """
+        Return the screen position of the board's centre.
+        """
+        return self.board.center[0] + self.pan[0], self.board.center[1] + self.pan[1]
+
+    def to_screen(self, x, y):
+        cx, cy = self.board.center
+        return (x - cx) * self.zoom + cx + self.pan[0], (y - cy) * self.zoom + cy + self.pan[1]
+
+    def zoom_at(self, pos, factor):
+        """
+        Zoom by factor, keeping the board point under pos where it is.
+        """
+        zoom = min(self.max_zoom, max(1.0, self.zoom * factor))
+        cx, cy = self.board.center
+        # Board point under pos, then the pan that puts it back under pos
+        x = (pos[0] - cx - self.pan[0]) / self.zoom
+        y = (pos[1] - cy - self.pan[1]) / self.zoom
+        self.zoom = zoom
+        self.pan = (pos[0] - cx - x * zoom, pos[1] - cy - y * zoom)
+        if zoom == 1.0:
+            self.pan = (0.0, 0.0)
+
+    def pan_by(self, dx, dy):
+        if self.zoom > 1.0:
+            self.pan = (self.pan[0] + dx, self.pan[1] + dy)
+
+    def center_on(self, position):
+        """
+        Pan so that a square is in the middle of the viewport.
+        """
+        x, y = self.to_screen(*self.board.position_of(position))
+        target_x, target_y = self.viewport.center
+        self.pan = (self.pan[0] + target_x - x, self.pan[1] + target_y - y)
+
+    def visible_arcs(self, radius, margin):
+        """
+        Return the (start, end) angles of the parts of a circle round the
+        board centre, of the given screen radius, that lie within margin
+        pixels of the viewport. Angles are in radians from 0 to 2 pi and
+        increase with the square index.
+        """
+        cx, cy = self.screen_center()
+        rect = self.viewport.inflate(2 * margin, 2 * margin)
+        # Angles where the circle crosses the lines of the rect's edges
+        angles = [0.0, 2 * math.pi]
+        for x in (rect.left, rect.right):
+            d = (x - cx) / radius
+            if -1 < d < 1:
+                a = math.acos(d)
+                angles += [a, 2 * math.pi - a]
+        for y in (rect.top, rect.bottom):
+            d = (y - cy) / radius
+            if -1 < d < 1:
+                a = math.asin(d) % (2 * math.pi)
+                angles += [a, (math.pi - a) % (2 * math.pi)]
+        angles.sort()
+        arcs = []
+        for start, end in zip(angles, angles[1:]):
+            middle = (start + end) / 2
+            if end > start and rect.collidepoint(cx + radius * math.cos(middle), cy + radius * math.sin(middle)):
+                if arcs and arcs[-1][1] == start:
+                    arcs[-1] = (arcs[-1][0], end)
+                else:
+                    arcs.append((start, end))
+        return arcs
+
+    def visible_squares(self):
+        """
+        Return a numpy array of the indices of the squares in the viewport.
+        """
+        total = self.board.total_subsections
+        step = 2 * math.pi / total
+        ranges = []
+        for start, end in self.visible_arcs(self.board.radius * self.zoom, self.SQUARE_RADIUS + 1):
+            first, last = math.ceil(start / step), math.floor(end / step)
+            if first <= last:
+                ranges.append(np.arange(first, last + 1))
+        if not ranges:
+            return np.arange(0)
+        # Square 0 sits at angle 0, which may be the end of the last arc too
+        return np.unique(np.concatenate(ranges) % total)
+
+    def draw(self, screen):
+        cx, cy = self.screen_center()
+        radius = self.board.radius * self.zoom
+        self._draw_ring(screen, cx, cy, radius + self.RING_MARGIN)
+        level = self.level()
+        if level == self.BANDS:
+            self._draw_bands(screen, cx, cy, radius)
+            return
+        indices = self.visible_squares()
+        angles = indices * (2 * math.pi / self.board.total_subsections)
+        xs = (cx + radius * np.cos(angles)).astype(int).tolist()
+        ys = (cy + radius * np.sin(angles)).astype(int).tolist()
+        codes = self.board.char_codes[indices].tolist()
+        if level == self.DOTS:
+            dot_radius = max(1, min(self.SQUARE_RADIUS, int(self.square_spacing() * 0.4)))
+            for x, y, code in zip(xs, ys, codes):
+                pygame.draw.circle(screen, SQUARE_COLORS[BOARD_CHARACTERS[code]], (x, y), dot_radius)
+            return
+        for x, y, code in zip(xs, ys, codes):
+            pygame.draw.circle(screen, GRAY, (x, y), self.SQUARE_RADIUS)
+            character = BOARD_CHARACTERS[code]
+            image = self.board.board_char_images.get(character)
+            if image:
+                screen.blit(image, image.get_rect(center=(x, y)))
             else:
-                pygame.draw.circle(screen, DARK_GRAY, (int(x), int(y)), card_width // 2)
+                screen.blit(render_text(character[0].upper(), 24), (x - 10, y - 10))
+
+    def _draw_ring(self, screen, cx, cy, radius):
+        if self.is_home():
+            pygame.draw.circle(screen, LIGHT_GRAY, (int(cx), int(cy)), int(radius), 2)
+            return
+        # A zoomed-in circle can be far larger than the screen; draw only its visible arcs
+        for start, end in self.visible_arcs(radius, 2):
+            steps = max(2, min(512, int((end - start) * radius / 8)))
+            angles = np.linspace(start, end, steps)
+            points = np.column_stack((cx + radius * np.cos(angles), cy + radius * np.sin(angles)))
+            pygame.draw.lines(screen, LIGHT_GRAY, False, points.tolist(), 2)
+
+    def _draw_bands(self, screen, cx, cy, radius):
+        board = self.board
+        section_width = 3 * self.square_spacing()
+        sections_per_band = 1
+        while sections_per_band * section_width < self.MIN_BAND_WIDTH:
+            sections_per_band *= 2
+        band_squares = 3 * sections_per_band
+        step = 2 * math.pi / board.total_subsections
+        labels_every = 1
+        while labels_every * sections_per_band * section_width < self.MIN_LABEL_SPACING:
+            labels_every *= 2
+        inner, outer = radius - self.SQUARE_RADIUS, radius + self.SQUARE_RADIUS
+        num_bands = math.ceil(board.num_sections / sections_per_band)
+        for start, end in self.visible_arcs(radius, self.SQUARE_RADIUS + 1):
+            # Square i is centred on angle i * step, so its band starts half a step earlier
+            first = int((start / step + 0.5) // band_squares)
+            last = min(num_bands - 1, int((end / step + 0.5) // band_squares))
+            bands = np.arange(first, last + 1)
+            a0 = bands * band_squares * step - step / 2
+            a1 = np.minimum(a0 + band_squares * step, board.total_subsections * step - step / 2)
+            cos0, sin0, cos1, sin1 = np.cos(a0), np.sin(a0), np.cos(a1), np.sin(a1)
+            polygons = np.stack([
+                np.column_stack((cx + inner * cos0, cy + inner * sin0)),
+                np.column_stack((cx + outer * cos0, cy + outer * sin0)),
+                np.column_stack((cx + outer * cos1, cy + outer * sin1)),
+                np.column_stack((cx + inner * cos1, cy + inner * sin1)),
+            ], axis=1).tolist()
+            for band, polygon in zip(bands.tolist(), polygons):
+                pygame.draw.polygon(screen, GRAY if band % 2 else DARK_GRAY, polygon)
+                if band % labels_every == 0:
+                    angle = band * band_squares * step
+                    label = render_text(str(band * sections_per_band), 20, LIGHT_GRAY)
+                    label_radius = outer + self.RING_MARGIN
+                    screen.blit(label, label.get_rect(center=(cx + label_radius * math.cos(angle),
+                                                              cy + label_radius * math.sin(angle))))
+
+def draw_board(screen, board, view=None):
+    """
+    Draw the board squares.
+    :param view: BoardView to draw through, the whole board if None
+    """
+    (view or BoardView(board, screen.get_rect())).draw(screen)
+
+def thumbnail_tokens(players):
+    """
+    Return what render_board_thumbnail needs of the players, (colour, square)
+    each, so the thumbnail can be drawn later on another thread.
+    """
+    return [(p.color, p.position) for p in players]
+
+def render_board_thumbnail(board, tokens, size=THUMBNAIL_SIZE):
+    """
+    Draw a small picture of the board squares and player tokens, used to
+    preview saved games. Safe to call off the main thread.
+    :param tokens: (colour, square) per player, see thumbnail_tokens
+    :return: a new Surface of the given size
+    """
+    surface = pygame.Surface(size)
+    surface.fill(BLACK)
+    cx, cy = size[0] / 2, size[1] / 2
+    scale = min(size) / (2 * (board.radius + 30))
+    square_radius = max(1, int(20 * scale))
+    pygame.draw.circle(surface, LIGHT_GRAY, (int(cx), int(cy)), int((board.radius + 30) * scale), 1)
+    ring_radius = board.radius * scale
+    if 2 * math.pi * ring_radius / board.total_subsections < square_radius:
+        # The squares overlap at this size, so one band looks the same
+        pygame.draw.circle(surface, GRAY, (int(cx), int(cy)), int(ring_radius) + square_radius, 2 * square_radius + 1)
+    else:
+        xs = ((board.xs - board.center[0]) * scale + cx).astype(int).tolist()
+        ys = ((board.ys - board.center[1]) * scale + cy).astype(int).tolist()
+        for x, y in zip(xs, ys):
+            pygame.draw.circle(surface, GRAY, (x, y), square_radius)
+    for player_index, (color, position) in enumerate(tokens):
+        x, y = player_token_center(board, player_index, position)
+        center = (int((x - board.center[0]) * scale + cx), int((y - board.center[1]) * scale + cy))
+        pygame.draw.circle(surface, color, center, max(2, int(10 * scale)))
+    return surface
+
+def player_token_center(board, player_index, position, view=None):
+    """
+    Return the pixel centre of a player's token. Tokens on the same square
+    are offset by the player's index so they do not cover each other.
+    :param view: BoardView the board is drawn through, or None
+    """
+    x_sub, y_sub = board.position_of(position)
+    if view is not None:
+        x_sub, y_sub = view.to_screen(x_sub, y_sub)
+    offset_angle = math.radians(player_index * 15)
+    x_offset = 5 * math.cos(offset_angle)
+    y_offset = 5 * math.sin(offset_angle)
+    return int(x_sub + x_offset), int(y_sub + y_offset)
+
+def draw_players(screen, players, board, view=None):
+    for player_index, p in enumerate(players):
+        pygame.draw.circle(screen, p.color, player_token_center(board, player_index, p.position, view), 10)
+
+def card_area(screen, board):
+    """
+    Return the centre and radius of the disc inside the board that the cards
+    are laid out in.
+    """
+    return screen.get_rect().center, board.radius - 100 + max(CARD_WIDTH, CARD_HEIGHT) // 2
+
+def ring_slots(radius, size, gap):
+    """
+    Return [(ring radius, number of cards)] for concentric rings of round
+    cards of diameter size packed into a disc of the given radius, outermost
+    first.
+    """
+    rings = []
+    r = radius - size / 2
+    while r >= size / 2 + gap:
+        rings.append((r, int(2 * math.pi * r / (size + gap))))
+        r -= size + gap
+    if r >= 0:
+        rings.append((0.0, 1))
+    return rings
+
+def layout_rings(center, radius, num_cards, card_size, gap, min_size):
+    """
+    Pack num_cards round cards into concentric rings, as large as they fit
+    up to card_size.
+    :return: (card size, list of card rects in deck order), or None if they
+        do not fit at min_size
+    """
+    for size in range(card_size, min_size - 1, -1):
+        rings = ring_slots(radius, size, gap)
+        if sum(count for _, count in rings) < num_cards:
+            continue
+        rects = []
+        left = num_cards
+        for r, count in rings:
+            if not left:
+                break
+            # The innermost ring used spreads its cards out evenly
+            count = min(count, left)
+            angles = np.radians(np.arange(count) * (360 / count))
+            lefts = (center[0] + r * np.cos(angles) - size / 2).tolist()
+            tops = (center[1] + r * np.sin(angles) - size / 2).tolist()
+            rects += [pygame.Rect(x, y, size, size) for x, y in zip(lefts, tops)]
+            left -= count
+        return size, rects
+    return None
+
+def draw_cards(screen, deck, card_back_image, board, layout=None):
+    """
+    Draw the visible cards of the deck inside the board.
+    :param layout: CardLayout to draw with, the shared default if None
+    :return: the CardLayout drawn with
+    """
+    if layout is None:
+        layout = default_card_layout
+    layout.update(screen, board, len(deck), card_back_image.get_size())
+    screen.blits(layout.blit_sequence(deck, card_back_image), doreturn=False)
+    layout.draw_scrollbar(screen)
+    return layout
+
+class GridPicker:
+    """
+    Map a mouse position to the card under it without testing every card.
+    Each card is filed under the cells of a uniform grid that its rect
+    touches, so a click tests only the few cards filed under its cell. Cards
+    are round: a click hits a card only inside its circle, and where cards
+    overlap the one drawn last is on top.
+    """
+    def __init__(self, cards, cell_size):
+        """
+        :param cards: (index, rect) pairs in drawing order
+        """
+        self.cell_size = max(1, int(cell_size))
+        self.cells = {}
+        cell = self.cell_size
+        for index, rect in cards:
+            for cx in range(rect.left // cell, (rect.right - 1) // cell + 1):
+                for cy in range(rect.top // cell, (rect.bottom - 1) // cell + 1):
+                    self.cells.setdefault((cx, cy), []).append((index, rect))
+
+    def card_at(self, pos):
+        """
+        Return the index of the topmost card under pos, or None.
+        """
+        x, y = pos
+        for index, rect in reversed(self.cells.get((int(x) // self.cell_size, int(y) // self.cell_size), ())):
+            radius = rect.width / 2
+            if (x - rect.centerx) ** 2 + (y - rect.centery) ** 2 <= radius * radius:
+                return index
+        return None
+
+    def pick(self, pos, deck):
+        """
+        Return the index of the face-down card under pos, or None. A face-up
+        card on top hides anything under it.
+        """
+        index = self.card_at(pos)
+        return index if index is not None and not deck.is_flipped(index) else None
+
+class CardLayout:
+    """
+    Where the cards are drawn, computed once for a deck size, screen size
+    and board radius, and recomputed only when one of those changes.
+
+    Decks that fit are packed into concentric rings inside the board, the
+    cards shrunk as far as MIN_RING_CARD. Larger decks are laid out in a
+    grid in the square inside the card disc, which scrolls by rows. Only the
+    visible cards get rects, so laying out, drawing, redrawing and picking
+    cost the same whatever the size of the deck.
+    """
+    RINGS = 'rings'
+    GRID = 'grid'
+    GAP = 4
+    MIN_RING_CARD = 32
+    GRID_CARD = 32
+    SCROLLBAR_WIDTH = 8
+
+    def __init__(self):
+        self._key = None
+        self.mode = None
+        self.num_cards = 0
+        self.card_size = (CARD_WIDTH, CARD_HEIGHT)
+        # Grid mode: the scrolling area, its size in cards and the first row shown
+        self.panel = None
+        self.columns = 1
+        self.rows = 1
+        self.scroll = 0
+        # Rects of the visible cards, the first of them card self._first
+        self._rects = []
+        self._first = 0
+        self.picker = None
+        self._scaled = {}
+        self._back = None
+        self._back_blits = []
+
+    def update(self, screen, board, num_cards, card_size):
+        """
+        Recompute the layout if its inputs changed.
+        :return: True if the rects were recomputed
+        """
+        key = (screen.get_size(), board.radius, num_cards, tuple(card_size))
+        if key == self._key:
+            return False
+        self._key = key
+        self.num_cards = num_cards
+        self._scaled = {}
+        center, radius = card_area(screen, board)
+        rings = layout_rings(center, radius, num_cards, min(card_size), self.GAP, self.MIN_RING_CARD)
+        if rings is not None:
+            self.mode = self.RINGS
+            size, self._rects = rings
+            self.card_size = (size, size)
+            self.panel = None
+            self._first = 0
+            self._place_cards()
+        else:
+            self.mode = self.GRID
+            self.card_size = (self.GRID_CARD, self.GRID_CARD)
+            pitch = self.GRID_CARD + self.GAP
+            side = int(radius * math.sqrt(2))
+            self.columns = max(1, (side - self.SCROLLBAR_WIDTH - self.GAP) // pitch)
+            self.rows = max(1, (side - self.GAP) // pitch)
+            self.panel = pygame.Rect(0, 0, self.columns * pitch + self.GAP + self.SCROLLBAR_WIDTH,
+                                     self.rows * pitch + self.GAP)
+            self.panel.center = center
+            self.scroll = min(self.scroll, self.max_scroll())
+            self._place_grid()
+        return True
+
+    def max_scroll(self):
+        total_rows = -(-self.num_cards // self.columns)
+        return max(0, total_rows - self.rows)
+
+    def _place_grid(self):
+        pitch = self.GRID_CARD + self.GAP
+        self._first = self.scroll * self.columns
+        last = min(self.num_cards, self._first + self.rows * self.columns)
+        self._rects = []
+        for index in range(self._first, last):
+            row, column = divmod(index - self._first, self.columns)
+            self._rects.append(pygame.Rect(self.panel.left + self.GAP + column * pitch,
+                                           self.panel.top + self.GAP + row * pitch,
+                                           self.GRID_CARD, self.GRID_CARD))
+        self._place_cards()
+
+    def _place_cards(self):
+        self.picker = GridPicker(zip(self.visible_indices(), self._rects), self.card_size[0] + self.GAP)
+        self._back = None
+
+    def scroll_by(self, rows):
+        """
+        Scroll the grid by a number of rows.
+        :return: True if the visible cards changed
+        """
+        if self.mode != self.GRID:
+            return False
+        scroll = max(0, min(self.max_scroll(), self.scroll + rows))
+        if scroll == self.scroll:
+            return False
+        self.scroll = scroll
+        self._place_grid()
+        return True
+
+    def scroll_to(self, index):
+        """
+        Scroll the grid the least distance that shows card index.
+        :return: True if the visible cards changed
+        """
+        if self.mode != self.GRID or self.rect(index) is not None:
+            return False
+        row = index // self.columns
+        if row < self.scroll:
+            return self.scroll_by(row - self.scroll)
+        return self.scroll_by(row - self.scroll - self.rows + 1)
+
+    def visible_indices(self):
+        return range(self._first, self._first + len(self._rects))
+
+    def rect(self, index):
+        """
+        Return the rect of card index, or None if it is scrolled out of view.
+        """
+        position = index - self._first
+        return self._rects[position] if 0 <= position < len(self._rects) else None
+
+    def indices_in(self, rect):
+        """
+        Return the indices of the visible cards that overlap rect, in drawing order.
+        """
+        return [self._first + position for position in rect.collidelistall(self._rects)]
+
+    def scrollbar_rect(self):
+        """
+        Return the rect of the grid's scrollbar track, or None in ring mode.
+        """
+        if self.mode != self.GRID:
+            return None
+        return pygame.Rect(self.panel.right - self.SCROLLBAR_WIDTH, self.panel.top,
+                           self.SCROLLBAR_WIDTH, self.panel.height)
+
+    def draw_scrollbar(self, screen):
+        track = self.scrollbar_rect()
+        if track is None:
+            return
+        total_rows = self.max_scroll() + self.rows
+        height = max(8, track.height * self.rows // total_rows)
+        top = track.top + (track.height - height) * self.scroll // max(1, self.max_scroll())
+        screen.fill(DARK_GRAY, track)
+        screen.fill(LIGHT_GRAY, (track.left, top, track.width, height))
 
-def display_message(screen, message):
+    def scaled(self, image):
+        """
+        Return image at the layout's card size, scaling each image once.
+        """
+        if image.get_size() == self.card_size:
+            return image
+        scaled = self._scaled.get(image)
+        if scaled is None:
+            scaled = self._scaled[image] = pygame.transform.smoothscale(image, self.card_size)
+        return scaled
+
+    def blit_sequence(self, deck, card_back_image, indices=None):
+        """
+        Return (surface, rect) pairs for Surface.blits, in drawing order, for
+        the given visible cards or all of them. The all-face-down sequence is
+        kept and only the visible face-up cards are patched.
+        """
+        if indices is not None:
+            sequence = []
+            for index in indices:
+                image = deck[index].image if deck.is_flipped(index) else None
+                sequence.append((self.scaled(image or card_back_image), self.rect(index)))
+            return sequence
+        if card_back_image is not self._back:
+            self._back = card_back_image
+            back = self.scaled(card_back_image)
+            self._back_blits = [(back, rect) for rect in self._rects]
+        if not deck.flipped_count:
+            return self._back_blits
+        sequence = list(self._back_blits)
+        for index in deck.flipped_indices():
+            position = index - self._first
+            image = deck[index].image
+            if image and 0 <= position < len(self._rects):
+                sequence[position] = (self.scaled(image), self._rects[position])
+        return sequence
+
+    def pick(self, pos, deck):
+        return self.picker.pick(pos, deck) if self.picker else None
+
+default_card_layout = CardLayout()
+
+def message_rect(screen, message):
+    """
+    Return the rect a message covers when drawn with draw_message.
+    """
+    return render_text(message, 36).get_rect(center=(screen.get_width()/2, 50))
+
+def draw_message(screen, message):
     """
-    Display a message in the center of the screen for 2 seconds.
+    Draw a message centred near the top of the screen.
+    :return: the rect the message covers
     """
-    font = pygame.font.Font(None, 36)
-    text = font.render(message, True, WHITE)
+    text = render_text(message, 36)
     text_rect = text.get_rect(center=(screen.get_width()/2, 50))
     screen.blit(text, text_rect)
-    pygame.display.flip()
-    pygame.time.wait(2000)
+    return text_rect
+
+def player_info_text(player):
+    return f"Turn: {player.name} ({player.character})"
 
 def draw_player_info(screen, player):
     """
     Display the current player's name and character on the screen.
     """
-    font = pygame.font.Font(None, 36)
-    text = font.render(f"Turn: {player.name} ({player.character})", True, WHITE)
+    text = render_text(player_info_text(player), 36)
     screen.blit(text, (20, 20))
+
+def profiler_overlay_rect(screen):
+    return pygame.Rect(screen.get_width() - 250, screen.get_height() - 110, 240, 100)
+
+def draw_profiler_overlay(screen, profiler, frames=120):
+    """
+    Draw the FPS, the last frame time and a graph of recent frame times in
+    the bottom right corner.
+    :return: the rect drawn over
+    """
+    rect = profiler_overlay_rect(screen)
+    screen.fill(BLACK, rect)
+    pygame.draw.rect(screen, GRAY, rect, 1)
+    times = profiler.recent_frame_times(frames) * 1000
+    last = times[-1] if len(times) else 0.0
+    screen.blit(render_text(f"{profiler.fps():5.1f} FPS  {last:6.2f} ms", 24), (rect.x + 6, rect.y + 4))
+    graph = pygame.Rect(rect.x + 6, rect.y + 26, rect.width - 12, rect.height - 32)
+    # Scale to at least one 30 FPS frame; the guide line marks that budget
+    scale_ms = max(1000 / FPS, float(times.max()) if len(times) else 0.0)
+    budget_y = graph.bottom - int(graph.height * (1000 / FPS) / scale_ms)
+    pygame.draw.line(screen, DARK_GRAY, (graph.left, budget_y), (graph.right, budget_y))
+    if len(times) > 1:
+        step = graph.width / (frames - 1)
+        points = [(graph.left + i * step, graph.bottom - graph.height * t / scale_ms) for i, t in enumerate(times)]
+        pygame.draw.lines(screen, GREEN, False, points)
+    return rect
+
+class DirtyRenderer:
+    """
+    Draw the turn screen (board, players, cards and player info) and on later
+    frames repaint only the regions that changed.
+
+    The board and anything passed in static_drawers are drawn once onto an
+    off-screen layer. Each frame compares the face-up cards, token positions
+    and info text with the previous frame, restores the changed regions from
+    the static layer, redraws what overlaps them and pushes just those rects
+    with pygame.display.update.
+    """
+    # Past this many regions one bounding rect is cheaper to push
+    MAX_DIRTY_RECTS = 32
+
+    def __init__(self, screen, board, card_back_image, static_drawers=()):
+        """
+        :param static_drawers: callables taking a surface, drawn on the static
+            layer above the board (buttons and other fixed decorations)
+        """
+        self.screen = screen
+        self.board = board
+        self.card_back_image = card_back_image
+        self.static_drawers = static_drawers
+        self.static = None
+        self.view = BoardView(board, screen.get_rect())
+        self.layout = CardLayout()
+        self._flipped = None
+        self._tokens = []
+        self._info = None
+        self._info_surface = None
+        self._info_rect = None
+        self._pending = []
+
+    def invalidate(self):
+        """
+        Force a full redraw on the next frame, e.g. after something else drew
+        over the screen.
+        """
+        self.static = None
+
+    def mark_dirty(self, rect):
+        """
+        Repaint rect on the next frame, e.g. where an overlay was removed.
+        """
+        self._pending.append(pygame.Rect(rect))
+
+    def _build_static(self):
+        with profiler.section('draw_board'):
+            self.static = pygame.Surface(self.screen.get_size()).convert()
+            self.static.fill(BLACK)
+            draw_board(self.static, self.board, self.view)
+            for draw in self.static_drawers:
+                draw(self.static)
+
+    def _token_rects(self, players):
+        rects = []
+        for player_index, p in enumerate(players):
+            x, y = player_token_center(self.board, player_index, p.position, self.view)
+            rects.append(pygame.Rect(x - 10, y - 10, 21, 21))
+        return rects
+
+    def _update_info(self, player):
+        text = player_info_text(player)
+        if text == self._info:
+            return None
+        old_rect = self._info_rect
+        self._info = text
+        self._info_surface = render_text(text, 36)
+        self._info_rect = self._info_surface.get_rect(topleft=(20, 20))
+        return old_rect
+
+    def _draw_dynamic(self, deck, players, clip=None):
+        screen = self.screen
+        with profiler.section('draw_players'):
+            draw_players(screen, players, self.board, self.view)
+        with profiler.section('draw_cards'):
+            if clip is None:
+                draw_cards(screen, deck, self.card_back_image, self.board, self.layout)
+            else:
+                layout = self.layout
+                screen.blits(layout.blit_sequence(deck, self.card_back_image, layout.indices_in(clip)),
+                             doreturn=False)
+                if layout.mode == layout.GRID and clip.colliderect(layout.scrollbar_rect()):
+                    layout.draw_scrollbar(screen)
+        if clip is None or clip.colliderect(self._info_rect):
+            screen.blit(self._info_surface, self._info_rect)
+
+    def render(self, deck, players, player, present=True):
+        """
+        Bring the screen up to date.
+        :param present: push the changes to the display; pass False when the
+            caller draws overlays and updates the display itself
+        :return: the rects that changed, or None if the whole screen did
+        """
+        screen = self.screen
+        relayout = self.layout.update(screen, self.board, len(deck), self.card_back_image.get_size())
+        if self.static is None or relayout:
+            if self.static is None:
+                self._build_static()
+            self._info = None
+            self._update_info(player)
+            screen.blit(self.static, (0, 0))
+            self._draw_dynamic(deck, players)
+            self._flipped = deck.flipped_state()
+            self._tokens = self._token_rects(players)
+            self._pending = []
+            if present:
+                pygame.display.flip()
+            return None
+
+        dirty = self._pending
+        self._pending = []
+        flipped = deck.flipped_state()
+        if flipped != self._flipped:
+            # Cards scrolled out of view have nothing to repaint
+            visible = self.layout.visible_indices()
+            dirty += [self.layout.rect(i) for i in deck.changed_since(self._flipped, visible.start, visible.stop)]
+            self._flipped = flipped
+        tokens = self._token_rects(players)
+        if tokens != self._tokens:
+            for old, new in zip(self._tokens, tokens):
+                if old != new:
+                    dirty += [old, new]
+            self._tokens = tokens
+        old_info_rect = self._update_info(player)
+        if old_info_rect is not None:
+            dirty += [old_info_rect, self._info_rect]
+        if not dirty:
+            return []
+
+        if len(dirty) > self.MAX_DIRTY_RECTS:
+            dirty = [dirty[0].unionall(dirty[1:])]
+        for rect in dirty:
+            screen.set_clip(rect)
+            screen.blit(self.static, rect, rect)
+            self._draw_dynamic(deck, players, rect)
+        screen.set_clip(None)
+        if present:
+            pygame.display.update(dirty)
+        return dirty